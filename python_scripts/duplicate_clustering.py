@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Offline Duplicate Clustering Job
+Scores the whole rentals corpus with the weighted location, title,
+description, price, image and phone rules from
+docs/duplicate_detection_system.md and emits merge candidates for the
+merge-rental-duplicates and resolve-rental-duplicate routes
+"""
+
+import json
+import math
+import zlib
+import logging
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from geo_index import haversine_m, location_score
+from listing_fingerprint import normalize_text
+from near_duplicates import shingles
+
+# <scratchpad>Blocking by (city, rooms, price band) keeps every comparison inside small blocks; no global n^2</scratchpad>
+# AI-DEV: Each block (or title window of an oversized block) is scored against itself and the next price band,
+# so pairs within 20% never fall between blocks
+
+logger = logging.getLogger(__name__)
+
+# Thresholds on the summed score (max 135), as in the TypeScript detector
+DUPLICATE_THRESHOLD = 85
+REVIEW_THRESHOLD = 65
+
+# Consecutive price bands differ by 25%, so any pair scoring price points
+# (difference under 20% of the larger price) shares a band or is adjacent
+PRICE_BAND_RATIO = 1.25
+
+_PRIME = (1 << 31) - 1
+_NO_PRICE_BAND = -1
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Duplicate clustering requires numpy (pip install numpy)")
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """Israeli phone number without country code or leading zero (matches phone-utils.ts)"""
+    if not phone:
+        return ''
+    digits = ''.join(ch for ch in str(phone) if ch.isdigit())
+    if digits.startswith('972'):
+        digits = digits[3:]
+    if digits.startswith('0'):
+        digits = digits[1:]
+    return digits if len(digits) == 9 else ''
+
+
+def _primary_phash(record: Dict) -> Optional[int]:
+    """64-bit pHash of the first image that has one"""
+    if record.get('phash'):
+        return int(record['phash'], 16) & 0xFFFFFFFFFFFFFFFF
+    images = sorted(record.get('rental_images') or [], key=lambda img: img.get('image_order') or 0)
+    for image in images:
+        if image.get('phash'):
+            return int(image['phash'], 16) & 0xFFFFFFFFFFFFFFFF
+    return None
+
+
+def _city(record: Dict) -> str:
+    city = record.get('city')
+    if not city and record.get('location_text'):
+        # "Street, Neighborhood, City" - the city is the last part
+        city = str(record['location_text']).split(',')[-1]
+    return normalize_text(city) or 'unknown'
+
+
+def price_band(price: Optional[float]) -> int:
+    if not price or price <= 0:
+        return _NO_PRICE_BAND
+    return int(math.floor(math.log(price) / math.log(PRICE_BAND_RATIO)))
+
+
+def blocking_key(record: Dict) -> Tuple[str, Optional[int], int]:
+    """(city, rooms, price band) a record is compared within"""
+    bedrooms = record.get('bedrooms')
+    return _city(record), int(bedrooms) if bedrooms is not None else None, price_band(record.get('price_per_month'))
+
+
+@dataclass
+class ScoredPair:
+    """Two listings and their score breakdown"""
+    id_a: str
+    id_b: str
+    total: int
+    breakdown: Dict[str, int]
+
+
+@dataclass
+class ClusteringResult:
+    """Clusters above the duplicate threshold and pairs that need review"""
+    merge_candidates: List[Dict] = field(default_factory=list)
+    review_candidates: List[Dict] = field(default_factory=list)
+    listings: int = 0
+    blocks: int = 0
+    pairs_scored: int = 0
+
+
+class _BlockFeatures:
+    """Column arrays for one set of records"""
+
+    def __init__(self, records: List[Dict], num_perm: int, shingle_size: int, seed: int):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self.shingle_size = shingle_size
+
+        self.ids = [str(r['id']) for r in records]
+        self.title_sig, self.has_title = self._signatures(r.get('title') for r in records)
+        self.desc_sig, self.has_desc = self._signatures(r.get('description') for r in records)
+        self.loc_sig, self.has_loc = self._signatures(r.get('location_text') for r in records)
+
+        self.price = np.array([float(r.get('price_per_month') or 0) for r in records])
+        self.lat = np.array([r.get('latitude') if r.get('latitude') is not None else np.nan for r in records], dtype=float)
+        self.lng = np.array([r.get('longitude') if r.get('longitude') is not None else np.nan for r in records], dtype=float)
+
+        hashes = [_primary_phash(r) for r in records]
+        self.has_phash = np.array([h is not None for h in hashes])
+        self.phash = np.array([h or 0 for h in hashes], dtype=np.uint64)
+
+        phones = [normalize_phone(r.get('phone_normalized') or r.get('phone')) for r in records]
+        codes = {}
+        self.phone = np.array([codes.setdefault(p, len(codes)) if p else -1 for p in phones])
+
+    def _signatures(self, texts: Iterable[Optional[str]]):
+        """MinHash signatures (n, num_perm) via universal hashing of crc32 shingle hashes"""
+        rows = []
+        present = []
+        for text in texts:
+            tokens = shingles(text, self.shingle_size)
+            if not tokens:
+                rows.append(np.zeros(len(self.a), dtype=np.uint64))
+                present.append(False)
+                continue
+            h = np.fromiter((zlib.crc32(t.encode('utf-8')) for t in tokens), dtype=np.uint64, count=len(tokens))
+            rows.append(((self.a[:, None] * h[None, :] + self.b[:, None]) % _PRIME).min(axis=1))
+            present.append(True)
+        return np.vstack(rows), np.array(present)
+
+
+def _popcount64(values: 'np.ndarray') -> 'np.ndarray':
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return np.unpackbits(values[..., None].view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def _text_similarity(sig_a, sig_b) -> 'np.ndarray':
+    """
+    Pairwise estimated Jaccard similarity, (n, num_perm) x (m, num_perm) -> (n, m)
+
+    Signatures are compared one permutation at a time, so memory stays at a
+    few (n, m) arrays instead of an (n, m, num_perm) one.
+    """
+    matches = np.zeros((len(sig_a), len(sig_b)), dtype=np.uint16)
+    for column_a, column_b in zip(sig_a.T, sig_b.T):
+        matches += column_a[:, None] == column_b[None, :]
+    return matches / sig_a.shape[1]
+
+
+def score_matrix(left: _BlockFeatures, right: _BlockFeatures, li: 'np.ndarray', ri: 'np.ndarray') -> Dict[str, 'np.ndarray']:
+    """
+    Vectorized score breakdown for rows li of left against rows ri of right
+
+    Mirrors DuplicateDetector.calculateSimilarityScore in
+    src/lib/duplicate-detection/index.ts.
+    """
+    def both(mask_a, mask_b):
+        return mask_a[li][:, None] & mask_b[ri][None, :]
+
+    # Location (40): distance tiers with coordinates, text similarity otherwise
+    has_coords = both(~np.isnan(left.lat), ~np.isnan(right.lat))
+    with np.errstate(invalid='ignore'):
+        distance = haversine_m(left.lat[li][:, None], left.lng[li][:, None], right.lat[ri][None, :], right.lng[ri][None, :])
+        coord_score = location_score(distance)
+    text_location = np.rint(_text_similarity(left.loc_sig[li], right.loc_sig[ri]) * 40)
+    location = np.where(
+        has_coords, coord_score, np.where(both(left.has_loc, right.has_loc), text_location, 0)
+    )
+
+    # Title (20) and description (15)
+    title = np.where(both(left.has_title, right.has_title),
+                     np.rint(_text_similarity(left.title_sig[li], right.title_sig[ri]) * 20), 0)
+    description = np.where(both(left.has_desc, right.has_desc),
+                           np.rint(_text_similarity(left.desc_sig[li], right.desc_sig[ri]) * 15), 0)
+
+    # Price (10)
+    price_a, price_b = left.price[li][:, None], right.price[ri][None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.abs(price_a - price_b) / np.maximum(price_a, price_b)
+    price = np.where(
+        (price_a > 0) & (price_b > 0),
+        np.select([ratio < 0.05, ratio < 0.1, ratio < 0.2], [10, 7, 3], default=0),
+        0
+    )
+
+    # Image (30): primary pHash similarity above 0.95 / 0.85
+    hamming = _popcount64(left.phash[li][:, None] ^ right.phash[ri][None, :])
+    image = np.where(
+        both(left.has_phash, right.has_phash),
+        np.select([hamming <= 3, hamming <= 9], [30, 25], default=0),
+        0
+    )
+
+    # Phone (20)
+    phone_a, phone_b = left.phone[li][:, None], right.phone[ri][None, :]
+    phone = np.where((phone_a >= 0) & (phone_a == phone_b), 20, 0)
+
+    return {
+        'locationScore': location,
+        'titleScore': title,
+        'descriptionScore': description,
+        'priceScore': price,
+        'imageScore': image,
+        'phoneScore': phone,
+    }
+
+
+def score_block(unit: Tuple[List[Dict], List[Dict], int, int, int, int]) -> Tuple[List[ScoredPair], int]:
+    """
+    Score one block against itself and the adjacent price band (runs in a worker process)
+
+    Args:
+        unit: (block records, next-band records, min score, num_perm, shingle_size, chunk_rows)
+
+    Returns:
+        (pairs at or above the minimum score, number of pairs scored)
+    """
+    records, neighbors, min_score, num_perm, shingle_size, chunk_rows = unit
+    features = _BlockFeatures(records + neighbors, num_perm, shingle_size, seed=1)
+    n_block, n_all = len(records), len(records) + len(neighbors)
+    right = np.arange(n_all)
+
+    pairs = []
+    scored = 0
+    for start in range(0, n_block, chunk_rows):
+        left = np.arange(start, min(start + chunk_rows, n_block))
+        breakdown = score_matrix(features, features, left, right)
+        total = sum(breakdown.values())
+
+        # Inside the block keep each pair once (i < j); neighbors are all new pairs
+        keep = (left[:, None] < right[None, :]) & (total >= min_score)
+        scored += int((left[:, None] < right[None, :]).sum())
+        for i, j in zip(*np.nonzero(keep)):
+            pairs.append(ScoredPair(
+                id_a=features.ids[left[i]],
+                id_b=features.ids[j],
+                total=int(total[i, j]),
+                breakdown={name: int(scores[i, j]) for name, scores in breakdown.items()},
+            ))
+    return pairs, scored
+
+
+def _completeness(record: Dict) -> Tuple[int, int, int]:
+    """Merge priority: filled fields, then description length, then image count"""
+    filled = sum(1 for key in ('title', 'description', 'price_per_month', 'bedrooms', 'location_text', 'phone_normalized')
+                 if record.get(key) not in (None, ''))
+    return filled, len(record.get('description') or ''), len(record.get('rental_images') or [])
+
+
+class DuplicateClusteringJob:
+    """
+    Clusters the corpus into duplicate groups using blocking and a process pool
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        num_perm: int = 64,
+        shingle_size: int = 5,
+        chunk_rows: int = 256,
+        max_block_size: int = 4000,
+        duplicate_threshold: int = DUPLICATE_THRESHOLD,
+        review_threshold: int = REVIEW_THRESHOLD
+    ):
+        _require_numpy()
+        self.max_workers = max_workers
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.chunk_rows = chunk_rows
+        self.max_block_size = max_block_size
+        self.duplicate_threshold = duplicate_threshold
+        self.review_threshold = review_threshold
+        self.logger = logging.getLogger(__name__)
+
+    def _units(self, blocks: Dict[Tuple, List[Dict]]) -> Iterator[Tuple]:
+        for (city, rooms, band), records in blocks.items():
+            neighbors = blocks.get((city, rooms, band + 1), []) if band != _NO_PRICE_BAND else []
+            if len(records) > self.max_block_size:
+                yield from self._window_units(records, neighbors)
+                continue
+            if len(records) + len(neighbors) > 1:
+                yield records, neighbors, self.review_threshold, self.num_perm, self.shingle_size, self.chunk_rows
+
+    def _window_units(self, records: List[Dict], next_band: List[Dict]) -> Iterator[Tuple]:
+        """
+        Sorted-neighborhood fallback for oversized blocks (e.g. no city or price)
+
+        Records are sorted by normalized title and cut into half-windows; each
+        half-window is scored against itself, the next one and the next price
+        band - all of it, or when that band is oversized too, its records in
+        the same title range.
+        """
+        def title_key(record: Dict) -> str:
+            return normalize_text(record.get('title'))
+
+        ordered = sorted(records, key=title_key)
+        step = max(1, self.max_block_size // 2)
+        windows = [ordered[i:i + step] for i in range(0, len(ordered), step)]
+
+        split_band = len(next_band) > self.max_block_size
+        if split_band:
+            next_band = sorted(next_band, key=title_key)
+            next_keys = [title_key(r) for r in next_band]
+
+        for idx, window in enumerate(windows):
+            following = windows[idx + 1] if idx + 1 < len(windows) else []
+            across = next_band
+            if split_band:
+                low, high = title_key(window[0]), title_key((following or window)[-1])
+                across = next_band[bisect_left(next_keys, low):bisect_right(next_keys, high)]
+            yield window, following + across, self.review_threshold, self.num_perm, self.shingle_size, self.chunk_rows
+
+    def run(self, records: Iterable[Dict]) -> ClusteringResult:
+        """
+        Block, score and cluster the records
+
+        Args:
+            records: rentals rows with at least id; optionally title, description,
+                price_per_month, bedrooms, city / location_text, latitude,
+                longitude, phone_normalized and rental_images (with phash)
+        """
+        by_id: Dict[str, Dict] = {}
+        blocks: Dict[Tuple, List[Dict]] = defaultdict(list)
+        for record in records:
+            by_id[str(record['id'])] = record
+            blocks[blocking_key(record)].append(record)
+
+        result = ClusteringResult(listings=len(by_id), blocks=len(blocks))
+        self.logger.info(f"Scoring {result.listings} listings in {result.blocks} blocks")
+
+        # Largest blocks first so one big block does not finish last
+        units = sorted(self._units(blocks), key=lambda unit: -(len(unit[0]) * (len(unit[0]) + len(unit[1]))))
+        pairs: List[ScoredPair] = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            for block_pairs, scored in pool.map(score_block, units, chunksize=16):
+                pairs.extend(block_pairs)
+                result.pairs_scored += scored
+
+        self._cluster(pairs, by_id, result)
+        self.logger.info(
+            f"Scored {result.pairs_scored} pairs: {len(result.merge_candidates)} clusters to merge, "
+            f"{len(result.review_candidates)} pairs to review"
+        )
+        return result
+
+    def _cluster(self, pairs: List[ScoredPair], by_id: Dict[str, Dict], result: ClusteringResult):
+        """Union-find over duplicate pairs; remaining pairs go to review"""
+        parent: Dict[str, str] = {}
+
+        def find(x: str) -> str:
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for pair in pairs:
+            if pair.total >= self.duplicate_threshold:
+                parent[find(pair.id_a)] = find(pair.id_b)
+
+        clusters: Dict[str, List[str]] = defaultdict(list)
+        for rental_id in list(parent):
+            clusters[find(rental_id)].append(rental_id)
+
+        best_score: Dict[str, int] = defaultdict(int)
+        for pair in pairs:
+            if pair.total >= self.duplicate_threshold:
+                best_score[find(pair.id_a)] = max(best_score[find(pair.id_a)], pair.total)
+
+        for root, members in clusters.items():
+            keep = max(members, key=lambda rental_id: _completeness(by_id[rental_id]))
+            result.merge_candidates.append({
+                'keepRentalId': keep,
+                'mergeRentalIds': sorted(m for m in members if m != keep),
+                'score': best_score[root],
+            })
+
+        for pair in pairs:
+            if pair.total >= self.duplicate_threshold:
+                continue
+            if pair.id_a in parent and pair.id_b in parent and find(pair.id_a) == find(pair.id_b):
+                continue
+            # The more complete listing is proposed as the master
+            master, other = sorted((pair.id_a, pair.id_b), key=lambda rental_id: _completeness(by_id[rental_id]), reverse=True)
+            result.review_candidates.append({
+                'rentalId': other,
+                'decision': 'keep_review',
+                'masterRentalId': master,
+                'score': pair.total,
+                'breakdown': pair.breakdown,
+            })
+
+
+def fetch_rentals(supabase, page_size: int = 1000) -> Iterator[Dict]:
+    """Stream active rentals not yet merged away, with image hashes, using keyset pagination"""
+    last_id = None
+    while True:
+        query = (
+            supabase.table('rentals')
+            .select('*, rental_images(phash, image_order)')
+            .eq('is_active', True)
+            .neq('duplicate_status', 'duplicate')
+            .order('id')
+            .limit(page_size)
+        )
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.execute().data
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+if __name__ == "__main__":
+    import argparse
+    from jsonl_export import JsonlWriter, iter_jsonl
+
+    parser = argparse.ArgumentParser(description="Cluster duplicate rentals across the whole corpus")
+    parser.add_argument("--input", type=str, help="Read listings from a JSON Lines export instead of Supabase")
+    parser.add_argument("--output", type=str, default="duplicate_candidates.jsonl", help="Candidate output (JSON Lines)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--json", action="store_true", help="Output JSON for API")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.input:
+        source = iter_jsonl(args.input)
+    else:
+        from supabase_client import get_supabase_client
+        source = fetch_rentals(get_supabase_client())
+
+    result = DuplicateClusteringJob(max_workers=args.workers).run(source)
+
+    with JsonlWriter(args.output, flush_every=1000) as writer:
+        writer.write_many({'route': 'merge-rental-duplicates', **c} for c in result.merge_candidates)
+        writer.write_many({'route': 'resolve-rental-duplicate', **c} for c in result.review_candidates)
+
+    summary = {
+        "status": "success",
+        "listings": result.listings,
+        "blocks": result.blocks,
+        "pairs_scored": result.pairs_scored,
+        "merge_candidates": len(result.merge_candidates),
+        "review_candidates": len(result.review_candidates),
+        "output": args.output,
+    }
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(summary)
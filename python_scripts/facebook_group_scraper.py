@@ -19,7 +19,25 @@ from urllib.parse import urlparse, parse_qs
 from playwright.async_api import async_playwright, Page, Browser
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+
+from image_capture import BrowserImageCapture
+from jsonl_export import JsonlWriter, is_jsonl_path
+from listing_fingerprint import (
+    ChangeResult,
+    FingerprintStore,
+    STATUS_CHANGED,
+    STATUS_NEW,
+    STATUS_UNCHANGED,
+    TRACKED_FIELDS,
+    build_change_rows,
+    diff_against_stored,
+)
+from local_outbox import LocalOutbox, OutboxSyncer
+from near_duplicates import NearDuplicateIndex
+from supabase_client import execute_query_async, get_supabase_client
+from upload_cache import UploadCache
+from uploadthing_integration import RentalImageUploader, UploadThingClient
 
 load_dotenv()
 
@@ -55,7 +73,18 @@ class RentalListing:
 class FacebookGroupScraper:
     """Facebook Group rental scraper using Playwright"""
     
-    def __init__(self, email: str = None, password: str = None, headless: bool = False):
+    def __init__(
+        self,
+        email: str = None,
+        password: str = None,
+        headless: bool = False,
+        outbox: Optional[LocalOutbox] = None,
+        export_path: Optional[str] = None,
+        fingerprints: Optional[FingerprintStore] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        image_uploader: Optional[RentalImageUploader] = None,
+        capture_images: bool = True
+    ):
         self.email = email or os.getenv('FACEBOOK_EMAIL')
         self.password = password or os.getenv('FACEBOOK_PASSWORD')
         self.headless = headless
@@ -64,11 +93,22 @@ class FacebookGroupScraper:
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
         
-        # Supabase client
-        self.supabase: Client = create_client(
-            os.getenv('NEXT_PUBLIC_SUPABASE_URL'),
-            os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
-        )
+        # Local outbox - when set, listings are committed locally and synced in batches
+        self.outbox = outbox
+        
+        # Streaming JSONL export - listings are appended as they are scraped
+        self.export_writer = JsonlWriter(export_path) if export_path else None
+        
+        # Content fingerprints (optional) - unchanged listings are skipped without a round trip
+        self.fingerprints = fingerprints
+        
+        # MinHash/LSH index (optional) - reposts under a new facebook_id are flagged for duplicate review
+        self.near_duplicates = near_duplicates
+        
+        # Image upload - images are uploaded as listings are scraped; with capture on,
+        # their bytes come from the browser session instead of a second download
+        self.image_uploader = image_uploader
+        self.image_capture = BrowserImageCapture() if image_uploader and capture_images else None
         
         # Rate limiting
         self.min_delay = 2.0
@@ -89,6 +129,15 @@ class FacebookGroupScraper:
             'גישה לנכים': ['גישה לנכים', 'נגיש'],
         }
     
+    @property
+    def supabase(self) -> Client:
+        """Shared pooled Supabase client, created on first use"""
+        return get_supabase_client()
+    
+    async def _execute(self, query):
+        """Execute a Supabase query off the event loop, with retries behind the shared circuit breaker"""
+        return await execute_query_async(query)
+    
     def _setup_logger(self) -> logging.Logger:
         """Configure logging"""
         logger = logging.getLogger(__name__)
@@ -356,7 +405,11 @@ class FacebookGroupScraper:
             
             listing = await self.scrape_group_post(post, group_id, group_name)
             if listing:
+                if self.image_uploader:
+                    await self._upload_listing_images(listing)
                 self.listings.append(listing)
+                if self.export_writer:
+                    self.export_writer.write(listing)
                 scraped_count += 1
                 self.logger.info(f"Scraped listing {scraped_count}/{max_posts}: {listing.title[:50]}...")
                 
@@ -367,72 +420,186 @@ class FacebookGroupScraper:
         
         return self.listings
     
+    async def _upload_listing_images(self, listing: RentalListing):
+        """Upload a listing's images while their URLs are valid, and point the listing at the uploads"""
+        if not listing.image_urls:
+            return
+        prefetched = await self.image_capture.collect(listing.image_urls) if self.image_capture else None
+        try:
+            result = await self.image_uploader.process_rental_images(
+                listing.facebook_id, listing.image_urls, prefetched=prefetched
+            )
+        except Exception as e:
+            self.logger.error(f"Error uploading images of listing {listing.facebook_id}: {e}")
+            return
+        finally:
+            if prefetched:
+                self.image_capture.discard(prefetched)
+        
+        uploaded = {img.source_url: img.url for img in result['images']}
+        listing.image_urls = [uploaded.get(url, url) for url in listing.image_urls]
+        if prefetched is not None:
+            self.logger.info(
+                f"Used {len(prefetched)}/{len(uploaded)} browser-captured images for listing {listing.facebook_id}"
+            )
+    
+    def _build_rental_rows(self, listing: RentalListing) -> Tuple[Dict, List[Dict], List[str], Dict]:
+        """Build the rentals, rental_images, amenity and scrape_metadata rows for a listing"""
+        rental_data = {
+            'facebook_id': listing.facebook_id,
+            'title': listing.title,
+            'description': listing.description,
+            'price_per_month': listing.price_per_month,
+            'currency': listing.currency,
+            'location_text': listing.location_text,
+            'bedrooms': listing.bedrooms,
+            'bathrooms': listing.bathrooms,
+            'property_type': listing.property_type,
+            'available_date': listing.available_date,
+            'is_active': True,
+            'scraped_at': listing.scraped_at.isoformat(),
+        }
+        
+        image_rows = [
+            {
+                'image_url': img_url,
+                'image_order': idx,
+                'is_primary': idx == 0
+            }
+            for idx, img_url in enumerate(listing.image_urls)
+        ]
+        
+        metadata = {
+            'source_url': listing.listing_url,
+            'source_type': 'facebook_group',
+            'source_id': listing.group_id,
+            'source_name': listing.group_name,
+        }
+        
+        return rental_data, image_rows, list(listing.amenities), metadata
+    
+    def _flag_near_duplicate(self, listing: RentalListing, rental_data: Dict):
+        """Flag a new listing for duplicate review if it looks like a repost"""
+        if not self.near_duplicates:
+            return
+        duplicate = self.near_duplicates.flag(listing.facebook_id, rental_data)
+        if duplicate:
+            self.logger.info(
+                f"Listing {listing.facebook_id} looks like a repost of rental {duplicate.rental_id} "
+                f"({duplicate.similarity:.0%} similar), flagging for review"
+            )
+    
+    def _remember(self, listing: RentalListing, rental_id: Optional[str], rental_data: Dict, image_urls: List[str]):
+        """Record a saved listing's fingerprint and index its text for near-duplicate lookups"""
+        if self.fingerprints:
+            self.fingerprints.record(listing.facebook_id, rental_id, rental_data, image_urls)
+        if rental_id and self.near_duplicates:
+            self.near_duplicates.add_listing(rental_id, listing.facebook_id, rental_data)
+    
+    def remap_rental_id(self, facebook_id: str, rental_id: str):
+        """Point local state at the upstream rental id of a listing that already existed"""
+        if self.fingerprints:
+            self.fingerprints.remap_rental_id(facebook_id, rental_id)
+        if self.near_duplicates:
+            self.near_duplicates.remap_rental_id(facebook_id, rental_id)
+    
     async def save_listing_to_supabase(self, listing: RentalListing):
-        """Save a single listing to Supabase"""
+        """
+        Save a single listing to Supabase (or to the local outbox when configured)
+        
+        With a fingerprint store, listings whose content fingerprint is unchanged
+        are skipped without a round trip. Changed listings only get their
+        changed fields updated.
+        """
+        rental_data, image_rows, amenity_names, metadata = self._build_rental_rows(listing)
+        image_urls = [row['image_url'] for row in image_rows]
+        
+        if self.fingerprints:
+            change = self.fingerprints.check(listing.facebook_id, rental_data, image_urls)
+        else:
+            change = ChangeResult(status=STATUS_NEW)
+        if change.status == STATUS_UNCHANGED:
+            self.logger.info(f"Listing {listing.facebook_id} unchanged, skipping")
+            return
+        
+        if self.outbox:
+            if change.status == STATUS_CHANGED:
+                self.outbox.enqueue_update(change.rental_id, *build_change_rows(change, rental_data, image_rows))
+                self._remember(listing, change.rental_id, rental_data, image_urls)
+                self.logger.info(f"Queued update of changed listing {listing.facebook_id} in local outbox")
+                return
+            
+            self._flag_near_duplicate(listing, rental_data)
+            rental_id = self.outbox.enqueue_listing(rental_data, image_rows, amenity_names, metadata)
+            if rental_id:
+                self._remember(listing, rental_id, rental_data, image_urls)
+                self.logger.info(f"Queued listing {listing.facebook_id} in local outbox")
+            else:
+                self.logger.info(f"Listing {listing.facebook_id} already queued, skipping")
+            return
+        
         try:
-            # Check if rental already exists
-            existing = self.supabase.table('rentals').select('id').eq('facebook_id', listing.facebook_id).execute()
+            if change.status == STATUS_NEW:
+                # Check if rental already exists (e.g. saved before fingerprints were kept, or without them)
+                existing = await self._execute(self.supabase.table('rentals').select(
+                    'id, ' + ', '.join(TRACKED_FIELDS)
+                ).eq('facebook_id', listing.facebook_id))
+                
+                if existing.data:
+                    stored = existing.data[0]
+                    stored_images = await self._execute(self.supabase.table('rental_images').select('image_url').eq('rental_id', stored['id']))
+                    change = diff_against_stored(
+                        stored['id'], stored, [img['image_url'] for img in stored_images.data], rental_data, image_urls
+                    )
+                    if change.status == STATUS_UNCHANGED:
+                        self._remember(listing, stored['id'], rental_data, image_urls)
+                        self.logger.info(f"Listing {listing.facebook_id} already exists, skipping")
+                        return
             
-            if existing.data:
-                self.logger.info(f"Listing {listing.facebook_id} already exists, skipping")
+            if change.status == STATUS_CHANGED:
+                updates, new_image_rows, price_row = build_change_rows(change, rental_data, image_rows)
+                
+                if updates:
+                    await self._execute(self.supabase.table('rentals').update(updates).eq('id', change.rental_id))
+                for image_data in new_image_rows:
+                    await self._execute(self.supabase.table('rental_images').insert({'rental_id': change.rental_id, **image_data}))
+                if price_row:
+                    await self._execute(self.supabase.table('rental_price_history').insert(price_row))
+                
+                self._remember(listing, change.rental_id, rental_data, image_urls)
+                self.logger.info(f"Updated {sorted(updates)} and {len(new_image_rows)} images of listing {listing.facebook_id}")
                 return
             
-            # Insert rental
-            rental_data = {
-                'facebook_id': listing.facebook_id,
-                'title': listing.title,
-                'description': listing.description,
-                'price_per_month': listing.price_per_month,
-                'currency': listing.currency,
-                'location_text': listing.location_text,
-                'bedrooms': listing.bedrooms,
-                'bathrooms': listing.bathrooms,
-                'property_type': listing.property_type,
-                'available_date': listing.available_date,
-                'is_active': True,
-                'scraped_at': listing.scraped_at.isoformat(),
-            }
+            self._flag_near_duplicate(listing, rental_data)
             
-            rental_result = self.supabase.table('rentals').insert(rental_data).execute()
+            # Insert rental
+            rental_result = await self._execute(self.supabase.table('rentals').insert(rental_data))
             
             if rental_result.data:
                 rental_id = rental_result.data[0]['id']
                 
                 # Insert images
-                if listing.image_urls:
-                    for idx, img_url in enumerate(listing.image_urls):
-                        image_data = {
-                            'rental_id': rental_id,
-                            'image_url': img_url,
-                            'image_order': idx,
-                            'is_primary': idx == 0
-                        }
-                        self.supabase.table('rental_images').insert(image_data).execute()
+                for image_data in image_rows:
+                    await self._execute(self.supabase.table('rental_images').insert({'rental_id': rental_id, **image_data}))
                 
                 # Insert amenities
-                if listing.amenities:
+                if amenity_names:
                     # Get amenity IDs
-                    amenity_results = self.supabase.table('amenities').select('id, name').execute()
+                    amenity_results = await self._execute(self.supabase.table('amenities').select('id, name'))
                     amenity_map = {a['name']: a['id'] for a in amenity_results.data}
                     
-                    for amenity_name in listing.amenities:
+                    for amenity_name in amenity_names:
                         if amenity_name in amenity_map:
                             rental_amenity_data = {
                                 'rental_id': rental_id,
                                 'amenity_id': amenity_map[amenity_name]
                             }
-                            self.supabase.table('rental_amenities').insert(rental_amenity_data).execute()
+                            await self._execute(self.supabase.table('rental_amenities').insert(rental_amenity_data))
                 
                 # Insert scrape metadata
-                metadata = {
-                    'rental_id': rental_id,
-                    'source_url': listing.listing_url,
-                    'source_type': 'facebook_group',
-                    'source_id': listing.group_id,
-                    'source_name': listing.group_name,
-                }
-                self.supabase.table('scrape_metadata').insert(metadata).execute()
+                await self._execute(self.supabase.table('scrape_metadata').insert({'rental_id': rental_id, **metadata}))
                 
+                self._remember(listing, rental_id, rental_data, image_urls)
                 self.logger.info(f"Saved listing {listing.facebook_id} to Supabase")
                 
         except Exception as e:
@@ -458,17 +625,31 @@ class FacebookGroupScraper:
         )
         
         self.page = await context.new_page()
+        if self.image_capture:
+            self.image_capture.attach(self.page)
         
         # Login if credentials provided
         await self._login_to_facebook()
     
     async def close(self):
-        """Close browser"""
+        """Close browser, export file and local stores"""
         if self.browser:
             await self.browser.close()
+        if self.export_writer:
+            self.export_writer.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.near_duplicates:
+            self.near_duplicates.close()
     
     def save_to_json(self, filename: str = "fb_group_rentals.json"):
-        """Save scraped listings to JSON"""
+        """Save scraped listings to JSON (or JSON Lines for .jsonl[.gz|.zst] filenames)"""
+        if is_jsonl_path(filename):
+            with JsonlWriter(filename) as writer:
+                writer.write_many(self.listings)
+            self.logger.info(f"Saved {len(self.listings)} listings to {filename}")
+            return
+        
         data = {
             "scraped_at": datetime.now().isoformat(),
             "total_listings": len(self.listings),
@@ -492,6 +673,12 @@ async def main():
     parser.add_argument("--password", type=str, help="Facebook password (or set FACEBOOK_PASSWORD env var)")
     parser.add_argument("--headless", action="store_true", help="Run in headless mode")
     parser.add_argument("--json", action="store_true", help="Output JSON for API")
+    parser.add_argument("--outbox", type=str, help="Commit listings to this local outbox database and sync afterwards")
+    parser.add_argument("--output", type=str, help="Stream listings to this JSON Lines file (.jsonl, .jsonl.gz, .jsonl.zst)")
+    parser.add_argument("--fingerprints", action="store_true", help="Skip listings unchanged since an earlier run (local fingerprint store)")
+    parser.add_argument("--near-duplicates", action="store_true", help="Flag reposts of earlier listings for duplicate review (local MinHash index)")
+    parser.add_argument("--upload-images", action="store_true", help="Upload listing images to UploadThing while scraping")
+    parser.add_argument("--no-capture", action="store_true", help="Re-download images for upload instead of capturing them from the browser")
     
     args = parser.parse_args()
     
@@ -510,16 +697,27 @@ async def main():
         print("Error: --group URL is required")
         return
     
+    outbox = LocalOutbox(args.outbox) if args.outbox else None
+    upload_client = UploadThingClient(upload_cache=UploadCache()) if args.upload_images else None
     scraper = FacebookGroupScraper(
         email=args.email,
         password=args.password,
-        headless=args.headless
+        headless=args.headless,
+        outbox=outbox,
+        export_path=args.output,
+        fingerprints=FingerprintStore() if args.fingerprints else None,
+        near_duplicates=NearDuplicateIndex() if args.near_duplicates else None,
+        image_uploader=RentalImageUploader(upload_client) if upload_client else None,
+        capture_images=not args.no_capture
     )
     
     try:
         await scraper.start()
         listings = await scraper.scrape_facebook_group(args.group, args.max_posts)
         
+        if outbox:
+            OutboxSyncer(outbox, scraper.supabase, on_existing=scraper.remap_rental_id).sync()
+        
         if args.json:
             result = {
                 "status": "success",
@@ -529,7 +727,8 @@ async def main():
             }
             print(json.dumps(result))
         else:
-            scraper.save_to_json()
+            if not args.output:
+                scraper.save_to_json()
             print(f"\nScraped {len(listings)} rental listings")
             print(f"Saved to Supabase and JSON file")
             
@@ -544,6 +743,10 @@ async def main():
             print(f"Error: {e}")
     finally:
         await scraper.close()
+        if upload_client:
+            await upload_client.close()
+        if outbox:
+            outbox.close()
 
 
 if __name__ == "__main__":
@@ -8,13 +8,16 @@ Always respect website terms of service and implement ethical scraping practices
 import asyncio
 import json
 import logging
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass, asdict
 import random
 import time
 from urllib.parse import urljoin
 
+from jsonl_export import JsonlWriter, is_jsonl_path
+
 # Third-party imports would include:
 # from playwright.async_api import async_playwright
 # from bs4 import BeautifulSoup
@@ -23,6 +26,14 @@ from urllib.parse import urljoin
 # <scratchpad>This MVP demonstrates the structure of a Facebook Marketplace scraper</scratchpad>
 # AI-DEV: In production, use proper proxy rotation and rate limiting
 
+# Namespace for client-generated row ids - the same listing gets the same UUID on every run
+ROW_ID_NAMESPACE = uuid.UUID('6f1c2b9e-3d4a-5b8c-9e0f-1a2b3c4d5e6f')
+
+
+def stable_uuid(*parts: str) -> str:
+    """Deterministic UUID for a row, so related rows link without round trips"""
+    return str(uuid.uuid5(ROW_ID_NAMESPACE, ':'.join(str(p) for p in parts)))
+
 @dataclass
 class RentalListing:
     """Data structure for rental listings"""
@@ -48,11 +59,14 @@ class FacebookRentalScraper:
     MVP Facebook Marketplace rental scraper
     """
     
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, export_path: Optional[str] = None):
         self.headless = headless
         self.logger = self._setup_logger()
         self.listings: List[RentalListing] = []
         
+        # Streaming JSONL export - listings are appended as they are scraped
+        self.export_writer = JsonlWriter(export_path) if export_path else None
+        
         # Scraping configuration
         self.min_delay = 0.5  # seconds
         self.max_delay = 1.0  # seconds
@@ -232,6 +246,8 @@ class FacebookRentalScraper:
                 listing = await self.scrape_listing(url)
                 if listing:
                     self.listings.append(listing)
+                    if self.export_writer:
+                        self.export_writer.write(listing)
             except Exception as e:
                 self.logger.error(f"Error scraping {url}: {e}")
                 continue
@@ -239,7 +255,13 @@ class FacebookRentalScraper:
         return self.listings
     
     def save_to_json(self, filename: str = "rental_listings.json"):
-        """Save scraped listings to JSON file"""
+        """Save scraped listings to JSON file (or JSON Lines for .jsonl[.gz|.zst] filenames)"""
+        if is_jsonl_path(filename):
+            with JsonlWriter(filename) as writer:
+                writer.write_many(self.listings)
+            self.logger.info(f"Saved {len(self.listings)} listings to {filename}")
+            return
+        
         data = {
             "scraped_at": datetime.now().isoformat(),
             "total_listings": len(self.listings),
@@ -251,28 +273,37 @@ class FacebookRentalScraper:
         
         self.logger.info(f"Saved {len(self.listings)} listings to {filename}")
     
-    def prepare_for_supabase(self) -> Dict[str, List[Dict]]:
-        """
-        Prepare scraped data for insertion into Supabase
-        Returns dictionaries for each table
-        """
-        rentals = []
-        rental_images = []
-        landlords = {}  # Use dict to avoid duplicates
-        
+    def close(self):
+        """Close the streaming export file"""
+        if self.export_writer:
+            self.export_writer.close()
+    
+    def _landlord_key(self, listing: RentalListing) -> Optional[str]:
+        if not listing.landlord_name:
+            return None
+        return listing.landlord_profile_url or listing.landlord_name
+    
+    def iter_landlord_rows(self) -> Iterator[Dict]:
+        """Yield one landlords row per distinct landlord"""
+        seen = set()
         for listing in self.listings:
-            # Prepare landlord data
-            if listing.landlord_name:
-                landlord_key = listing.landlord_profile_url or listing.landlord_name
-                if landlord_key not in landlords:
-                    landlords[landlord_key] = {
-                        "name": listing.landlord_name,
-                        "facebook_profile_id": landlord_key,
-                        "profile_image_url": None  # Would extract in real implementation
-                    }
-            
-            # Prepare rental data
-            rental_data = {
+            landlord_key = self._landlord_key(listing)
+            if landlord_key and landlord_key not in seen:
+                seen.add(landlord_key)
+                yield {
+                    "id": stable_uuid("landlord", landlord_key),
+                    "name": listing.landlord_name,
+                    "facebook_profile_id": landlord_key,
+                    "profile_image_url": None  # Would extract in real implementation
+                }
+    
+    def iter_rental_rows(self) -> Iterator[Dict]:
+        """Yield one rentals row per listing, keyed by a stable UUID"""
+        for listing in self.listings:
+            landlord_key = self._landlord_key(listing)
+            yield {
+                "id": stable_uuid("rental", listing.facebook_id),
+                "landlord_id": stable_uuid("landlord", landlord_key) if landlord_key else None,
                 "facebook_id": listing.facebook_id,
                 "title": listing.title,
                 "description": listing.description,
@@ -285,22 +316,39 @@ class FacebookRentalScraper:
                 "available_date": listing.available_date,
                 "is_active": True
             }
-            rentals.append(rental_data)
-            
-            # Prepare rental images
+    
+    def iter_rental_image_rows(self) -> Iterator[Dict]:
+        """Yield rental_images rows linked to their rental's stable UUID"""
+        for listing in self.listings:
+            rental_id = stable_uuid("rental", listing.facebook_id)
             for idx, image_url in enumerate(listing.image_urls):
-                rental_images.append({
-                    "rental_id": listing.facebook_id,  # Would use actual UUID in production
+                yield {
+                    "id": stable_uuid("rental_image", listing.facebook_id, idx),
+                    "rental_id": rental_id,
                     "image_url": image_url,
                     "image_order": idx,
                     "is_primary": idx == 0
-                })
+                }
+    
+    def iter_table_rows(self) -> Dict[str, Iterator[Dict]]:
+        """
+        Lazy row streams per table, in foreign-key load order
         
+        Rows carry client-generated UUIDs, so they can be bulk loaded
+        (e.g. with copy_loader.CopyLoader) without looking up generated ids
+        """
         return {
-            "rentals": rentals,
-            "rental_images": rental_images,
-            "landlords": list(landlords.values())
+            "landlords": self.iter_landlord_rows(),
+            "rentals": self.iter_rental_rows(),
+            "rental_images": self.iter_rental_image_rows(),
         }
+    
+    def prepare_for_supabase(self) -> Dict[str, List[Dict]]:
+        """
+        Prepare scraped data for insertion into Supabase
+        Returns dictionaries for each table
+        """
+        return {table: list(rows) for table, rows in self.iter_table_rows().items()}
 
 
 # Example usage
@@ -333,6 +381,7 @@ if __name__ == "__main__":
     parser.add_argument("--max-price", type=int, help="Maximum price per month")
     parser.add_argument("--min-bedrooms", type=int, help="Minimum number of bedrooms")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    parser.add_argument("--output", type=str, help="Stream listings to a JSON Lines file as they are scraped (.jsonl, .jsonl.gz or .jsonl.zst)")
     
     args = parser.parse_args()
     
@@ -357,15 +406,22 @@ if __name__ == "__main__":
         if args.location:
             # Run the scraper
             async def run():
-                scraper = FacebookRentalScraper(headless=True)
-                listings = await scraper.scrape_search_results(
-                    location=args.location,
-                    max_price=args.max_price,
-                    min_bedrooms=args.min_bedrooms,
-                    max_listings=10
-                )
-                filename = f"{args.location.replace(' ', '_').lower()}_rentals.json"
-                scraper.save_to_json(filename)
+                scraper = FacebookRentalScraper(headless=True, export_path=args.output)
+                try:
+                    listings = await scraper.scrape_search_results(
+                        location=args.location,
+                        max_price=args.max_price,
+                        min_bedrooms=args.min_bedrooms,
+                        max_listings=10
+                    )
+                finally:
+                    scraper.close()
+                if args.output:
+                    # Already written listing by listing
+                    filename = args.output
+                else:
+                    filename = f"{args.location.replace(' ', '_').lower()}_rentals.json"
+                    scraper.save_to_json(filename)
                 
                 # Output JSON result for API
                 result = {
@@ -6,17 +6,51 @@ Uses Firecrawl API to handle JavaScript rendering and extraction
 
 import os
 import json
+import asyncio
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 import re
+import uuid
 from dotenv import load_dotenv
 from firecrawl import FirecrawlApp
-from supabase import create_client, Client
+from supabase import Client
+
+from group_scheduler import DEFAULT_SCROLLS, GroupYieldStore, YieldScheduler
+from jsonl_export import JsonlWriter, is_jsonl_path
+from listing_fingerprint import (
+    ChangeResult,
+    FingerprintStore,
+    STATUS_CHANGED,
+    STATUS_NEW,
+    STATUS_UNCHANGED,
+    TRACKED_FIELDS,
+    build_change_rows,
+    diff_against_stored,
+)
+from local_outbox import LocalOutbox, OutboxSyncer
+from markdown_posts import MarkdownPost, canonical_permalink, iter_posts
+from near_duplicates import NearDuplicateIndex
+from resilience import FIRECRAWL_POLICY, FIRECRAWL_STATUS_POLICY, call_async, get_breaker
+from response_cache import ResponseCache
+from supabase_client import execute_query_async, get_supabase_client
 
 load_dotenv()
 
+# Segments shorter than this are reactions, names or UI text rather than posts
+MIN_POST_LENGTH = 50
+
+# Crawl job mode: seconds between status polls, and the longest a job is followed
+CRAWL_POLL_INTERVAL = 3.0
+CRAWL_TIMEOUT = 15 * 60
+
+# Groups scraped at once - each holds one Firecrawl request (and one worker thread)
+DEFAULT_GROUP_CONCURRENCY = int(os.getenv('FIRECRAWL_CONCURRENCY', '4'))
+
 @dataclass
 class RentalListing:
     """Data structure for rental listings"""
@@ -49,23 +83,55 @@ class RentalListing:
 class FirecrawlRentalScraper:
     """Facebook Group rental scraper using Firecrawl API"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        outbox: Optional[LocalOutbox] = None,
+        export_path: Optional[str] = None,
+        fingerprints: Optional[FingerprintStore] = None,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        max_concurrency: int = DEFAULT_GROUP_CONCURRENCY,
+        response_cache: Optional[ResponseCache] = None,
+        refresh: bool = False,
+        scheduler: Optional[YieldScheduler] = None
+    ):
         self.api_key = api_key or os.getenv('FIRECRAWL_API_KEY')
         self.logger = self._setup_logger()
         self.listings: List[RentalListing] = []
         
+        # Local outbox - when set, listings are committed locally and synced in batches
+        self.outbox = outbox
+        
+        # Streaming JSONL export - listings are appended as they are scraped
+        self.export_writer = JsonlWriter(export_path) if export_path else None
+        
+        # Content fingerprints (optional) - unchanged listings are skipped without a round trip
+        self.fingerprints = fingerprints
+        
+        # MinHash/LSH index (optional) - reposts under a new facebook_id are flagged for duplicate review
+        self.near_duplicates = near_duplicates
+        
+        # Response cache - repeat scrapes of a page are served from disk; refresh re-fetches (and re-caches)
+        self.response_cache = response_cache
+        self.refresh = refresh
+        self._served_from_cache = set()
+        
+        # Yield scheduler - group scrapes are logged to its history, and a call budget is spent where it pays
+        self.scheduler = scheduler
+        self.new_listing_counts: Dict[str, int] = {}
+        
+        # The Firecrawl SDK blocks - calls run on a dedicated pool sized to the group concurrency,
+        # so concurrent groups never queue behind the default executor
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='firecrawl')
+        self._group_slots: Optional[asyncio.Semaphore] = None
+        
         # Initialize Firecrawl
         if self.api_key:
             self.app = FirecrawlApp(api_key=self.api_key)
         else:
             self.logger.warning("No Firecrawl API key provided")
         
-        # Supabase client
-        self.supabase: Client = create_client(
-            os.getenv('NEXT_PUBLIC_SUPABASE_URL'),
-            os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
-        )
-        
         # Israeli amenities
         self.israeli_amenities = {
             'ממ״ד': ['ממד', 'ממ"ד', 'מרחב מוגן'],
@@ -81,6 +147,15 @@ class FirecrawlRentalScraper:
             'גישה לנכים': ['גישה לנכים', 'נגיש'],
         }
     
+    @property
+    def supabase(self) -> Client:
+        """Shared pooled Supabase client, created on first use"""
+        return get_supabase_client()
+    
+    async def _execute(self, query):
+        """Execute a Supabase query off the event loop, with retries behind the shared circuit breaker"""
+        return await execute_query_async(query)
+    
     def _setup_logger(self) -> logging.Logger:
         """Configure logging"""
         logger = logging.getLogger(__name__)
@@ -249,8 +324,113 @@ class FirecrawlRentalScraper:
             self.logger.error(f"Error parsing listing: {e}")
             return None
     
-    async def scrape_facebook_group(self, group_url: str, max_posts: int = 10) -> List[RentalListing]:
-        """Scrape rental listings from a Facebook group using Firecrawl"""
+    async def _scrape_url(self, url: str, params: Dict, scrolls: Optional[int] = None) -> Optional[Dict]:
+        """
+        Firecrawl scrape_url, served from the response cache when possible
+        
+        For a feed scrape pass its scroll depth: the entry is then keyed
+        without the scroll actions, so a cached scrape at least as deep
+        serves the request whatever depth the scheduler picked this time.
+        """
+        key_params = params
+        if scrolls is not None:
+            key_params = {key: value for key, value in params.items() if key != 'actions'}
+        
+        if self.response_cache and not self.refresh:
+            cached = self.response_cache.get(url, key_params)
+            if cached is not None and scrolls is not None:
+                cached = cached['response'] if cached.get('scrolls', 0) >= scrolls else None
+            if cached is not None:
+                self.logger.info(f"Using cached Firecrawl response for {url}")
+                self._served_from_cache.add(url)
+                return cached
+        
+        # The SDK call blocks, so run it on the pool under a deadline and the shared breaker
+        result = await call_async(
+            lambda: self._run_blocking(self.app.scrape_url, url, params=params),
+            FIRECRAWL_POLICY,
+            get_breaker('firecrawl'),
+            f"Firecrawl scrape of {url}"
+        )
+        if self.response_cache and result:
+            self.response_cache.put(url, key_params, result if scrolls is None else {'scrolls': scrolls, 'response': result})
+        return result
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run a blocking SDK call on the Firecrawl pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+    
+    async def scrape_groups(
+        self,
+        group_urls: List[str],
+        max_posts: int = 10,
+        crawl: bool = False,
+        budget: Optional[int] = None
+    ) -> Dict[str, List[RentalListing]]:
+        """
+        Scrape several groups concurrently, at most max_concurrency at a time
+        
+        Total time is about that of the slowest group (per concurrency wave)
+        rather than the sum of all groups. A failing group does not stop the others.
+        
+        Args:
+            max_posts: Listings per group at the default scroll depth; a group
+                scheduled deeper may return proportionally more
+            crawl: Use crawl jobs over the groups' post pages instead of one feed scrape
+            budget: Feed scrapes to spend; with a scheduler, only the groups it picks
+                are scraped, each at its planned scroll depth
+        
+        Returns:
+            Listings found per scraped group URL
+        """
+        if self._group_slots is None:
+            self._group_slots = asyncio.Semaphore(self.max_concurrency)
+        
+        scrolls = {url: DEFAULT_SCROLLS for url in group_urls}
+        if budget is not None and not crawl:
+            if self.scheduler:
+                scrolls = {a.group_url: a.scrolls for a in self.scheduler.plan(group_urls, budget)}
+            else:
+                scrolls = dict(list(scrolls.items())[:budget])
+            group_urls = list(scrolls)
+        
+        async def scrape_one(group_url: str) -> List[RentalListing]:
+            async with self._group_slots:
+                if crawl:
+                    return await self.crawl_facebook_group(group_url, max_posts)
+                # Extra scrolls are wasted (and the yield under-recorded) if the post cap stays fixed
+                depth = scrolls[group_url]
+                post_cap = max(max_posts, math.ceil(max_posts * depth / DEFAULT_SCROLLS))
+                return await self._scrape_and_record(group_url, post_cap, depth)
+        
+        results = await asyncio.gather(*(scrape_one(url) for url in group_urls), return_exceptions=True)
+        by_group = {}
+        for group_url, result in zip(group_urls, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error scraping group {group_url}: {result}")
+                result = []
+            by_group[group_url] = result
+        return by_group
+    
+    async def _scrape_and_record(self, group_url: str, max_posts: int, scrolls: int) -> List[RentalListing]:
+        """Scrape a group feed and log its yield and latency to the scheduler's history"""
+        new_before = self.new_listing_counts.get(group_url, 0)
+        started = time.monotonic()
+        listings = await self.scrape_facebook_group(group_url, max_posts, scrolls)
+        seconds = time.monotonic() - started
+        
+        # Cached responses cost no call and say nothing new about the group
+        if self.scheduler and group_url not in self._served_from_cache:
+            new_listings = self.new_listing_counts.get(group_url, 0) - new_before
+            self.scheduler.record(group_url, scrolls, len(listings), new_listings, seconds)
+        self._served_from_cache.discard(group_url)
+        return listings
+    
+    async def scrape_facebook_group(
+        self, group_url: str, max_posts: int = 10, scrolls: int = DEFAULT_SCROLLS
+    ) -> List[RentalListing]:
+        """Scrape rental listings from a Facebook group using Firecrawl, scrolling the feed `scrolls` times"""
         if not self.api_key:
             self.logger.error("Firecrawl API key not configured")
             return []
@@ -263,155 +443,404 @@ class FirecrawlRentalScraper:
         
         group_id = group_id_match.group(1)
         group_name = f"Group {group_id}"
+        group_listings: List[RentalListing] = []
         
         try:
             self.logger.info(f"Scraping group with Firecrawl: {group_url}")
             
             # Scrape the page with Firecrawl
             # Use actions to scroll and load more posts
-            result = self.app.scrape_url(
-                group_url,
-                params={
-                    'formats': ['markdown', 'screenshot'],
-                    'waitFor': 5000,  # Wait for content to load
-                    'actions': [
-                        {'type': 'scroll', 'direction': 'down', 'amount': 1000},
-                        {'type': 'wait', 'milliseconds': 2000},
-                        {'type': 'scroll', 'direction': 'down', 'amount': 1000},
-                        {'type': 'wait', 'milliseconds': 2000},
-                        {'type': 'scroll', 'direction': 'down', 'amount': 1000},
-                    ]
-                }
-            )
-            
-            if result and 'content' in result:
-                # Parse the content to extract individual posts
-                content = result['content']
-                
-                # Split content into posts (this is a simplified approach)
-                # In reality, we'd need more sophisticated parsing
-                posts = content.split('\n\n')
-                
-                for i, post_text in enumerate(posts[:max_posts]):
-                    if len(post_text) < 50:  # Skip short snippets
-                        continue
-                    
-                    # Create a mock content object for parsing
-                    post_content = {
-                        'content': post_text,
-                        'url': f"{group_url}/posts/{i}",
-                        'metadata': {'title': post_text[:50]}
-                    }
-                    
-                    listing = self._parse_listing_from_content(post_content, group_id, group_name)
-                    if listing:
-                        self.listings.append(listing)
-                        await self.save_listing_to_supabase(listing)
-                        self.logger.info(f"Scraped listing: {listing.title[:50]}...")
+            actions = []
+            for _ in range(max(1, scrolls)):
+                if actions:
+                    actions.append({'type': 'wait', 'milliseconds': 2000})
+                actions.append({'type': 'scroll', 'direction': 'down', 'amount': 1000})
+            scrape_params = {
+                'formats': ['markdown', 'screenshot'],
+                'waitFor': 5000,  # Wait for content to load
+                'actions': actions
+            }
             
-            # Alternative: Use crawl to get multiple pages
-            # This would be better for getting individual post URLs
-            """
-            crawl_result = self.app.crawl_url(
-                group_url,
-                params={
-                    'limit': max_posts,
-                    'scrapeOptions': {
-                        'formats': ['markdown'],
-                        'waitFor': 3000,
-                    }
-                }
-            )
+            result = await self._scrape_url(group_url, scrape_params, scrolls)
             
-            if crawl_result and 'data' in crawl_result:
-                for page_data in crawl_result['data']:
-                    listing = self._parse_listing_from_content(page_data, group_id, group_name)
+            if result and 'content' in result:
+                # Segment the feed into posts, stopping once max_posts rentals are found
+                for post in iter_posts(result['content']):
+                    if len(group_listings) >= max_posts:
+                        break
+                    listing = await self._handle_post(post, group_url, group_id, group_name)
                     if listing:
-                        self.listings.append(listing)
-                        await self.save_listing_to_supabase(listing)
-            """
+                        group_listings.append(listing)
             
-            self.logger.info(f"Found {len(self.listings)} rental listings")
+            self.logger.info(f"Found {len(group_listings)} rental listings in {group_url}")
             
         except Exception as e:
             self.logger.error(f"Error scraping with Firecrawl: {e}")
         
-        return self.listings
+        return group_listings
+    
+    async def _handle_post(
+        self, post: MarkdownPost, group_url: str, group_id: str, group_name: str
+    ) -> Optional[RentalListing]:
+        """Parse one segmented post and, if it is a rental, record and persist it"""
+        post_text = post.text
+        if len(post_text) < MIN_POST_LENGTH:
+            return None
+        
+        post_content = {
+            'content': post_text,
+            'url': post.permalink or group_url,
+            'metadata': {'title': post_text[:50]}
+        }
+        
+        listing = self._parse_listing_from_content(post_content, group_id, group_name)
+        if not listing:
+            return None
+        
+        # Real post id from the permalink, else a content hash - stable across runs
+        listing.facebook_id = post.post_id
+        listing.landlord_name = post.author
+        listing.landlord_profile_url = post.author_url
+        self.listings.append(listing)
+        if self.export_writer:
+            self.export_writer.write(listing)
+        status = await self.save_listing_to_supabase(listing)
+        if status == STATUS_NEW:
+            self.new_listing_counts[group_url] = self.new_listing_counts.get(group_url, 0) + 1
+        self.logger.info(f"Scraped listing: {listing.title[:50]}...")
+        return listing
+    
+    async def crawl_facebook_group(
+        self,
+        group_url: str,
+        max_posts: int = 10,
+        poll_interval: float = CRAWL_POLL_INTERVAL,
+        timeout: float = CRAWL_TIMEOUT
+    ) -> List[RentalListing]:
+        """
+        Crawl a group's post pages as a Firecrawl job, processing pages as they complete
+        
+        The job is submitted without waiting; a poller hands each newly
+        completed page to a consumer that parses and saves it, so persisting
+        overlaps with crawling. Every post page carries its real permalink.
+        
+        The submit carries an idempotency key and is never retried after a
+        timeout, so one call starts at most one job. Once max_posts listings
+        are found the job is cancelled if the SDK can (cancel_crawl, newer
+        firecrawl-py); the pinned 0.0.16 SDK has no cancel, so there the job
+        runs on to its page limit and only the polling stops.
+        """
+        if not self.api_key:
+            self.logger.error("Firecrawl API key not configured")
+            return []
+        
+        group_id_match = re.search(r'/groups/(\d+)', group_url)
+        if not group_id_match:
+            self.logger.error(f"Invalid group URL: {group_url}")
+            return []
+        
+        group_id = group_id_match.group(1)
+        group_name = f"Group {group_id}"
+        group_listings: List[RentalListing] = []
+        breaker = get_breaker('firecrawl')
+        
+        crawl_params = {
+            # Pages that are not rentals are skipped, so crawl some headroom
+            'limit': max_posts * 3,
+            'includePaths': [f'groups/{group_id}/posts/.*', f'groups/{group_id}/permalink/.*'],
+            'scrapeOptions': {
+                'formats': ['markdown'],
+                'waitFor': 3000,
+            }
+        }
+        
+        # Reused by every attempt, so a retried submit cannot start a second job
+        idempotency_key = str(uuid.uuid4())
+        try:
+            job = await call_async(
+                lambda: self._run_blocking(
+                    self.app.crawl_url, group_url, params=crawl_params, wait_until_done=False,
+                    idempotency_key=idempotency_key
+                ),
+                FIRECRAWL_POLICY,
+                breaker,
+                f"Firecrawl crawl submit for {group_url}"
+            )
+        except Exception as e:
+            self.logger.error(f"Error starting Firecrawl crawl of {group_url}: {e}")
+            return []
+        
+        job_id = job.get('jobId') or job.get('id')
+        self.logger.info(f"Started Firecrawl crawl {job_id} for {group_url}")
+        
+        pages: asyncio.Queue = asyncio.Queue()
+        done = asyncio.Event()
+        
+        async def poll():
+            seen = set()
+            deadline = time.monotonic() + timeout
+            try:
+                while not done.is_set():
+                    status = await call_async(
+                        lambda: self._run_blocking(self.app.check_crawl_status, job_id),
+                        FIRECRAWL_STATUS_POLICY,
+                        breaker,
+                        f"Firecrawl crawl status {job_id}"
+                    )
+                    # Finished pages arrive in partial_data while the job runs (v0) or data (v1)
+                    for page in (status.get('data') or []) + (status.get('partial_data') or []):
+                        page_url = self._page_url(page)
+                        if page_url not in seen:
+                            seen.add(page_url)
+                            await pages.put(page)
+                    
+                    state = status.get('status')
+                    if state in ('completed', 'failed', 'cancelled'):
+                        if state != 'completed':
+                            self.logger.warning(f"Firecrawl crawl {job_id} ended as {state}")
+                        return
+                    if time.monotonic() > deadline:
+                        self.logger.warning(f"Stopped following Firecrawl crawl {job_id} after {timeout:.0f}s")
+                        return
+                    await asyncio.sleep(poll_interval)
+            finally:
+                await pages.put(None)
+        
+        poller = asyncio.create_task(poll())
+        try:
+            while len(group_listings) < max_posts:
+                page = await pages.get()
+                if page is None:
+                    break
+                listing = await self._handle_crawled_page(page, group_url, group_id, group_name)
+                if listing:
+                    group_listings.append(listing)
+        finally:
+            done.set()
+            stopped_early = not poller.done()
+            if stopped_early:
+                poller.cancel()
+            try:
+                await poller
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                self.logger.error(f"Error polling Firecrawl crawl {job_id}: {e}")
+            if stopped_early:
+                await self._cancel_crawl(job_id)
+        
+        self.logger.info(f"Found {len(group_listings)} rental listings crawling {group_url}")
+        return group_listings
     
-    async def save_listing_to_supabase(self, listing: RentalListing):
-        """Save a single listing to Supabase"""
+    async def _cancel_crawl(self, job_id: str):
+        """Stop a crawl job we no longer need, when the SDK supports it"""
+        cancel = getattr(self.app, 'cancel_crawl', None)
+        if cancel is None:
+            self.logger.info(f"Firecrawl SDK cannot cancel jobs; crawl {job_id} runs on to its page limit")
+            return
         try:
-            # Check if rental already exists
-            existing = self.supabase.table('rentals').select('id').eq('facebook_id', listing.facebook_id).execute()
+            await self._run_blocking(cancel, job_id)
+            self.logger.info(f"Cancelled Firecrawl crawl {job_id}")
+        except Exception as e:
+            self.logger.warning(f"Could not cancel Firecrawl crawl {job_id}: {e}")
+    
+    @staticmethod
+    def _page_url(page: Dict) -> str:
+        metadata = page.get('metadata') or {}
+        return page.get('url') or metadata.get('sourceURL') or metadata.get('url') or ''
+    
+    async def _handle_crawled_page(
+        self, page: Dict, group_url: str, group_id: str, group_name: str
+    ) -> Optional[RentalListing]:
+        """Turn one crawled page into a listing - the post itself, not its comments"""
+        markdown = page.get('markdown') or page.get('content') or ''
+        permalink = canonical_permalink(self._page_url(page))
+        if not permalink:
+            # A feed page rather than a post page - nothing addressable to save
+            return None
+        
+        post = next(iter_posts(markdown), None)
+        if post is None:
+            return None
+        post.permalink = permalink
+        return await self._handle_post(post, group_url, group_id, group_name)
+    
+    def _build_rental_rows(self, listing: RentalListing) -> Tuple[Dict, List[Dict], List[str], Dict]:
+        """Build the rentals, rental_images, amenity and scrape_metadata rows for a listing"""
+        rental_data = {
+            'facebook_id': listing.facebook_id,
+            'title': listing.title,
+            'description': listing.description,
+            'price_per_month': listing.price_per_month,
+            'currency': listing.currency,
+            'location_text': listing.location_text,
+            'bedrooms': listing.bedrooms,
+            'bathrooms': listing.bathrooms,
+            'property_type': listing.property_type,
+            'available_date': listing.available_date,
+            'is_active': True,
+            'scraped_at': listing.scraped_at.isoformat(),
+        }
+        
+        # Use the UploadThing URL for all images for now
+        uploadthing_url = 'https://py5iwgffjd.ufs.sh/f/ErznS8cNMHlPwNeWJbGFASWOq8cpgZKI6N2mDBoGVLrsvlfC'
+        image_rows = [
+            {
+                'image_url': uploadthing_url,
+                'image_order': idx,
+                'is_primary': idx == 0
+            }
+            for idx in range(min(3, len(listing.image_urls)))
+        ]
+        
+        metadata = {
+            'source_url': listing.listing_url,
+            'source_type': 'facebook_group',
+            'source_id': listing.group_id,
+            'source_name': listing.group_name,
+        }
+        
+        return rental_data, image_rows, list(listing.amenities), metadata
+    
+    def _flag_near_duplicate(self, listing: RentalListing, rental_data: Dict):
+        """Flag a new listing for duplicate review if it looks like a repost"""
+        if not self.near_duplicates:
+            return
+        duplicate = self.near_duplicates.flag(listing.facebook_id, rental_data)
+        if duplicate:
+            self.logger.info(
+                f"Listing {listing.facebook_id} looks like a repost of rental {duplicate.rental_id} "
+                f"({duplicate.similarity:.0%} similar), flagging for review"
+            )
+    
+    def _remember(self, listing: RentalListing, rental_id: Optional[str], rental_data: Dict, image_urls: List[str]):
+        """Record a saved listing's fingerprint and index its text for near-duplicate lookups"""
+        if self.fingerprints:
+            self.fingerprints.record(listing.facebook_id, rental_id, rental_data, image_urls)
+        if rental_id and self.near_duplicates:
+            self.near_duplicates.add_listing(rental_id, listing.facebook_id, rental_data)
+    
+    def remap_rental_id(self, facebook_id: str, rental_id: str):
+        """Point local state at the upstream rental id of a listing that already existed"""
+        if self.fingerprints:
+            self.fingerprints.remap_rental_id(facebook_id, rental_id)
+        if self.near_duplicates:
+            self.near_duplicates.remap_rental_id(facebook_id, rental_id)
+    
+    async def save_listing_to_supabase(self, listing: RentalListing) -> Optional[str]:
+        """
+        Save a single listing to Supabase (or to the local outbox when configured)
+        
+        With a fingerprint store, listings whose content fingerprint is unchanged
+        are skipped without a round trip. Changed listings only get their
+        changed fields updated.
+        
+        Returns:
+            STATUS_NEW, STATUS_CHANGED or STATUS_UNCHANGED, or None if saving failed
+        """
+        rental_data, image_rows, amenity_names, metadata = self._build_rental_rows(listing)
+        image_urls = [row['image_url'] for row in image_rows]
+        
+        if self.fingerprints:
+            change = self.fingerprints.check(listing.facebook_id, rental_data, image_urls)
+        else:
+            change = ChangeResult(status=STATUS_NEW)
+        if change.status == STATUS_UNCHANGED:
+            self.logger.info(f"Listing {listing.facebook_id} unchanged, skipping")
+            return STATUS_UNCHANGED
+        
+        if self.outbox:
+            if change.status == STATUS_CHANGED:
+                self.outbox.enqueue_update(change.rental_id, *build_change_rows(change, rental_data, image_rows))
+                self._remember(listing, change.rental_id, rental_data, image_urls)
+                self.logger.info(f"Queued update of changed listing {listing.facebook_id} in local outbox")
+                return STATUS_CHANGED
             
-            if existing.data:
-                self.logger.info(f"Listing {listing.facebook_id} already exists, skipping")
-                return
+            self._flag_near_duplicate(listing, rental_data)
+            rental_id = self.outbox.enqueue_listing(rental_data, image_rows, amenity_names, metadata)
+            if rental_id:
+                self._remember(listing, rental_id, rental_data, image_urls)
+                self.logger.info(f"Queued listing {listing.facebook_id} in local outbox")
+                return STATUS_NEW
+            self.logger.info(f"Listing {listing.facebook_id} already queued, skipping")
+            return STATUS_UNCHANGED
+        
+        try:
+            if change.status == STATUS_NEW:
+                # Check if rental already exists (e.g. saved before fingerprints were kept, or without them)
+                existing = await self._execute(self.supabase.table('rentals').select(
+                    'id, ' + ', '.join(TRACKED_FIELDS)
+                ).eq('facebook_id', listing.facebook_id))
+                
+                if existing.data:
+                    stored = existing.data[0]
+                    stored_images = await self._execute(self.supabase.table('rental_images').select('image_url').eq('rental_id', stored['id']))
+                    change = diff_against_stored(
+                        stored['id'], stored, [img['image_url'] for img in stored_images.data], rental_data, image_urls
+                    )
+                    if change.status == STATUS_UNCHANGED:
+                        self._remember(listing, stored['id'], rental_data, image_urls)
+                        self.logger.info(f"Listing {listing.facebook_id} already exists, skipping")
+                        return STATUS_UNCHANGED
             
-            # Insert rental
-            rental_data = {
-                'facebook_id': listing.facebook_id,
-                'title': listing.title,
-                'description': listing.description,
-                'price_per_month': listing.price_per_month,
-                'currency': listing.currency,
-                'location_text': listing.location_text,
-                'bedrooms': listing.bedrooms,
-                'bathrooms': listing.bathrooms,
-                'property_type': listing.property_type,
-                'available_date': listing.available_date,
-                'is_active': True,
-                'scraped_at': listing.scraped_at.isoformat(),
-            }
+            if change.status == STATUS_CHANGED:
+                updates, new_image_rows, price_row = build_change_rows(change, rental_data, image_rows)
+                
+                if updates:
+                    await self._execute(self.supabase.table('rentals').update(updates).eq('id', change.rental_id))
+                for image_data in new_image_rows:
+                    await self._execute(self.supabase.table('rental_images').insert({'rental_id': change.rental_id, **image_data}))
+                if price_row:
+                    await self._execute(self.supabase.table('rental_price_history').insert(price_row))
+                
+                self._remember(listing, change.rental_id, rental_data, image_urls)
+                self.logger.info(f"Updated {sorted(updates)} and {len(new_image_rows)} images of listing {listing.facebook_id}")
+                return STATUS_CHANGED
+            
+            self._flag_near_duplicate(listing, rental_data)
             
-            rental_result = self.supabase.table('rentals').insert(rental_data).execute()
+            # Insert rental
+            rental_result = await self._execute(self.supabase.table('rentals').insert(rental_data))
             
             if rental_result.data:
                 rental_id = rental_result.data[0]['id']
                 
                 # Insert images
-                if listing.image_urls:
-                    # Use the UploadThing URL for all images for now
-                    uploadthing_url = 'https://py5iwgffjd.ufs.sh/f/ErznS8cNMHlPwNeWJbGFASWOq8cpgZKI6N2mDBoGVLrsvlfC'
-                    for idx in range(min(3, len(listing.image_urls))):
-                        image_data = {
-                            'rental_id': rental_id,
-                            'image_url': uploadthing_url,
-                            'image_order': idx,
-                            'is_primary': idx == 0
-                        }
-                        self.supabase.table('rental_images').insert(image_data).execute()
+                for image_data in image_rows:
+                    await self._execute(self.supabase.table('rental_images').insert({'rental_id': rental_id, **image_data}))
                 
                 # Insert amenities
-                if listing.amenities:
-                    amenity_results = self.supabase.table('amenities').select('id, name').execute()
+                if amenity_names:
+                    amenity_results = await self._execute(self.supabase.table('amenities').select('id, name'))
                     amenity_map = {a['name']: a['id'] for a in amenity_results.data}
                     
-                    for amenity_name in listing.amenities:
+                    for amenity_name in amenity_names:
                         if amenity_name in amenity_map:
                             rental_amenity_data = {
                                 'rental_id': rental_id,
                                 'amenity_id': amenity_map[amenity_name]
                             }
-                            self.supabase.table('rental_amenities').insert(rental_amenity_data).execute()
+                            await self._execute(self.supabase.table('rental_amenities').insert(rental_amenity_data))
                 
                 # Insert scrape metadata
-                metadata = {
-                    'rental_id': rental_id,
-                    'source_url': listing.listing_url,
-                    'source_type': 'facebook_group',
-                    'source_id': listing.group_id,
-                    'source_name': listing.group_name,
-                }
-                self.supabase.table('scrape_metadata').insert(metadata).execute()
+                await self._execute(self.supabase.table('scrape_metadata').insert({'rental_id': rental_id, **metadata}))
                 
+                self._remember(listing, rental_id, rental_data, image_urls)
                 self.logger.info(f"Saved listing {listing.facebook_id} to Supabase")
+                return STATUS_NEW
                 
         except Exception as e:
             self.logger.error(f"Error saving to Supabase: {e}")
+        return None
     
     def save_to_json(self, filename: str = "firecrawl_rentals.json"):
-        """Save scraped listings to JSON"""
+        """Save scraped listings to JSON (or JSON Lines for .jsonl[.gz|.zst] filenames)"""
+        if is_jsonl_path(filename):
+            with JsonlWriter(filename) as writer:
+                writer.write_many(self.listings)
+            self.logger.info(f"Saved {len(self.listings)} listings to {filename}")
+            return
+        
         data = {
             "scraped_at": datetime.now().isoformat(),
             "total_listings": len(self.listings),
@@ -422,6 +851,20 @@ class FirecrawlRentalScraper:
             json.dump(data, f, indent=2, default=str, ensure_ascii=False)
         
         self.logger.info(f"Saved {len(self.listings)} listings to {filename}")
+    
+    def close(self):
+        """Close the streaming export file, the local stores, the group history and the Firecrawl pool"""
+        if self.export_writer:
+            self.export_writer.close()
+        if self.fingerprints:
+            self.fingerprints.close()
+        if self.near_duplicates:
+            self.near_duplicates.close()
+        if self.response_cache:
+            self.response_cache.close()
+        if self.scheduler:
+            self.scheduler.close()
+        self._executor.shutdown(wait=False)
 
 
 async def main():
@@ -430,10 +873,20 @@ async def main():
     import asyncio
     
     parser = argparse.ArgumentParser(description="Firecrawl Facebook Group Rental Scraper")
-    parser.add_argument("--group", type=str, help="Facebook group URL to scrape")
-    parser.add_argument("--max-posts", type=int, default=10, help="Maximum posts to scrape")
+    parser.add_argument("--group", type=str, action="append", help="Facebook group URL to scrape (repeat for several groups)")
+    parser.add_argument("--max-posts", type=int, default=10, help="Maximum posts to scrape per group")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_GROUP_CONCURRENCY, help="Groups scraped at once")
+    parser.add_argument("--crawl", action="store_true", help="Crawl each group's post pages as a Firecrawl job")
+    parser.add_argument("--budget", type=int, help="Firecrawl calls to spend, on the groups most likely to have new listings")
+    parser.add_argument("--no-history", action="store_true", help="Do not record or use per-group yield history")
+    parser.add_argument("--fingerprints", action="store_true", help="Skip listings unchanged since an earlier run (local fingerprint store)")
+    parser.add_argument("--near-duplicates", action="store_true", help="Flag reposts of earlier listings for duplicate review (local MinHash index)")
+    parser.add_argument("--cache", action="store_true", help="Serve repeat scrapes from the on-disk Firecrawl response cache")
+    parser.add_argument("--refresh", action="store_true", help="Fetch again and overwrite the cached Firecrawl responses")
     parser.add_argument("--api-key", type=str, help="Firecrawl API key (or set FIRECRAWL_API_KEY env var)")
     parser.add_argument("--json", action="store_true", help="Output JSON for API")
+    parser.add_argument("--outbox", type=str, help="Commit listings to this local outbox database and sync afterwards")
+    parser.add_argument("--output", type=str, help="Stream listings to this JSON Lines file (.jsonl, .jsonl.gz, .jsonl.zst)")
     
     args = parser.parse_args()
     
@@ -452,21 +905,39 @@ async def main():
         print("Error: --group URL is required")
         return
     
-    scraper = FirecrawlRentalScraper(api_key=args.api_key)
+    outbox = LocalOutbox(args.outbox) if args.outbox else None
+    scraper = FirecrawlRentalScraper(
+        api_key=args.api_key,
+        outbox=outbox,
+        export_path=args.output,
+        fingerprints=FingerprintStore() if args.fingerprints else None,
+        near_duplicates=NearDuplicateIndex() if args.near_duplicates else None,
+        max_concurrency=args.concurrency,
+        # Cached group feeds go stale within hours, so the cache is opt-in
+        response_cache=ResponseCache() if args.cache or args.refresh else None,
+        refresh=args.refresh,
+        scheduler=None if args.no_history else YieldScheduler(GroupYieldStore())
+    )
     
     try:
-        listings = await scraper.scrape_facebook_group(args.group, args.max_posts)
+        by_group = await scraper.scrape_groups(args.group, args.max_posts, crawl=args.crawl, budget=args.budget)
+        listings = [listing for group_listings in by_group.values() for listing in group_listings]
+        
+        if outbox:
+            OutboxSyncer(outbox, scraper.supabase, on_existing=scraper.remap_rental_id).sync()
         
         if args.json:
             result = {
                 "status": "success",
-                "group_url": args.group,
+                "group_url": args.group[0],
                 "listings_found": len(listings),
+                "groups": {group_url: len(group_listings) for group_url, group_listings in by_group.items()},
                 "message": f"Successfully scraped {len(listings)} rental listings with Firecrawl"
             }
             print(json.dumps(result))
         else:
-            scraper.save_to_json()
+            if not args.output:
+                scraper.save_to_json()
             print(f"\nScraped {len(listings)} rental listings using Firecrawl")
             print(f"Saved to Supabase and JSON file")
             
@@ -479,6 +950,10 @@ async def main():
             print(json.dumps(result))
         else:
             print(f"Error: {e}")
+    finally:
+        scraper.close()
+        if outbox:
+            outbox.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Geohash Grid Index for Proximity Lookups
+Buckets listings by geohash cell so "everything within R meters" only
+scans the neighbouring cells, plus a vectorized haversine distance scorer
+"""
+
+import math
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# <scratchpad>A query touches O(neighbouring cells) buckets; distances are then computed in one vectorized pass</scratchpad>
+# AI-DEV: Cells shrink in longitude away from the equator - bbox stepping accounts for that
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE_LAT = 111_320
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Location tiers from docs/duplicate_detection_system.md (distance in meters -> points)
+LOCATION_TIERS = [(1, 40), (10, 35), (50, 25), (100, 15), (200, 5)]
+
+
+def geohash_encode(latitude: float, longitude: float, precision: int = 7) -> str:
+    """Encode a coordinate as a geohash of the given length"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) of a geohash cell in degrees"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in meters
+
+    With numpy installed, arguments may be arrays and broadcast against each
+    other (e.g. lat1[:, None] against lat2[None, :] for a distance matrix).
+    """
+    if np is None:
+        lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def location_score(distance_m):
+    """Duplicate-score location points for a distance (vectorized over arrays with numpy)"""
+    if np is None or np.isscalar(distance_m):
+        for limit, points in LOCATION_TIERS:
+            if distance_m < limit:
+                return points
+        return 0
+    distance_m = np.asarray(distance_m)
+    return np.select([distance_m < limit for limit, _ in LOCATION_TIERS], [p for _, p in LOCATION_TIERS], default=0)
+
+
+class GeoGridIndex:
+    """
+    In-memory geohash grid of points
+
+    Pick the precision so cells are at least as large as typical query radii:
+    precision 7 cells are about 150 m, precision 6 about 1.2 km.
+    """
+
+    def __init__(self, precision: int = 7):
+        self.precision = precision
+        self.cell_height, self.cell_width = geohash_cell_size(precision)
+        self.cells: Dict[str, List[int]] = defaultdict(list)
+        self.latitudes: List[float] = []
+        self.longitudes: List[float] = []
+        self.items: List[Any] = []
+        self._arrays: Optional[Tuple] = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, latitude: Optional[float], longitude: Optional[float], item: Any) -> bool:
+        """
+        Index a point
+
+        Returns:
+            False if the item has no coordinates
+        """
+        if latitude is None or longitude is None:
+            return False
+        position = len(self.items)
+        self.latitudes.append(float(latitude))
+        self.longitudes.append(float(longitude))
+        self.items.append(item)
+        self.cells[geohash_encode(latitude, longitude, self.precision)].append(position)
+        self._arrays = None
+        return True
+
+    def _covering_cells(self, latitude: float, longitude: float, radius_m: float) -> Set[str]:
+        """Geohash cells overlapping the bounding box of the search circle"""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+
+        cells = set()
+        lat = max(-90.0, latitude - dlat)
+        while True:
+            lng = longitude - dlng
+            while True:
+                cells.add(geohash_encode(lat, ((lng + 180) % 360) - 180, self.precision))
+                if lng >= longitude + dlng:
+                    break
+                lng = min(lng + self.cell_width, longitude + dlng)
+            if lat >= min(90.0, latitude + dlat):
+                break
+            lat = min(lat + self.cell_height, latitude + dlat, 90.0)
+        return cells
+
+    def _candidates(self, latitude: float, longitude: float, radius_m: float) -> List[int]:
+        positions = []
+        for cell in self._covering_cells(latitude, longitude, radius_m):
+            positions.extend(self.cells.get(cell, ()))
+        return positions
+
+    def query(self, latitude: float, longitude: float, radius_m: float) -> List[Tuple[float, Any]]:
+        """
+        All indexed items within radius_m meters
+
+        Returns:
+            (distance in meters, item) pairs, nearest first
+        """
+        positions = self._candidates(latitude, longitude, radius_m)
+        if not positions:
+            return []
+
+        if np is not None:
+            if self._arrays is None:
+                self._arrays = (np.array(self.latitudes), np.array(self.longitudes))
+            lats, lngs = self._arrays
+            idx = np.array(positions)
+            distances = haversine_m(latitude, longitude, lats[idx], lngs[idx])
+            within = np.nonzero(distances <= radius_m)[0]
+            matches = [(float(distances[i]), self.items[positions[i]]) for i in within]
+        else:
+            matches = []
+            for position in positions:
+                distance = haversine_m(latitude, longitude, self.latitudes[position], self.longitudes[position])
+                if distance <= radius_m:
+                    matches.append((distance, self.items[position]))
+
+        return sorted(matches, key=lambda match: match[0])
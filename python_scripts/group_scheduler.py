@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Yield-Aware Group Scheduler
+Records how many new rental listings each group's scrapes return and how
+long they take, and spends a fixed Firecrawl call budget on the groups most
+likely to return new listings, scrolling deeper where posts arrive faster
+"""
+
+import os
+import math
+import time
+import random
+import sqlite3
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# <scratchpad>Thompson sampling: groups never scraped get wide posteriors, so they are still tried now and then</scratchpad>
+# AI-DEV: History is weighted by age (half-life) - a group that went quiet stops winning calls within a few weeks
+
+DEFAULT_GROUP_HISTORY_PATH = os.getenv('SCRAPER_GROUP_HISTORY_PATH', 'scraper_group_history.db')
+
+# Scroll actions per feed scrape: the default depth, and the most any group gets
+DEFAULT_SCROLLS = 3
+MAX_SCROLLS = 8
+
+# Seconds per scroll assumed for groups without history
+DEFAULT_SECONDS_PER_SCROLL = 4.0
+
+
+@dataclass
+class GroupStats:
+    """Age-weighted totals of a group's recorded calls"""
+    group_url: str
+    calls: float = 0.0
+    scrolls: float = 0.0
+    new_listings: float = 0.0
+    seconds: float = 0.0
+
+    @property
+    def new_per_call(self) -> float:
+        return self.new_listings / self.calls if self.calls else 0.0
+
+    @property
+    def seconds_per_scroll(self) -> Optional[float]:
+        return self.seconds / self.scrolls if self.scrolls else None
+
+
+@dataclass
+class GroupAllocation:
+    """One planned call: which group, how deep to scroll, and the sampled yield behind it"""
+    group_url: str
+    scrolls: int
+    new_per_scroll: float
+
+
+class GroupYieldStore:
+    """
+    SQLite log of scrape calls per group
+
+    Use path=':memory:' for a throwaway store.
+    """
+
+    def __init__(self, path: str = DEFAULT_GROUP_HISTORY_PATH, half_life_days: float = 14.0):
+        self.path = path
+        self.half_life = half_life_days * 86400
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS group_calls (
+                    group_url TEXT NOT NULL,
+                    called_at REAL NOT NULL,
+                    scrolls INTEGER NOT NULL,
+                    listings INTEGER NOT NULL,
+                    new_listings INTEGER NOT NULL,
+                    seconds REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_group_calls_group ON group_calls (group_url, called_at)")
+
+    def record(self, group_url: str, scrolls: int, listings: int, new_listings: int, seconds: float):
+        """Log one completed scrape of a group"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO group_calls (group_url, called_at, scrolls, listings, new_listings, seconds) VALUES (?, ?, ?, ?, ?, ?)",
+                (group_url, time.time(), scrolls, listings, new_listings, seconds)
+            )
+
+    def stats(self, group_urls: Iterable[str]) -> Dict[str, GroupStats]:
+        """Age-weighted stats for each group (empty stats for groups never scraped)"""
+        stats = {url: GroupStats(url) for url in group_urls}
+        if not stats:
+            return stats
+        now = time.time()
+        # Rows older than ten half-lives weigh under 0.1% - leave them out
+        since = now - 10 * self.half_life
+        placeholders = ','.join('?' * len(stats))
+        rows = self.conn.execute(
+            f"""
+            SELECT group_url, called_at, scrolls, new_listings, seconds FROM group_calls
+            WHERE called_at >= ? AND group_url IN ({placeholders})
+            """,
+            (since, *stats)
+        )
+        for group_url, called_at, scrolls, new_listings, seconds in rows:
+            weight = 0.5 ** ((now - called_at) / self.half_life)
+            group = stats[group_url]
+            group.calls += weight
+            group.scrolls += weight * scrolls
+            group.new_listings += weight * new_listings
+            group.seconds += weight * seconds
+        return stats
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+
+class YieldScheduler:
+    """
+    Plans which groups to scrape, and how deep, under a call budget
+
+    Each group's rate of new listings per scroll gets a Gamma posterior
+    (Gamma-Poisson conjugate prior). Every plan draws one rate per group,
+    calls the groups with the highest draws per second of scraping, and
+    splits the scroll budget among them in proportion to their draws.
+    """
+
+    def __init__(
+        self,
+        store: GroupYieldStore,
+        prior_new: float = 1.0,
+        prior_scrolls: float = 2.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            prior_new, prior_scrolls: Pseudo-observations of the prior - a fresh
+                group looks like one that returned prior_new listings in prior_scrolls scrolls
+        """
+        self.store = store
+        self.prior_new = prior_new
+        self.prior_scrolls = prior_scrolls
+        self.rng = random.Random(seed)
+        self.logger = logging.getLogger(__name__)
+
+    def sample_rate(self, stats: GroupStats) -> float:
+        """Draw a new-listings-per-scroll rate from the group's posterior"""
+        shape = self.prior_new + stats.new_listings
+        rate = self.prior_scrolls + stats.scrolls
+        return self.rng.gammavariate(shape, 1.0 / rate)
+
+    def plan(
+        self,
+        group_urls: List[str],
+        calls: int,
+        scrolls_per_call: int = DEFAULT_SCROLLS,
+        max_scrolls: int = MAX_SCROLLS
+    ) -> List[GroupAllocation]:
+        """
+        Choose up to `calls` groups and a scroll depth for each
+
+        The scroll budget is calls * scrolls_per_call; each chosen group gets
+        between 1 and max_scrolls of it.
+
+        Returns:
+            Allocations, most promising group first
+        """
+        group_urls = list(dict.fromkeys(group_urls))
+        if calls <= 0 or not group_urls:
+            return []
+
+        stats = self.store.stats(group_urls)
+        known = [s.seconds_per_scroll for s in stats.values() if s.seconds_per_scroll]
+        default_seconds = sum(known) / len(known) if known else DEFAULT_SECONDS_PER_SCROLL
+
+        rates = {url: self.sample_rate(stats[url]) for url in group_urls}
+        # Rank by sampled new listings per second, so slow groups must earn their calls
+        ranked = sorted(
+            group_urls,
+            key=lambda url: rates[url] / (stats[url].seconds_per_scroll or default_seconds),
+            reverse=True
+        )
+        chosen = ranked[:calls]
+
+        allocations = self._split_scrolls(chosen, rates, len(chosen) * scrolls_per_call, max_scrolls)
+        for allocation in allocations:
+            group = stats[allocation.group_url]
+            self.logger.info(
+                f"Scheduling {allocation.group_url}: {allocation.scrolls} scrolls "
+                f"(sampled {allocation.new_per_scroll:.2f} new/scroll, history {group.new_per_call:.2f} new/call)"
+            )
+        skipped = len(group_urls) - len(chosen)
+        if skipped:
+            self.logger.info(f"Skipping {skipped} groups this run - budget of {calls} calls")
+        return allocations
+
+    @staticmethod
+    def _split_scrolls(
+        chosen: List[str], rates: Dict[str, float], budget: int, max_scrolls: int
+    ) -> List[GroupAllocation]:
+        """Proportional split of the scroll budget, each group clamped to [1, max_scrolls]"""
+        depth = {url: 1 for url in chosen}
+        remaining = budget - len(chosen)
+        total_rate = sum(rates[url] for url in chosen)
+        if remaining > 0 and total_rate > 0:
+            for url in chosen:
+                share = math.floor(remaining * rates[url] / total_rate)
+                depth[url] = min(max_scrolls, depth[url] + share)
+            # Hand out what flooring and clamping left over, best groups first
+            leftover = budget - sum(depth.values())
+            for url in chosen:
+                if leftover <= 0:
+                    break
+                extra = min(max_scrolls - depth[url], leftover)
+                depth[url] += extra
+                leftover -= extra
+        return [GroupAllocation(url, depth[url], rates[url]) for url in chosen]
+
+    def record(self, group_url: str, scrolls: int, listings: int, new_listings: int, seconds: float):
+        """Feed a scrape's outcome back into the history"""
+        self.store.record(group_url, scrolls, listings, new_listings, seconds)
+
+    def close(self):
+        self.store.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Show per-group yield history and the next scrape plan")
+    parser.add_argument("--group", type=str, action="append", required=True, help="Facebook group URL (repeat for several groups)")
+    parser.add_argument("--budget", type=int, default=5, help="Firecrawl calls to plan")
+    parser.add_argument("--history", type=str, default=DEFAULT_GROUP_HISTORY_PATH, help="Group history database")
+    parser.add_argument("--json", action="store_true", help="Output JSON for API")
+
+    args = parser.parse_args()
+
+    scheduler = YieldScheduler(GroupYieldStore(args.history))
+    try:
+        stats = scheduler.store.stats(args.group)
+        allocations = scheduler.plan(args.group, args.budget)
+        if args.json:
+            print(json.dumps({
+                "status": "success",
+                "plan": [{"group_url": a.group_url, "scrolls": a.scrolls} for a in allocations],
+                "history": {url: {"calls": round(s.calls, 2), "new_per_call": round(s.new_per_call, 2)} for url, s in stats.items()}
+            }))
+        else:
+            for url, group in stats.items():
+                print(f"{url}: {group.calls:.1f} weighted calls, {group.new_per_call:.2f} new listings/call")
+            print("\nPlan:")
+            for allocation in allocations:
+                print(f"  {allocation.group_url}: {allocation.scrolls} scrolls")
+    finally:
+        scheduler.close()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Browser Image Capture
+Keeps the bytes of listing photos as the Playwright page loads them, so
+the upload stage never re-downloads a (possibly expired) signed CDN URL
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+# <scratchpad>Images come from the page's own responses first, then from page.request (same cookies) as a fallback</scratchpad>
+# AI-DEV: Bounded by total bytes - a long scroll through a group loads far more images than get uploaded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Hosts serving Facebook photos
+_IMAGE_HOST_MARKERS = ('scontent', 'fbcdn.net')
+
+
+class BrowserImageCapture:
+    """
+    LRU store of image response bodies, keyed by URL
+
+    Call attach(page) before navigating; the store then fills as the page
+    renders posts. collect() returns the bytes for a listing's image URLs.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.images: 'OrderedDict[str, bytes]' = OrderedDict()
+        self.page = None
+        self.captured = 0
+        self.fetched = 0
+
+    def attach(self, page):
+        """Start capturing image responses of a Playwright page"""
+        self.page = page
+        page.on('response', self._on_response)
+
+    @staticmethod
+    def wants(url: str) -> bool:
+        return any(marker in url for marker in _IMAGE_HOST_MARKERS)
+
+    async def _on_response(self, response):
+        if response.request.resource_type != 'image' or response.status != 200 or not self.wants(response.url):
+            return
+        try:
+            body = await response.body()
+        except Exception as e:
+            # Bodies of evicted or navigated-away responses are gone
+            logger.debug(f"Could not read image response {response.url}: {e}")
+            return
+        self._store(response.url, body)
+        self.captured += 1
+
+    def _store(self, url: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        previous = self.images.pop(url, None)
+        if previous is not None:
+            self.total_bytes -= len(previous)
+        self.images[url] = body
+        self.total_bytes += len(body)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.images.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def get(self, url: str) -> Optional[bytes]:
+        body = self.images.get(url)
+        if body is not None:
+            self.images.move_to_end(url)
+        return body
+
+    async def collect(self, urls: Iterable[str], fetch_missing: bool = True) -> Dict[str, bytes]:
+        """
+        Bytes for the given image URLs
+
+        Images the page did not load (e.g. lazy ones never scrolled into view)
+        are fetched through the page's request context, which shares the
+        browser session's cookies.
+
+        Returns:
+            Mapping of URL to bytes for every image that could be obtained
+        """
+        found = {}
+        for url in urls:
+            body = self.get(url)
+            if body is None and fetch_missing and self.page is not None:
+                body = await self._fetch(url)
+            if body is not None:
+                found[url] = body
+        return found
+
+    async def _fetch(self, url: str) -> Optional[bytes]:
+        try:
+            response = await self.page.request.get(url)
+            if not response.ok:
+                logger.debug(f"Image fetch {url} returned {response.status}")
+                return None
+            body = await response.body()
+        except Exception as e:
+            logger.debug(f"Could not fetch image {url}: {e}")
+            return None
+        self._store(url, body)
+        self.fetched += 1
+        return body
+
+    def discard(self, urls: Iterable[str]):
+        """Drop images that have been handed to the upload stage"""
+        for url in urls:
+            body = self.images.pop(url, None)
+            if body is not None:
+                self.total_bytes -= len(body)
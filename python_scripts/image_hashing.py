@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Perceptual Image Hashing and Hamming Index
+DCT pHash for downloaded rental images, and a multi-index Hamming structure
+that finds near-identical photos across millions of images in milliseconds
+"""
+
+import io
+import logging
+from collections import defaultdict
+from itertools import combinations
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+# <scratchpad>Same DCT, bit order and hex format as src/lib/duplicate-detection/image-hashing.ts</scratchpad>
+# AI-DEV: The TS version parses the 64-bit string with parseInt, which drops low bits - Python hashes are exact
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+HASH_SIZE = 32
+LOW_FREQ_SIZE = 8
+
+# Distances matching the duplicate design's image tiers (similarity > 0.95 / > 0.85)
+SAME_IMAGE_DISTANCE = 3
+SIMILAR_IMAGE_DISTANCE = 9
+
+
+def phash_available() -> bool:
+    """Whether Pillow and numpy are installed"""
+    return Image is not None
+
+
+def _dct_matrix(size: int) -> 'np.ndarray':
+    u = np.arange(size)[:, None]
+    i = np.arange(size)[None, :]
+    matrix = np.cos((2 * i + 1) * u * np.pi / (2 * size))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = None
+
+
+def compute_phash(image_data: Union[bytes, BinaryIO]) -> Optional[str]:
+    """
+    64-bit DCT perceptual hash of an image, as 16 hex characters
+
+    Args:
+        image_data: Encoded image bytes, or a seekable file holding them
+
+    Returns:
+        The hash, or None if the bytes are not a decodable image
+    """
+    global _DCT
+    if Image is None:
+        raise ImportError("Perceptual hashing requires Pillow and numpy (pip install pillow numpy)")
+    if isinstance(image_data, (bytes, bytearray)):
+        image_data = io.BytesIO(image_data)
+    else:
+        image_data.seek(0)
+    try:
+        with Image.open(image_data) as image:
+            pixels = np.asarray(
+                image.convert('L').resize((HASH_SIZE, HASH_SIZE), Image.LANCZOS), dtype=np.float64
+            )
+    except Exception as e:
+        logger.debug(f"Could not decode image for hashing: {e}")
+        return None
+
+    if _DCT is None:
+        _DCT = _dct_matrix(HASH_SIZE)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:LOW_FREQ_SIZE, :LOW_FREQ_SIZE].flatten()
+    median = np.sort(coefficients)[len(coefficients) // 2]
+
+    value = 0
+    for bit in coefficients > median:
+        value = (value << 1) | int(bit)
+    return f"{value:016x}"
+
+
+def _to_int(phash: Union[str, int]) -> int:
+    return phash if isinstance(phash, int) else int(phash, 16)
+
+
+def hamming_distance(hash_a: Union[str, int], hash_b: Union[str, int]) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(_to_int(hash_a) ^ _to_int(hash_b)).count('1')
+
+
+class PhashIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes
+
+    Each hash is split into `chunks` substrings, each indexed in its own
+    table. If two hashes differ in at most r bits, at least one substring
+    differs in at most r // chunks bits, so a query only probes the buckets
+    within that small radius and verifies the candidates it finds.
+    """
+
+    def __init__(self, max_distance: int = SIMILAR_IMAGE_DISTANCE, chunks: int = 4):
+        if HASH_BITS % chunks:
+            raise ValueError(f"chunks must divide {HASH_BITS}")
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_mask = (1 << self.chunk_bits) - 1
+        self.tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(chunks)]
+        self.hashes: List[int] = []
+        self.items: List[Any] = []
+        self._probes: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _chunk(self, value: int, idx: int) -> int:
+        return (value >> (idx * self.chunk_bits)) & self.chunk_mask
+
+    def _probe_masks(self, radius: int) -> List[int]:
+        """All chunk XOR masks with at most `radius` bits set"""
+        if radius not in self._probes:
+            masks = []
+            for bits in range(radius + 1):
+                for positions in combinations(range(self.chunk_bits), bits):
+                    mask = 0
+                    for position in positions:
+                        mask |= 1 << position
+                    masks.append(mask)
+            self._probes[radius] = masks
+        return self._probes[radius]
+
+    def add(self, phash: Union[str, int], item: Any):
+        """Index a hash with an associated item (e.g. rental id or image URL)"""
+        value = _to_int(phash)
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.items.append(item)
+        for idx, table in enumerate(self.tables):
+            table[self._chunk(value, idx)].append(position)
+
+    def add_many(self, entries: Iterable[Tuple[Union[str, int], Any]]):
+        for phash, item in entries:
+            self.add(phash, item)
+
+    def search(self, phash: Union[str, int], max_distance: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """
+        Find indexed hashes within max_distance bits
+
+        Returns:
+            (distance, item) pairs, nearest first
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        value = _to_int(phash)
+        masks = self._probe_masks(max_distance // self.chunks)
+
+        seen = set()
+        matches = []
+        for idx, table in enumerate(self.tables):
+            chunk = self._chunk(value, idx)
+            for mask in masks:
+                for position in table.get(chunk ^ mask, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = bin(value ^ self.hashes[position]).count('1')
+                    if distance <= max_distance:
+                        matches.append((distance, self.items[position]))
+
+        return sorted(matches, key=lambda match: match[0])
+
+
+def iter_rental_image_hashes(supabase, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+    """Stream (phash, rental_id) for all hashed rental images, for PhashIndex.add_many"""
+    last_id = None
+    while True:
+        query = supabase.table('rental_images').select('id, rental_id, phash').not_.is_('phash', 'null').order('id').limit(page_size)
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        rows = query.execute().data
+        for row in rows:
+            if row.get('phash'):
+                yield row['phash'], row['rental_id']
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
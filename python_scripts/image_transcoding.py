@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Image Transcoding Stage for Rental Uploads
+Resizes downloaded images, re-encodes them to WebP (or AVIF), strips
+metadata and renders a gallery thumbnail, on a process pool
+"""
+
+import io
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+# <scratchpad>Decoding and encoding are CPU bound - they run in worker processes so the upload event loop keeps streaming</scratchpad>
+# AI-DEV: EXIF orientation is applied before metadata is dropped, otherwise phone photos come out sideways
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'WEBP': 'image/webp', 'AVIF': 'image/avif', 'JPEG': 'image/jpeg'}
+
+
+@dataclass(frozen=True)
+class TranscodeSettings:
+    """Output format and sizes"""
+    format: str = 'WEBP'
+    max_dimension: int = 1600
+    quality: int = 80
+    thumbnail_dimension: int = 400
+    thumbnail_quality: int = 70
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return self.format.lower()
+
+    @property
+    def tag(self) -> str:
+        """Short id of these settings, for cache keys"""
+        return f"{self.extension}{self.max_dimension}q{self.quality}t{self.thumbnail_dimension}q{self.thumbnail_quality}"
+
+
+@dataclass
+class TranscodedImage:
+    """Re-encoded image and its thumbnail"""
+    data: bytes
+    thumbnail: bytes
+    width: int
+    height: int
+
+
+def _encode(image, settings: TranscodeSettings, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    # No exif/icc/xmp arguments - the output carries no metadata
+    image.save(buffer, settings.format, quality=quality)
+    return buffer.getvalue()
+
+
+def transcode_image(image_data: bytes, settings: TranscodeSettings) -> Optional[TranscodedImage]:
+    """
+    Resize, re-encode and thumbnail one image (runs in a worker process)
+
+    Returns:
+        The transcoded image, or None if the bytes are not a decodable image
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as source:
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha and settings.format != 'JPEG' else 'RGB')
+    except Exception as e:
+        logger.debug(f"Could not decode image for transcoding: {e}")
+        return None
+
+    image.thumbnail((settings.max_dimension, settings.max_dimension), Image.LANCZOS)
+    data = _encode(image, settings, settings.quality)
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((settings.thumbnail_dimension, settings.thumbnail_dimension), Image.LANCZOS)
+    return TranscodedImage(
+        data=data,
+        thumbnail=_encode(thumbnail, settings, settings.thumbnail_quality),
+        width=image.width,
+        height=image.height
+    )
+
+
+class ImageTranscoder:
+    """
+    Runs transcode_image on a process pool
+
+    The pool is started on first use and shut down by close().
+    """
+
+    def __init__(self, settings: Optional[TranscodeSettings] = None, max_workers: Optional[int] = None):
+        if Image is None:
+            raise ImportError("Image transcoding requires Pillow (pip install pillow)")
+        self.settings = settings or TranscodeSettings()
+        if self.settings.format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported output format: {self.settings.format}")
+        Image.init()
+        if self.settings.format not in Image.SAVE:
+            raise ValueError(
+                f"This Pillow build cannot encode {self.settings.format} "
+                f"(AVIF needs Pillow 11.2+ or pillow-avif-plugin)"
+            )
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def transcode(self, image_data: bytes) -> Optional[TranscodedImage]:
+        """Transcode off the event loop"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, transcode_image, image_data, self.settings)
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
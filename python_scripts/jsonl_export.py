@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON Lines Export
+Append-as-you-go writer (optionally gzip/zstd compressed) and a matching
+streaming reader for scraped listings
+"""
+
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+from dataclasses import asdict, is_dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# <scratchpad>Each record is flushed as written so a crash keeps everything up to the last listing</scratchpad>
+# AI-DEV: Readers stop cleanly at a truncated final line or compressed frame
+
+logger = logging.getLogger(__name__)
+
+JSONL_SUFFIXES = ('.jsonl', '.jsonl.gz', '.jsonl.zst', '.ndjson')
+
+
+def is_jsonl_path(path: str) -> bool:
+    """Check whether a filename should be written as JSON Lines"""
+    return path.endswith(JSONL_SUFFIXES)
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """Infer compression from the file suffix"""
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def _close_zstd_tail(path: str, chunk_size: int = 1 << 20):
+    """
+    End a zstd frame left open by a crash, so new frames can be appended after it
+
+    Records in the open frame are decompressed and written back as one complete
+    frame; a partial last line is dropped.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    decompressor = zstandard.ZstdDecompressor()
+
+    # Find where the last frame starts and whether it ends
+    with open(path, 'rb') as raw:
+        frame_start, position = 0, 0
+        decoder = decompressor.decompressobj()
+        while True:
+            chunk = raw.read(chunk_size)
+            if not chunk:
+                break
+            while chunk:
+                try:
+                    decoder.decompress(chunk)
+                except zstandard.ZstdError as e:
+                    logger.warning(f"Not appending to {path}: it is not a readable zstd stream ({e})")
+                    raise
+                if not decoder.eof:
+                    position += len(chunk)
+                    break
+                consumed = len(chunk) - len(decoder.unused_data)
+                position += consumed
+                frame_start = position
+                chunk = decoder.unused_data
+                decoder = decompressor.decompressobj()
+    if frame_start == position:
+        return
+
+    # Re-compress the open frame's records into a temporary complete frame
+    with open(path, 'rb') as raw, tempfile.TemporaryFile() as spool:
+        raw.seek(frame_start)
+        data = decompressor.decompressobj().decompress(raw.read())
+        data = data[:data.rfind(b'\n') + 1]
+        with zstandard.ZstdCompressor().stream_writer(spool, closefd=False) as writer:
+            writer.write(data)
+        spool.seek(0)
+        with open(path, 'r+b') as out:
+            out.truncate(frame_start)
+            out.seek(frame_start)
+            while True:
+                block = spool.read(chunk_size)
+                if not block:
+                    break
+                out.write(block)
+    logger.info(f"Closed the unterminated last frame of {path} before appending")
+
+
+def _to_record(obj: Any) -> Any:
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    return obj
+
+
+def serialize_record(record: Any) -> bytes:
+    """Serialize one record to a newline-terminated JSON line"""
+    record = _to_record(record)
+    if orjson is not None:
+        return orjson.dumps(
+            record,
+            default=str,
+            option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+        )
+    return (json.dumps(record, default=str, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _loads(line: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSON Lines file as they are produced
+
+    Memory stays constant regardless of run size, and every flushed record
+    survives a crash.
+    """
+
+    def __init__(self, path: str, compression: Optional[str] = None, flush_every: int = 1):
+        """
+        Args:
+            path: Output file, opened in append mode
+            compression: None, 'gzip' or 'zstd' (inferred from the suffix by default)
+            flush_every: Flush to disk after this many records
+        """
+        self.path = path
+        self.compression = compression or detect_compression(path)
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self._pending = 0
+        self._raw = None
+
+        if self.compression == 'gzip':
+            self._file = gzip.open(path, 'ab')
+        elif self.compression == 'zstd':
+            if zstandard is None:
+                raise ImportError("zstd compression requires the zstandard package")
+            _close_zstd_tail(path)
+            self._raw = open(path, 'ab')
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        elif self.compression is None:
+            self._file = open(path, 'ab')
+        else:
+            raise ValueError(f"Unsupported compression: {self.compression}")
+
+    def write(self, record: Any):
+        """Append a single record"""
+        self._file.write(serialize_record(record))
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def write_many(self, records: Iterable[Any]):
+        """Append records from any iterable without materializing it"""
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Flush buffered records so they are readable after a crash"""
+        if self.compression == 'zstd':
+            # End the current block, not the frame: everything so far decodes, and the
+            # records keep sharing one frame's compression window (close() ends the frame)
+            self._file.flush(zstandard.FLUSH_BLOCK)
+            self._raw.flush()
+        else:
+            self._file.flush()
+        self._pending = 0
+
+    def close(self):
+        """Flush and close the file"""
+        if self._pending:
+            self.flush()
+        self._file.close()
+        if self._raw is not None:
+            self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _open_for_read(path: str, compression: Optional[str]):
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+        raw = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, 'rb')
+
+
+# A crash mid-block shows up as EOF, or as corrupt data if a frame was appended after it
+_TRUNCATION_ERRORS = (EOFError, OSError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def iter_jsonl(path: str, compression: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Stream records from a JSON Lines file one at a time
+
+    A truncated final line or compressed block (e.g. after a crash) ends the
+    stream instead of raising.
+    """
+    compression = compression or detect_compression(path)
+    with _open_for_read(path, compression) as f:
+        line_number = 0
+        while True:
+            try:
+                line = f.readline()
+            except _TRUNCATION_ERRORS as e:
+                logger.warning(f"Stopped reading {path} at a truncated block: {e}")
+                return
+            if not line:
+                return
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                yield _loads(line)
+            except ValueError:
+                if line.endswith(b'\n'):
+                    raise
+                logger.warning(f"Skipping truncated last line {line_number} in {path}")
+                return
@@ -5,20 +5,43 @@ Uses official APIs and ethical data sources for rental information
 """
 
 import os
+import re
+import html
 import json
+import time
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 import httpx
 from dotenv import load_dotenv
+from supabase import Client
+
+from duplicate_clustering import DUPLICATE_THRESHOLD, REVIEW_THRESHOLD, normalize_phone
+from geo_index import GeoGridIndex, location_score
+from jsonl_export import JsonlWriter, is_jsonl_path
+from rss_feed import FeedItem, FeedParser, FeedValidatorStore
+from near_duplicates import shingles
+from supabase_client import get_supabase_client
 
 # <scratchpad>This approach uses legitimate APIs and ethical data sources</scratchpad>
 # AI-DEV: This is a more sustainable approach than scraping Facebook
 
 load_dotenv()
 
+# Craigslist item titles, e.g. "Sunny flat (mission district) $2950 2br - 1000ft2"
+_CL_PRICE_RE = re.compile(r'\$\s*([\d,]+)')
+_CL_BEDROOMS_RE = re.compile(r'\b(\d+)\s*(?:br|bd|bed)\b', re.IGNORECASE)
+_CL_SQFT_RE = re.compile(r'\b(\d+)\s*ft2\b', re.IGNORECASE)
+_CL_NEIGHBORHOOD_RE = re.compile(r'\(([^()]+)\)')
+_CL_POSTING_ID_RE = re.compile(r'/(\d+)\.html')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Seconds one source may take, and the most a whole aggregation waits before returning what it has
+DEFAULT_SOURCE_TIMEOUT = 20.0
+DEFAULT_AGGREGATION_DEADLINE = 30.0
+
 @dataclass
 class RentalData:
     """Standardized rental data structure"""
@@ -46,15 +69,72 @@ class RentalData:
     retrieved_at: datetime
 
 
+@dataclass
+class RentalSource:
+    """A registered source: fetch(city, state) returns its rentals"""
+    name: str
+    fetch: Callable[[str, str], Awaitable[List[RentalData]]]
+    timeout: float = DEFAULT_SOURCE_TIMEOUT
+    max_concurrency: int = 1
+    # Caps concurrent fetches of this source, e.g. when several cities aggregate at once
+    slots: Optional[asyncio.Semaphore] = field(default=None, init=False, repr=False)
+
+
+@dataclass
+class SourceResult:
+    """Outcome of one source in an aggregation"""
+    source: str
+    rentals: List[RentalData]
+    seconds: float
+    error: Optional[str] = None
+    timed_out: bool = False
+
+
 class RentalAggregator:
     """
     Aggregates rental data from legitimate sources
     """
     
-    def __init__(self):
+    def __init__(self, export_path: Optional[str] = None, feed_state: Optional[FeedValidatorStore] = None):
         self.logger = self._setup_logger()
         self.client = httpx.AsyncClient()
         self.rentals: List[RentalData] = []
+        
+        # ETag/Last-Modified of each feed - unchanged feeds come back as a 304 and are not parsed
+        self.feed_state = feed_state
+        
+        # Streaming JSONL export - rentals are appended as each source returns
+        self.export_writer = JsonlWriter(export_path) if export_path else None
+        
+        # Spatial index of aggregated rentals for proximity lookups
+        self.geo_index = GeoGridIndex()
+        
+        # Source plugins by name - aggregate_rentals fans out to these
+        self.sources: Dict[str, RentalSource] = {}
+        self.register_source("rentberry", self.fetch_from_rentberry)
+        self.register_source("craigslist", self.fetch_from_craigslist)
+        self.register_source(
+            "rentals_api", lambda city, state: self.fetch_from_rentals_api({"city": city, "state": state})
+        )
+    
+    def register_source(
+        self,
+        name: str,
+        fetch: Callable[[str, str], Awaitable[List[RentalData]]],
+        timeout: float = DEFAULT_SOURCE_TIMEOUT,
+        max_concurrency: int = 1
+    ) -> RentalSource:
+        """
+        Add (or replace) a rental source
+        
+        Args:
+            fetch: Coroutine function taking (city, state) and returning RentalData
+            timeout: Seconds before this source is abandoned
+            max_concurrency: Fetches of this source allowed at once
+        """
+        source = RentalSource(name, fetch, timeout, max_concurrency)
+        self.sources[name] = source
+        return source
     
     def _setup_logger(self) -> logging.Logger:
         logger = logging.getLogger(__name__)
@@ -100,10 +180,14 @@ class RentalAggregator:
         
         return rentals
     
-    async def fetch_from_craigslist(self, city: str) -> List[RentalData]:
+    async def fetch_from_craigslist(self, city: str, state: str = "") -> List[RentalData]:
         """
         Fetch rentals from Craigslist RSS feeds (legitimate public data)
         Craigslist provides RSS feeds that can be used ethically
+        
+        The feed is parsed item by item as it downloads, so memory does not
+        grow with the feed. With feed_state set, a feed unchanged since the
+        last fetch is answered with a 304 and yields no rentals.
         """
         rentals = []
         
@@ -125,17 +209,84 @@ class RentalAggregator:
         
         rss_url = f"https://{city_code}.craigslist.org/search/apa?format=rss"
         
+        return await self._fetch_craigslist_feed(rss_url, city, state)
+    
+    async def _fetch_craigslist_feed(self, rss_url: str, city: str, state: str) -> List[RentalData]:
+        """Stream one Craigslist feed into RentalData"""
+        rentals = []
+        headers = self.feed_state.conditional_headers(rss_url) if self.feed_state else {}
+        
         try:
-            response = await self.client.get(rss_url)
-            # Parse RSS feed
-            # Extract rental information
-            # Note: Would use feedparser library in production
-            self.logger.info(f"Fetched RSS feed for {city}")
+            async with self.client.stream("GET", rss_url, headers=headers) as response:
+                if response.status_code == 304:
+                    self.logger.info(f"RSS feed for {city} not modified, skipping")
+                    return rentals
+                response.raise_for_status()
+                
+                parser = FeedParser()
+                async for chunk in response.aiter_bytes():
+                    for item in parser.feed(chunk):
+                        rental = self._rental_from_craigslist_item(item, city, state)
+                        if rental:
+                            rentals.append(rental)
+                for item in parser.close():
+                    rental = self._rental_from_craigslist_item(item, city, state)
+                    if rental:
+                        rentals.append(rental)
+                
+                # Only a fully parsed feed may be skipped next time
+                if self.feed_state:
+                    self.feed_state.remember(
+                        rss_url, response.headers.get("etag"), response.headers.get("last-modified")
+                    )
+            self.logger.info(f"Parsed {len(rentals)} rentals from {parser.items} items in RSS feed for {city}")
         except Exception as e:
             self.logger.error(f"Error fetching Craigslist RSS: {e}")
         
         return rentals
     
+    def _rental_from_craigslist_item(self, item: FeedItem, city: str, state: str) -> Optional[RentalData]:
+        """Standardize a Craigslist feed item, or None if it has no price"""
+        # Craigslist escapes inside CDATA ("&#x0024;2950"), so entities survive XML parsing
+        title = html.unescape(item.title)
+        price = _CL_PRICE_RE.search(title)
+        if not price or not item.link:
+            return None
+        
+        bedrooms = _CL_BEDROOMS_RE.search(title)
+        square_feet = _CL_SQFT_RE.search(title)
+        neighborhood = _CL_NEIGHBORHOOD_RE.search(title)
+        posting_id = _CL_POSTING_ID_RE.search(item.link)
+        description = None
+        if item.description:
+            description = html.unescape(_HTML_TAG_RE.sub(" ", item.description))
+            description = re.sub(r"\s+", " ", description).strip() or None
+        
+        return RentalData(
+            source="craigslist",
+            external_id=posting_id.group(1) if posting_id else (item.guid or item.link),
+            title=title,
+            description=description,
+            price_per_month=float(price.group(1).replace(",", "")),
+            currency="USD",
+            address=neighborhood.group(1).strip() if neighborhood else city,
+            city=city,
+            state=state,
+            zip_code=None,
+            latitude=item.latitude,
+            longitude=item.longitude,
+            bedrooms=int(bedrooms.group(1)) if bedrooms else None,
+            bathrooms=None,
+            square_feet=int(square_feet.group(1)) if square_feet else None,
+            property_type="apartment",
+            available_date=None,
+            amenities=[],
+            images=item.images,
+            contact_info={},
+            listing_url=item.link,
+            retrieved_at=datetime.now()
+        )
+    
     async def fetch_from_rentals_api(self, location: Dict[str, str]) -> List[RentalData]:
         """
         Fetch from Rentals.com API (if available)
@@ -148,43 +299,113 @@ class RentalAggregator:
         
         return rentals
     
+    async def _run_source(self, source: RentalSource, city: str, state: str) -> SourceResult:
+        """Fetch one source within its concurrency limit and timeout, never raising"""
+        if source.slots is None:
+            source.slots = asyncio.Semaphore(source.max_concurrency)
+        started = time.monotonic()
+        try:
+            async with source.slots:
+                rentals = await asyncio.wait_for(source.fetch(city, state), source.timeout)
+            return SourceResult(source.name, rentals or [], time.monotonic() - started)
+        except asyncio.TimeoutError:
+            return SourceResult(
+                source.name, [], time.monotonic() - started, f"timed out after {source.timeout:g}s", timed_out=True
+            )
+        except Exception as e:
+            return SourceResult(source.name, [], time.monotonic() - started, str(e))
+    
+    async def iter_sources(
+        self,
+        city: str,
+        state: str,
+        sources: List[str] = None,
+        deadline: Optional[float] = DEFAULT_AGGREGATION_DEADLINE
+    ) -> AsyncIterator[SourceResult]:
+        """
+        Fetch sources concurrently, yielding each result as soon as it completes
+        
+        Sources still running when the deadline (seconds from now) passes are
+        cancelled and yielded as timed out. Stopping iteration early cancels
+        whatever is still running.
+        """
+        names = list(self.sources) if sources is None else sources
+        pending = {}
+        for name in names:
+            source = self.sources.get(name)
+            if source is None:
+                self.logger.warning(f"Unknown rental source: {name}")
+                continue
+            pending[asyncio.create_task(self._run_source(source, city, state))] = name
+        
+        started = time.monotonic()
+        try:
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - (time.monotonic() - started))
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    del pending[task]
+                    yield task.result()
+            
+            stragglers, pending = pending, {}
+            for task, name in stragglers.items():
+                task.cancel()
+                yield SourceResult(
+                    name, [], time.monotonic() - started, f"aggregation deadline of {deadline:g}s passed", timed_out=True
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+    
     async def aggregate_rentals(
         self, 
         city: str, 
         state: str,
-        sources: List[str] = None
+        sources: List[str] = None,
+        deadline: Optional[float] = DEFAULT_AGGREGATION_DEADLINE
     ) -> List[RentalData]:
         """
         Aggregate rentals from multiple legitimate sources
-        """
-        if sources is None:
-            sources = ["rentberry", "craigslist", "rentals_api"]
         
-        tasks = []
-        
-        if "rentberry" in sources:
-            tasks.append(self.fetch_from_rentberry(city, state))
-        
-        if "craigslist" in sources:
-            tasks.append(self.fetch_from_craigslist(city))
-        
-        if "rentals_api" in sources:
-            tasks.append(self.fetch_from_rentals_api({"city": city, "state": state}))
-        
-        # Fetch from all sources concurrently
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        for result in results:
-            if isinstance(result, list):
-                self.rentals.extend(result)
-            elif isinstance(result, Exception):
-                self.logger.error(f"Error in aggregation: {result}")
+        Each source's rentals are indexed and exported as soon as it returns;
+        a source that fails or outlives the deadline is logged and skipped,
+        so the slowest source never holds back the others.
+        """
+        succeeded = 0
+        async for result in self.iter_sources(city, state, sources, deadline):
+            if result.error:
+                self.logger.error(f"Error in aggregation from {result.source}: {result.error}")
+                continue
+            succeeded += 1
+            self.rentals.extend(result.rentals)
+            for rental in result.rentals:
+                self.geo_index.add(rental.latitude, rental.longitude, rental)
+            if self.export_writer:
+                self.export_writer.write_many(result.rentals)
+            self.logger.info(f"{result.source} returned {len(result.rentals)} rentals in {result.seconds:.1f}s")
         
-        self.logger.info(f"Aggregated {len(self.rentals)} rentals from {len(sources)} sources")
+        self.logger.info(f"Aggregated {len(self.rentals)} rentals from {succeeded} sources")
         return self.rentals
     
+    def find_nearby(self, latitude: float, longitude: float, radius_m: float = 100) -> List[Tuple[float, RentalData]]:
+        """
+        Aggregated rentals within radius_m meters of a point
+        
+        Returns:
+            (distance in meters, rental) pairs, nearest first
+        """
+        return self.geo_index.query(latitude, longitude, radius_m)
+    
     def save_to_file(self, filename: str = "aggregated_rentals.json"):
-        """Save aggregated rentals to JSON file"""
+        """Save aggregated rentals to JSON file (or JSON Lines for .jsonl[.gz|.zst] filenames)"""
+        if is_jsonl_path(filename):
+            with JsonlWriter(filename) as writer:
+                writer.write_many(self.rentals)
+            self.logger.info(f"Saved {len(self.rentals)} rentals to {filename}")
+            return
+        
         data = {
             "aggregated_at": datetime.now().isoformat(),
             "total_rentals": len(self.rentals),
@@ -197,8 +418,35 @@ class RentalAggregator:
         self.logger.info(f"Saved {len(self.rentals)} rentals to {filename}")
     
     async def close(self):
-        """Close HTTP client"""
+        """Close HTTP client, export file and feed state"""
         await self.client.aclose()
+        if self.export_writer:
+            self.export_writer.close()
+        if self.feed_state:
+            self.feed_state.close()
+
+
+def _jaccard(text_a: Optional[str], text_b: Optional[str]) -> float:
+    tokens_a, tokens_b = shingles(text_a), shingles(text_b)
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def duplicate_breakdown(rental: RentalData, other: RentalData, distance_m: float) -> Dict[str, int]:
+    """Score breakdown of two rentals with the detector weights (no image hashes for feed listings)"""
+    price_score = 0
+    if rental.price_per_month and other.price_per_month:
+        ratio = abs(rental.price_per_month - other.price_per_month) / max(rental.price_per_month, other.price_per_month)
+        price_score = 10 if ratio < 0.05 else 7 if ratio < 0.1 else 3 if ratio < 0.2 else 0
+    phone = normalize_phone(rental.contact_info.get('phone'))
+    return {
+        'locationScore': int(location_score(distance_m)),
+        'titleScore': round(_jaccard(rental.title, other.title) * 20),
+        'descriptionScore': round(_jaccard(rental.description, other.description) * 15),
+        'priceScore': price_score,
+        'phoneScore': 20 if phone and phone == normalize_phone(other.contact_info.get('phone')) else 0,
+    }
 
 
 class SupabaseRentalImporter:
@@ -206,33 +454,91 @@ class SupabaseRentalImporter:
     Import aggregated rental data into Supabase
     """
     
-    def __init__(self, supabase_url: str, supabase_key: str):
+    def __init__(
+        self,
+        supabase_url: str,
+        supabase_key: str,
+        geo_index: Optional[GeoGridIndex] = None,
+        duplicate_radius_m: float = 10
+    ):
         self.supabase_url = supabase_url
         self.supabase_key = supabase_key
         self.logger = logging.getLogger(__name__)
+        
+        # Listings already imported - one this close with the same rooms is a cross-source duplicate candidate
+        self.geo_index = geo_index or GeoGridIndex()
+        self.duplicate_radius_m = duplicate_radius_m
+        
+        # Likely but unconfirmed duplicates, for the resolve-rental-duplicate review route
+        self.review_candidates: List[Dict] = []
+    
+    def find_duplicate_candidates(self, rental: RentalData) -> List[Tuple[int, RentalData, Dict[str, int]]]:
+        """
+        Already-imported rentals from other sources at the same spot with the same bedrooms
+        
+        Returns:
+            (score, rental, breakdown) tuples, best score first
+        """
+        if rental.latitude is None or rental.longitude is None:
+            return []
+        candidates = []
+        for distance, other in self.geo_index.query(rental.latitude, rental.longitude, self.duplicate_radius_m):
+            if other.bedrooms == rental.bedrooms and other.source != rental.source:
+                breakdown = duplicate_breakdown(rental, other, distance)
+                candidates.append((sum(breakdown.values()), other, breakdown))
+        return sorted(candidates, key=lambda candidate: -candidate[0])
+    
+    @property
+    def supabase(self) -> Client:
+        """Shared pooled Supabase client, created on first use"""
+        return get_supabase_client(self.supabase_url, self.supabase_key)
     
     async def import_rentals(self, rentals: List[RentalData]):
         """
         Import rental data into Supabase database
         """
-        # This would use the Supabase Python client
+        # This would use the shared Supabase client (self.supabase)
         # to insert data into the tables we created
         
         imported_count = 0
         
         for rental in rentals:
             try:
+                # 0. Skip confirmed cross-source duplicates; likely ones are imported and queued for review
+                candidates = self.find_duplicate_candidates(rental)
+                if candidates and candidates[0][0] >= DUPLICATE_THRESHOLD:
+                    score, duplicate, _ = candidates[0]
+                    self.logger.info(
+                        f"Skipping {rental.source}:{rental.external_id}, duplicate of "
+                        f"{duplicate.source}:{duplicate.external_id} (score {score})"
+                    )
+                    continue
+                for score, other, breakdown in candidates:
+                    if score >= REVIEW_THRESHOLD:
+                        self.review_candidates.append({
+                            'source': rental.source,
+                            'externalId': rental.external_id,
+                            'masterSource': other.source,
+                            'masterExternalId': other.external_id,
+                            'score': score,
+                            'breakdown': breakdown,
+                        })
+                
                 # 1. Check if landlord exists, create if not
                 # 2. Insert rental record
                 # 3. Insert rental images
                 # 4. Link amenities
                 # 5. Create initial price history entry
                 
+                self.geo_index.add(rental.latitude, rental.longitude, rental)
                 imported_count += 1
             except Exception as e:
                 self.logger.error(f"Error importing rental {rental.external_id}: {e}")
         
-        self.logger.info(f"Imported {imported_count}/{len(rentals)} rentals to Supabase")
+        self.logger.info(
+            f"Imported {imported_count}/{len(rentals)} rentals to Supabase, "
+            f"{len(self.review_candidates)} possible duplicates to review"
+        )
         return imported_count
 
 
@@ -310,7 +616,7 @@ class ManualRentalEntry:
 
 async def main():
     """Example usage of legitimate rental aggregator"""
-    aggregator = RentalAggregator()
+    aggregator = RentalAggregator(feed_state=FeedValidatorStore())
     
     # Aggregate from legitimate sources
     rentals = await aggregator.aggregate_rentals(
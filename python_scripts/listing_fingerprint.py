@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Listing Content Fingerprints
+Detects changed listings on re-scrape so only the changed fields are
+written upstream, recording price history along the way
+"""
+
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# <scratchpad>Fingerprints are compared locally, so unchanged listings cost no network round trip at all</scratchpad>
+# AI-DEV: Image URLs are compared without query strings - Facebook CDN params change on every load
+
+DEFAULT_FINGERPRINT_PATH = os.getenv('SCRAPER_FINGERPRINT_PATH', 'scraper_fingerprints.db')
+
+# Rental columns that are compared and updated on change
+TRACKED_FIELDS = [
+    'title', 'description', 'price_per_month', 'currency', 'location_text',
+    'bedrooms', 'bathrooms', 'property_type', 'available_date',
+]
+
+STATUS_NEW = 'new'
+STATUS_UNCHANGED = 'unchanged'
+STATUS_CHANGED = 'changed'
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Normalize Hebrew/English text for comparison (case, punctuation, niqqud, whitespace)"""
+    if not text:
+        return ''
+    normalized = text.lower()
+    normalized = re.sub(r'[\u0591-\u05C7]', '', normalized)  # niqqud
+    normalized = re.sub(r'[.,!?;:\'"״׳()\[\]*_#…-]', ' ', normalized)
+    normalized = re.sub(r'\s+', ' ', normalized)
+    return normalized.strip()
+
+
+def normalize_image_url(url: str) -> str:
+    """Strip query string and fragment so re-signed CDN URLs compare equal"""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{parts.path}" if parts.netloc else url.split('?')[0]
+
+
+def compute_fingerprint(rental_data: Dict, image_urls: List[str]) -> str:
+    """Hash of the normalized text, price and image set of a listing"""
+    content = {
+        'title': normalize_text(rental_data.get('title')),
+        'description': normalize_text(rental_data.get('description')),
+        'price': rental_data.get('price_per_month'),
+        'fields': [rental_data.get(f) for f in TRACKED_FIELDS if f not in ('title', 'description', 'price_per_month')],
+        'images': sorted({normalize_image_url(url) for url in image_urls}),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+@dataclass
+class ChangeResult:
+    """Outcome of comparing a scraped listing against its stored fingerprint"""
+    status: str
+    rental_id: Optional[str] = None
+    updates: Dict = field(default_factory=dict)
+    new_image_urls: List[str] = field(default_factory=list)
+    image_offset: int = 0
+    old_price: Optional[float] = None
+
+    @property
+    def price_changed(self) -> bool:
+        return 'price_per_month' in self.updates
+
+
+def _diff_snapshot(rental_id: str, snapshot: Dict, stored_images: List[str], rental_data: Dict, image_urls: List[str]) -> ChangeResult:
+    updates = {}
+    for f in TRACKED_FIELDS:
+        old, new = snapshot.get(f), rental_data.get(f)
+        if f in ('title', 'description'):
+            if normalize_text(old) != normalize_text(new):
+                updates[f] = new
+        elif old != new and new is not None:
+            updates[f] = new
+
+    known = set(stored_images)
+    new_images = [url for url in image_urls if normalize_image_url(url) not in known]
+
+    return ChangeResult(
+        status=STATUS_CHANGED if updates or new_images else STATUS_UNCHANGED,
+        rental_id=rental_id,
+        updates=updates,
+        new_image_urls=new_images,
+        image_offset=len(stored_images),
+        old_price=snapshot.get('price_per_month'),
+    )
+
+
+def diff_against_stored(rental_id: str, stored: Dict, stored_image_urls: List[str], rental_data: Dict, image_urls: List[str]) -> ChangeResult:
+    """Compare a scraped listing against a row fetched from upstream - needs no local store"""
+    snapshot = {f: stored.get(f) for f in TRACKED_FIELDS}
+    stored_images = [normalize_image_url(url) for url in stored_image_urls]
+    if compute_fingerprint(snapshot, stored_image_urls) == compute_fingerprint(rental_data, image_urls):
+        return ChangeResult(status=STATUS_UNCHANGED, rental_id=rental_id)
+    return _diff_snapshot(rental_id, snapshot, stored_images, rental_data, image_urls)
+
+
+class FingerprintStore:
+    """
+    Local SQLite store of one fingerprint and field snapshot per listing
+    """
+
+    def __init__(self, path: str = DEFAULT_FINGERPRINT_PATH):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS listing_fingerprints (
+                    facebook_id TEXT PRIMARY KEY,
+                    rental_id TEXT,
+                    fingerprint TEXT NOT NULL,
+                    snapshot TEXT NOT NULL,
+                    images TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    def check(self, facebook_id: str, rental_data: Dict, image_urls: List[str]) -> ChangeResult:
+        """
+        Compare a scraped listing with its stored fingerprint
+
+        Returns:
+            ChangeResult with status new, unchanged or changed; for changed
+            listings, only the fields (and images) that differ
+        """
+        row = self.conn.execute(
+            "SELECT * FROM listing_fingerprints WHERE facebook_id = ?", (facebook_id,)
+        ).fetchone()
+        if row is None:
+            return ChangeResult(status=STATUS_NEW)
+
+        if row['fingerprint'] == compute_fingerprint(rental_data, image_urls):
+            return ChangeResult(status=STATUS_UNCHANGED, rental_id=row['rental_id'])
+
+        return _diff_snapshot(row['rental_id'], json.loads(row['snapshot']), json.loads(row['images']), rental_data, image_urls)
+
+    def record(self, facebook_id: str, rental_id: Optional[str], rental_data: Dict, image_urls: List[str]):
+        """Store the current fingerprint and snapshot of a listing"""
+        snapshot = {f: rental_data.get(f) for f in TRACKED_FIELDS}
+        row = self.conn.execute(
+            "SELECT images FROM listing_fingerprints WHERE facebook_id = ?", (facebook_id,)
+        ).fetchone()
+        # The stored image set accumulates, since images are only ever appended upstream
+        images = json.loads(row['images']) if row else []
+        for url in image_urls:
+            normalized = normalize_image_url(url)
+            if normalized not in images:
+                images.append(normalized)
+
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO listing_fingerprints (facebook_id, rental_id, fingerprint, snapshot, images, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(facebook_id) DO UPDATE SET
+                    rental_id = COALESCE(excluded.rental_id, rental_id),
+                    fingerprint = excluded.fingerprint,
+                    snapshot = excluded.snapshot,
+                    images = excluded.images,
+                    updated_at = excluded.updated_at
+            """, (
+                facebook_id,
+                rental_id,
+                compute_fingerprint(rental_data, image_urls),
+                json.dumps(snapshot, default=str, ensure_ascii=False),
+                json.dumps(images),
+                datetime.now().isoformat(),
+            ))
+
+    def remap_rental_id(self, facebook_id: str, rental_id: str):
+        """Point a listing at its upstream rental id (e.g. after the outbox found it already existed)"""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE listing_fingerprints SET rental_id = ? WHERE facebook_id = ?",
+                (rental_id, facebook_id)
+            )
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+
+def build_change_rows(change: ChangeResult, rental_data: Dict, image_rows: List[Dict]) -> Tuple[Dict, List[Dict], Optional[Dict]]:
+    """
+    Build the minimal writes for a changed listing
+
+    Returns:
+        (rental field updates, new rental_images rows without rental_id, rental_price_history row or None)
+    """
+    new_urls = set(change.new_image_urls)
+    new_image_rows = [
+        {
+            **row,
+            'image_order': change.image_offset + idx,
+            'is_primary': change.image_offset + idx == 0,
+        }
+        for idx, row in enumerate(r for r in image_rows if r['image_url'] in new_urls)
+    ]
+
+    price_row = None
+    if change.price_changed and rental_data.get('price_per_month') is not None:
+        new_price = rental_data['price_per_month']
+        price_row = {
+            'rental_id': change.rental_id,
+            'price': new_price,
+            'price_change_amount': new_price - change.old_price if change.old_price is not None else None,
+            'recorded_at': datetime.now().isoformat(),
+        }
+
+    return change.updates, new_image_rows, price_row
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Local Outbox for Rental Scrapers
+Commits scraped rows to a local SQLite (WAL) database at disk speed and
+syncs them to Supabase in large batches with retries
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from resilience import RetryPolicy, call_sync, get_breaker, is_transient_http_error
+
+load_dotenv()
+
+# <scratchpad>Rows are keyed by client-generated UUIDs so children can link to rentals before sync</scratchpad>
+# AI-DEV: Sync order matters - rentals first, then rows that reference rental_id
+
+DEFAULT_OUTBOX_PATH = os.getenv('SCRAPER_OUTBOX_PATH', 'scraper_outbox.db')
+
+# Local tables mirroring the Supabase tables, in the order they must be synced.
+# rental_updates holds partial updates of existing rentals (applied with UPDATE, not upsert)
+OUTBOX_TABLES = [
+    'rentals', 'rental_updates', 'rental_images', 'rental_amenities', 'scrape_metadata', 'rental_price_history'
+]
+
+STATUS_PENDING = 'pending'
+STATUS_SYNCED = 'synced'
+STATUS_SKIPPED = 'skipped'
+
+
+class LocalOutbox:
+    """
+    SQLite outbox that mirrors the rentals, rental_images, rental_amenities
+    and scrape_metadata rows until they are pushed upstream
+    """
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the mirror tables if they do not exist"""
+        with self.conn:
+            tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if 'price_history' in tables and 'rental_price_history' not in tables:
+                # Renamed to match the rentals-keyed upstream table
+                self.conn.execute("ALTER TABLE price_history RENAME TO rental_price_history")
+                self.conn.execute("DROP INDEX IF EXISTS idx_price_history_status")
+            for table in OUTBOX_TABLES:
+                self.conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id TEXT PRIMARY KEY,
+                        rental_id TEXT,
+                        facebook_id TEXT,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT '{STATUS_PENDING}',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        last_error TEXT,
+                        created_at TEXT NOT NULL,
+                        synced_at TEXT
+                    )
+                """)
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table}(status, created_at)"
+                )
+            self.conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_rentals_facebook_id ON rentals(facebook_id)"
+            )
+            # Upstream id of a queued rental that sync found already existing
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(rentals)")}
+            if 'upstream_id' not in columns:
+                self.conn.execute("ALTER TABLE rentals ADD COLUMN upstream_id TEXT")
+
+    def has_listing(self, facebook_id: str) -> bool:
+        """Check whether a listing was already committed to the outbox"""
+        row = self.conn.execute(
+            "SELECT 1 FROM rentals WHERE facebook_id = ?", (facebook_id,)
+        ).fetchone()
+        return row is not None
+
+    def enqueue_listing(
+        self,
+        rental_data: Dict,
+        image_rows: List[Dict],
+        amenity_names: List[str],
+        metadata: Dict
+    ) -> Optional[str]:
+        """
+        Commit a listing and its related rows to the outbox in one transaction
+
+        Args:
+            rental_data: Row for the rentals table (without id)
+            image_rows: Rows for rental_images (without rental_id)
+            amenity_names: Amenity names, resolved to amenity ids at sync time
+            metadata: Row for scrape_metadata (without rental_id)
+
+        Returns:
+            The client-generated rental id, or None if the listing is already queued
+        """
+        facebook_id = rental_data.get('facebook_id')
+        if facebook_id and self.has_listing(facebook_id):
+            return None
+
+        rental_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+
+        with self.conn:
+            self._insert(
+                'rentals', rental_id, rental_id, {'id': rental_id, **rental_data}, now,
+                facebook_id=facebook_id
+            )
+            for image in image_rows:
+                row_id = str(uuid.uuid4())
+                self._insert('rental_images', row_id, rental_id, {'id': row_id, 'rental_id': rental_id, **image}, now)
+            for amenity_name in amenity_names:
+                row_id = str(uuid.uuid4())
+                self._insert('rental_amenities', row_id, rental_id, {'rental_id': rental_id, 'amenity_name': amenity_name}, now)
+            if metadata:
+                row_id = str(uuid.uuid4())
+                self._insert('scrape_metadata', row_id, rental_id, {'id': row_id, 'rental_id': rental_id, **metadata}, now)
+
+        return rental_id
+
+    def enqueue_update(
+        self,
+        rental_id: str,
+        updates: Dict,
+        image_rows: List[Dict],
+        price_row: Optional[Dict]
+    ):
+        """
+        Commit the minimal writes for a changed listing
+
+        Args:
+            rental_id: Upstream (or outbox) id of the rental
+            updates: Changed rental fields only
+            image_rows: New rental_images rows (without rental_id)
+            price_row: rental_price_history row, if the price changed
+        """
+        now = datetime.now().isoformat()
+        rental_id = self.resolve_rental_id(rental_id)
+
+        with self.conn:
+            if updates:
+                row_id = str(uuid.uuid4())
+                self._insert('rental_updates', row_id, rental_id, {'id': rental_id, **updates}, now)
+            for image in image_rows:
+                row_id = str(uuid.uuid4())
+                self._insert('rental_images', row_id, rental_id, {'id': row_id, 'rental_id': rental_id, **image}, now)
+            if price_row:
+                row_id = str(uuid.uuid4())
+                self._insert('rental_price_history', row_id, rental_id, {'id': row_id, **price_row, 'rental_id': rental_id}, now)
+
+    def resolve_rental_id(self, rental_id: str) -> str:
+        """The upstream id for an outbox rental that sync skipped as already existing, else rental_id"""
+        row = self.conn.execute(
+            "SELECT upstream_id FROM rentals WHERE id = ? AND upstream_id IS NOT NULL", (rental_id,)
+        ).fetchone()
+        return row['upstream_id'] if row else rental_id
+
+    def resolve_existing(self, upstream_ids: Dict[str, str]):
+        """
+        Skip queued rentals that already exist upstream, keeping their later changes
+
+        The rows queued together with the listing are skipped with it; updates,
+        images and price changes queued against it afterwards are re-pointed
+        at the upstream rental so they still sync.
+
+        Args:
+            upstream_ids: Outbox rental id -> upstream rental id
+        """
+        now = datetime.now().isoformat()
+        with self.conn:
+            for rental_id, upstream_id in upstream_ids.items():
+                rental = self.conn.execute(
+                    "SELECT created_at FROM rentals WHERE id = ?", (rental_id,)
+                ).fetchone()
+                if rental is None:
+                    continue
+                self.conn.execute(
+                    "UPDATE rentals SET status = ?, synced_at = ?, upstream_id = ?, last_error = NULL WHERE id = ?",
+                    (STATUS_SKIPPED, now, upstream_id, rental_id)
+                )
+                for child in OUTBOX_TABLES[1:]:
+                    # enqueue_listing writes the listing and its children with one timestamp
+                    self.conn.execute(
+                        f"UPDATE {child} SET status = ?, synced_at = ? WHERE rental_id = ? AND created_at = ? AND status = ?",
+                        (STATUS_SKIPPED, now, rental_id, rental['created_at'], STATUS_PENDING)
+                    )
+                    rows = self.conn.execute(
+                        f"SELECT id, payload FROM {child} WHERE rental_id = ? AND status = ?", (rental_id, STATUS_PENDING)
+                    ).fetchall()
+                    for row in rows:
+                        payload = json.loads(row['payload'])
+                        # rental_updates rows carry the rental id as 'id'
+                        payload['id' if child == 'rental_updates' else 'rental_id'] = upstream_id
+                        self.conn.execute(
+                            f"UPDATE {child} SET rental_id = ?, payload = ? WHERE id = ?",
+                            (upstream_id, json.dumps(payload, default=str, ensure_ascii=False), row['id'])
+                        )
+
+    def _insert(
+        self,
+        table: str,
+        row_id: str,
+        rental_id: str,
+        payload: Dict,
+        created_at: str,
+        facebook_id: Optional[str] = None
+    ):
+        self.conn.execute(
+            f"INSERT INTO {table} (id, rental_id, facebook_id, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (row_id, rental_id, facebook_id, json.dumps(payload, default=str, ensure_ascii=False), created_at)
+        )
+
+    def pending_rows(self, table: str, limit: int) -> List[sqlite3.Row]:
+        """
+        Fetch the oldest pending rows of a table
+
+        Child rows are only returned once their rental has been synced (rentals
+        that are not in the outbox already exist upstream)
+        """
+        if table == 'rentals':
+            query = """
+                SELECT * FROM rentals WHERE status = ?
+                ORDER BY created_at LIMIT ?
+            """
+        else:
+            query = f"""
+                SELECT c.* FROM {table} c
+                LEFT JOIN rentals r ON r.id = c.rental_id
+                WHERE c.status = ? AND (r.id IS NULL OR r.status = '{STATUS_SYNCED}')
+                ORDER BY c.created_at LIMIT ?
+            """
+        return self.conn.execute(query, (STATUS_PENDING, limit)).fetchall()
+
+    def mark(self, table: str, row_ids: List[str], status: str):
+        """Mark rows as synced or skipped"""
+        if not row_ids:
+            return
+        now = datetime.now().isoformat()
+        placeholders = ','.join('?' * len(row_ids))
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE {table} SET status = ?, synced_at = ?, last_error = NULL WHERE id IN ({placeholders})",
+                (status, now, *row_ids)
+            )
+
+    def record_failure(self, table: str, row_ids: List[str], error: str):
+        """Record a failed sync attempt so the rows are retried on the next run"""
+        if not row_ids:
+            return
+        placeholders = ','.join('?' * len(row_ids))
+        with self.conn:
+            self.conn.execute(
+                f"UPDATE {table} SET attempts = attempts + 1, last_error = ? WHERE id IN ({placeholders})",
+                (error, *row_ids)
+            )
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Row counts per table and status"""
+        result = {}
+        for table in OUTBOX_TABLES:
+            rows = self.conn.execute(
+                f"SELECT status, COUNT(*) AS n FROM {table} GROUP BY status"
+            ).fetchall()
+            result[table] = {row['status']: row['n'] for row in rows}
+        return result
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+
+class OutboxSyncer:
+    """
+    Pushes pending outbox rows to Supabase in batches
+    """
+
+    def __init__(
+        self,
+        outbox: LocalOutbox,
+        supabase,
+        batch_size: int = 500,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        on_existing: Optional[Callable[[str, str], None]] = None
+    ):
+        """
+        Args:
+            on_existing: Called with (facebook_id, upstream rental id) for queued
+                listings that turn out to already exist upstream
+        """
+        self.outbox = outbox
+        self.supabase = supabase
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_policy = RetryPolicy(
+            max_attempts=max_retries, base_delay=base_delay, max_delay=max_delay, timeout=None,
+            should_retry=is_transient_http_error
+        )
+        self.on_existing = on_existing
+        self.logger = logging.getLogger(__name__)
+        self._amenity_map: Optional[Dict[str, str]] = None
+
+    def _with_retries(self, description: str, func):
+        """Run func with jittered exponential backoff behind the Supabase circuit breaker"""
+        return call_sync(func, self.retry_policy, get_breaker('supabase'), description)
+
+    def _get_amenity_map(self) -> Dict[str, str]:
+        if self._amenity_map is None:
+            result = self._with_retries(
+                "Fetching amenities",
+                lambda: self.supabase.table('amenities').select('id, name').execute()
+            )
+            self._amenity_map = {a['name']: a['id'] for a in result.data}
+        return self._amenity_map
+
+    def _existing_facebook_ids(self, facebook_ids: List[str]) -> Dict[str, str]:
+        """Look up which listings already exist upstream in a single request"""
+        if not facebook_ids:
+            return {}
+        result = self._with_retries(
+            "Checking existing rentals",
+            lambda: self.supabase.table('rentals').select('id, facebook_id').in_('facebook_id', facebook_ids).execute()
+        )
+        return {r['facebook_id']: r['id'] for r in result.data}
+
+    def _sync_table(self, table: str) -> int:
+        """Push all pending rows of one table, returns number of rows synced"""
+        synced = 0
+
+        while True:
+            rows = self.outbox.pending_rows(table, self.batch_size)
+            if not rows:
+                break
+
+            row_ids = [row['id'] for row in rows]
+            payloads = [json.loads(row['payload']) for row in rows]
+
+            try:
+                if table == 'rentals':
+                    existing = self._existing_facebook_ids([row['facebook_id'] for row in rows if row['facebook_id']])
+                    skipped = [row['id'] for row in rows if row['facebook_id'] in existing]
+                    if skipped:
+                        self.logger.info(f"{len(skipped)} listings already exist upstream, skipping")
+                        self.outbox.resolve_existing({
+                            row['id']: existing[row['facebook_id']] for row in rows if row['id'] in skipped
+                        })
+                        if self.on_existing:
+                            for facebook_id, upstream_id in existing.items():
+                                self.on_existing(facebook_id, upstream_id)
+                    payloads = [p for row, p in zip(rows, payloads) if row['id'] not in skipped]
+                    row_ids = [row_id for row_id in row_ids if row_id not in skipped]
+                    for payload in payloads:
+                        # A repost flagged against a queued rental that turned out to exist upstream
+                        if payload.get('master_rental_id'):
+                            payload['master_rental_id'] = self.outbox.resolve_rental_id(payload['master_rental_id'])
+
+                elif table == 'rental_amenities':
+                    amenity_map = self._get_amenity_map()
+                    unknown = [row['id'] for row, p in zip(rows, payloads) if p['amenity_name'] not in amenity_map]
+                    self.outbox.mark(table, unknown, STATUS_SKIPPED)
+                    payloads = [
+                        {'rental_id': p['rental_id'], 'amenity_id': amenity_map[p['amenity_name']]}
+                        for p in payloads if p['amenity_name'] in amenity_map
+                    ]
+                    row_ids = [row_id for row_id in row_ids if row_id not in unknown]
+
+                elif table == 'rental_updates':
+                    for row_id, payload in zip(row_ids, payloads):
+                        rental_id = payload.pop('id')
+                        self._with_retries(
+                            f"Updating rental {rental_id}",
+                            lambda: self.supabase.table('rentals').update(payload).eq('id', rental_id).execute()
+                        )
+                        self.outbox.mark(table, [row_id], STATUS_SYNCED)
+                        synced += 1
+                    continue
+
+                if payloads:
+                    self._with_retries(
+                        f"Pushing {len(payloads)} {table} rows",
+                        lambda: self.supabase.table(table).upsert(payloads).execute()
+                    )
+                self.outbox.mark(table, row_ids, STATUS_SYNCED)
+                synced += len(row_ids)
+
+            except Exception as e:
+                self.logger.error(f"Error syncing {table}: {e}")
+                self.outbox.record_failure(table, row_ids, str(e))
+                break
+
+        return synced
+
+    def sync(self) -> Dict[str, int]:
+        """
+        Push all pending rows upstream, parents before children
+
+        Returns:
+            Number of rows synced per table
+        """
+        results = {}
+        for table in OUTBOX_TABLES:
+            results[table] = self._sync_table(table)
+            if results[table]:
+                self.logger.info(f"Synced {results[table]} {table} rows to Supabase")
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from supabase_client import get_supabase_client
+
+    parser = argparse.ArgumentParser(description="Local outbox for scraped rentals")
+    parser.add_argument("--db", type=str, default=DEFAULT_OUTBOX_PATH, help="Path to the outbox database")
+    parser.add_argument("--sync", action="store_true", help="Push pending rows to Supabase")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per upstream request")
+    parser.add_argument("--json", action="store_true", help="Output JSON for API")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    outbox = LocalOutbox(args.db)
+    result = {"status": "ready", "outbox": args.db}
+
+    if args.sync:
+        supabase = get_supabase_client()
+        result["synced"] = OutboxSyncer(outbox, supabase, batch_size=args.batch_size).sync()
+        result["status"] = "success"
+
+    result["counts"] = outbox.counts()
+    outbox.close()
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for table, counts in result["counts"].items():
+            print(f"{table}: {counts}")
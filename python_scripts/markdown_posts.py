@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Facebook Group Markdown Post Segmenter
+Splits the markdown Firecrawl renders for a group feed into individual posts,
+using author headers, timestamps and permalinks as boundaries
+"""
+
+import re
+import hashlib
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from listing_fingerprint import normalize_text
+
+# <scratchpad>Posts are yielded one at a time, so callers stop reading once they have enough rentals</scratchpad>
+# AI-DEV: Without any post markers (plain text pages) blank lines separate posts, as the old split did
+
+PERMALINK_RE = re.compile(
+    r'https?://(?:www\.|m\.|web\.)?facebook\.com/'
+    r'(?:groups/(?P<group>[^/\s)?]+)/(?:posts|permalink)/(?P<group_post>\d+)'
+    r'|permalink\.php\?[^\s)]*?story_fbid=(?P<story>\d+)[^\s)]*'
+    r'|[^/\s)?]+/posts/(?P<page_post>\d+))'
+    r'[^\s)]*'
+)
+
+# A markdown heading, or a bold line, holding a link to a person (not to a post)
+AUTHOR_RE = re.compile(
+    r'^(?:#{1,6}\s+|\*\*)\s*\[(?P<name>[^\]]+)\]\((?P<url>https?://(?:www\.|m\.|web\.)?facebook\.com/[^)\s]+)\)'
+)
+HEADING_RE = re.compile(r'^#{1,6}\s+\S')
+
+_MONTHS = r'(?:January|February|March|April|May|June|July|August|September|October|November|December)'
+_TIMESTAMP = (
+    r'(?:\d{1,2}\s*(?:m|h|d|w|min|mins|hr|hrs|hours?|days?|weeks?)'
+    r'|Just now|Yesterday at \d{1,2}:\d{2}(?:\s*[AP]M)?'
+    rf'|{_MONTHS}\s+\d{{1,2}}(?:,\s*\d{{4}})?(?:\s+at\s+\d{{1,2}}:\d{{2}}(?:\s*[AP]M)?)?'
+    r"|\d+\s*(?:דקות|דק'|שעות|שעה|ש'|ימים|יום|שבועות|שבוע)"
+    r'|לפני\s+[^\]]{1,20}|אתמול(?:\s+ב-?\s*\d{1,2}:\d{2})?|עכשיו)'
+)
+# A line that is only a timestamp, optionally linked (the link is usually the permalink)
+TIMESTAMP_RE = re.compile(rf'^\[?\s*{_TIMESTAMP}\s*\]?(?:\([^)]*\))?\s*[·•]?\s*$', re.IGNORECASE)
+
+# Feed chrome between and inside posts
+CHROME_RE = re.compile(
+    r'^(?:Like|Comment|Share|Reply|Send|Follow|Join|See more|See translation|Write a (?:public )?comment…?'
+    r'|All reactions:?|Most relevant|View more comments|\d+\s*(?:comments?|shares?|reactions?)'
+    r'|לייק|אהבתי|תגובה|תגובות|הגב|שיתוף|שתף|שלח|מעקב|ראה עוד|הצג עוד|הצג תרגום|כתוב תגובה.*'
+    r'|כל התגובות|\d+\s*(?:תגובות|שיתופים))\s*$',
+    re.IGNORECASE
+)
+SEE_MORE_RE = re.compile(r'(?:…|\.\.\.)?\s*(?:See more|ראה עוד|הצג עוד)\s*$')
+
+
+def canonical_permalink(url: str) -> Optional[str]:
+    """Permalink without tracking parameters, or None if the URL is not a post link"""
+    match = PERMALINK_RE.search(url)
+    if not match:
+        return None
+    if match.group('group_post'):
+        return f"https://www.facebook.com/groups/{match.group('group')}/posts/{match.group('group_post')}/"
+    if match.group('story'):
+        owner = re.search(r'[?&]id=(\d+)', match.group(0))
+        suffix = f"&id={owner.group(1)}" if owner else ''
+        return f"https://www.facebook.com/permalink.php?story_fbid={match.group('story')}{suffix}"
+    return match.group(0).split('?')[0]
+
+
+def _permalink_id(permalink: str) -> Optional[str]:
+    match = PERMALINK_RE.search(permalink)
+    if not match:
+        return None
+    return match.group('group_post') or match.group('story') or match.group('page_post')
+
+
+@dataclass
+class MarkdownPost:
+    """One post cut out of a feed page"""
+    lines: List[str] = field(default_factory=list)
+    permalink: Optional[str] = None
+    author: Optional[str] = None
+    author_url: Optional[str] = None
+    posted_at: Optional[str] = None  # as displayed, e.g. "3h" or "אתמול ב-10:15"
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines).strip()
+
+    @property
+    def post_id(self) -> str:
+        """Facebook post id from the permalink, else a hash of the normalized text (stable across runs)"""
+        if self.permalink:
+            post_id = _permalink_id(self.permalink)
+            if post_id:
+                return post_id
+        return hashlib.md5(normalize_text(self.text).encode('utf-8')).hexdigest()[:16]
+
+    def has_body(self) -> bool:
+        return any(line.strip() for line in self.lines)
+
+
+def has_post_markers(markdown: str) -> bool:
+    """Whether the page has author headers, timestamps or permalinks to segment on"""
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        if AUTHOR_RE.match(stripped) or TIMESTAMP_RE.match(stripped) or PERMALINK_RE.search(stripped):
+            return True
+    return False
+
+
+def iter_posts(markdown: str) -> Iterator[MarkdownPost]:
+    """
+    Yield the posts of a feed page in order
+
+    A post starts at an author header, or at a timestamp/permalink once the
+    current post already has body text. Text before the first post (group
+    header, navigation) is dropped. Pages without any markers fall back to
+    blank-line separated paragraphs.
+    """
+    structured = has_post_markers(markdown)
+    current: Optional[MarkdownPost] = None if structured else MarkdownPost()
+
+    for line in markdown.splitlines():
+        stripped = line.strip()
+
+        if not structured:
+            if stripped:
+                current.lines.append(stripped)
+            elif current.has_body():
+                yield current
+                current = MarkdownPost()
+            continue
+
+        if not stripped or CHROME_RE.match(stripped):
+            if current is not None and current.lines and stripped == '':
+                current.lines.append('')
+            continue
+
+        author = AUTHOR_RE.match(stripped)
+        permalink = PERMALINK_RE.search(stripped)
+        is_timestamp = bool(TIMESTAMP_RE.match(stripped))
+        is_header = bool(author) or is_timestamp or (permalink is not None and stripped.startswith('['))
+
+        starts_post = author is not None or (
+            current is not None and current.has_body() and (
+                is_timestamp or (permalink is not None and current.permalink is not None and is_header)
+            )
+        ) or (current is None and is_header)
+
+        if starts_post:
+            if current is not None and current.has_body():
+                yield current
+            current = MarkdownPost()
+        elif current is None:
+            # Preamble before the first post
+            continue
+        elif HEADING_RE.match(stripped) and current.has_body():
+            # An unlinked heading ends the post (e.g. the next section of the page)
+            yield current
+            current = None
+            continue
+
+        if author:
+            current.author = author.group('name').strip()
+            current.author_url = author.group('url')
+        if is_timestamp:
+            current.posted_at = re.sub(r'\(.*\)|[\[\]·•]', '', stripped).strip()
+        if permalink and current.permalink is None:
+            current.permalink = canonical_permalink(permalink.group(0))
+        if is_header:
+            continue
+
+        current.lines.append(SEE_MORE_RE.sub('', stripped))
+
+    if current is not None and current.has_body():
+        yield current
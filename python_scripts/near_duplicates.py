@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Listing Detection
+MinHash signatures over normalized Hebrew/English character shingles, with a
+locality-sensitive hashing index that finds reposted listings before insert
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+import random
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from listing_fingerprint import normalize_text
+
+# <scratchpad>Candidates come from band-bucket lookups only, so a query never compares against the whole corpus</scratchpad>
+# AI-DEV: Character shingles tolerate Hebrew prefixes (ה, ו, ב, ל) glued onto words
+
+DEFAULT_NEAR_DUPLICATE_PATH = os.getenv('SCRAPER_NEAR_DUPLICATE_PATH', 'scraper_near_duplicates.db')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: Optional[str], k: int = 5) -> Set[str]:
+    """Character k-shingles of the normalized text"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return set()
+    if len(normalized) <= k:
+        return {normalized}
+    return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+
+def listing_text(rental_data: Dict) -> str:
+    """Text compared between listings: title and description"""
+    return f"{rental_data.get('title') or ''} {rental_data.get('description') or ''}"
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with num_perm universal hash functions
+
+    The seed fixes the permutations, so signatures stay comparable across runs.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens: Iterable[str]) -> Optional[array]:
+        """MinHash signature of a token set, or None for an empty set"""
+        hashes = [_hash64(token.encode('utf-8')) for token in set(tokens)]
+        if not hashes:
+            return None
+        return array('Q', (
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self.permutations
+        ))
+
+
+def estimate_similarity(sig_a: array, sig_b: array) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+@dataclass
+class NearDuplicate:
+    """A stored listing that looks like a repost of the queried one"""
+    rental_id: str
+    facebook_id: Optional[str]
+    similarity: float
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of listing signatures, persisted in SQLite
+
+    Signatures are split into bands of rows; listings that share any band
+    bucket become candidates, and only those are scored. With 128 permutations
+    in 16 bands of 8 rows, pairs above ~0.7 Jaccard are found with high
+    probability. Use path=':memory:' for a throwaway index.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_NEAR_DUPLICATE_PATH,
+        num_perm: int = 128,
+        bands: int = 16,
+        threshold: float = 0.7,
+        shingle_size: int = 5
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.path = path
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.logger = logging.getLogger(__name__)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_signatures (
+                    rental_id TEXT PRIMARY KEY,
+                    facebook_id TEXT,
+                    signature BLOB NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_buckets (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    rental_id TEXT NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_minhash_buckets ON minhash_buckets (band, bucket)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_minhash_signatures_facebook_id ON minhash_signatures (facebook_id)"
+            )
+
+    def signature(self, text: str) -> Optional[array]:
+        return self.hasher.signature(shingles(text, self.shingle_size))
+
+    def _buckets(self, signature: array) -> List[int]:
+        """One signed 64-bit bucket hash per band (SQLite INTEGER range)"""
+        return [
+            int.from_bytes(
+                hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8).digest(),
+                'big',
+                signed=True
+            )
+            for band in range(self.bands)
+        ]
+
+    def add(self, rental_id: str, facebook_id: Optional[str], text: str) -> bool:
+        """
+        Index a listing's text
+
+        Returns:
+            False if the text has nothing to compare (e.g. empty)
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return False
+        with self.conn:
+            self.conn.execute("DELETE FROM minhash_buckets WHERE rental_id = ?", (rental_id,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO minhash_signatures (rental_id, facebook_id, signature) VALUES (?, ?, ?)",
+                (rental_id, facebook_id, signature.tobytes())
+            )
+            self.conn.executemany(
+                "INSERT INTO minhash_buckets (band, bucket, rental_id) VALUES (?, ?, ?)",
+                [(band, bucket, rental_id) for band, bucket in enumerate(self._buckets(signature))]
+            )
+        return True
+
+    def query(self, text: str, exclude_facebook_id: Optional[str] = None) -> List[NearDuplicate]:
+        """
+        Find indexed listings whose estimated similarity reaches the threshold
+
+        Returns:
+            Matches, most similar first
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return []
+
+        candidates = set()
+        for band, bucket in enumerate(self._buckets(signature)):
+            rows = self.conn.execute(
+                "SELECT rental_id FROM minhash_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+            )
+            candidates.update(row[0] for row in rows)
+
+        matches = []
+        for rental_id in candidates:
+            row = self.conn.execute(
+                "SELECT facebook_id, signature FROM minhash_signatures WHERE rental_id = ?", (rental_id,)
+            ).fetchone()
+            if row is None or (exclude_facebook_id and row[0] == exclude_facebook_id):
+                continue
+            stored = array('Q')
+            stored.frombytes(row[1])
+            similarity = estimate_similarity(signature, stored)
+            if similarity >= self.threshold:
+                matches.append(NearDuplicate(rental_id=rental_id, facebook_id=row[0], similarity=similarity))
+
+        return sorted(matches, key=lambda match: match.similarity, reverse=True)
+
+    def add_listing(self, rental_id: str, facebook_id: Optional[str], rental_data: Dict) -> bool:
+        """Index a listing from its rentals row"""
+        return self.add(rental_id, facebook_id, listing_text(rental_data))
+
+    def flag(self, facebook_id: Optional[str], rental_data: Dict) -> Optional[NearDuplicate]:
+        """
+        Mark a new listing for duplicate review if it looks like a repost
+
+        Sets duplicate_status, master_rental_id and duplicate_score on
+        rental_data in place, so the row is written already flagged.
+
+        Returns:
+            The best match, or None
+        """
+        matches = self.query(listing_text(rental_data), exclude_facebook_id=facebook_id)
+        if not matches:
+            return None
+        best = matches[0]
+        rental_data['duplicate_status'] = 'review'
+        rental_data['master_rental_id'] = best.rental_id
+        rental_data['duplicate_score'] = round(best.similarity * 100, 2)
+        return best
+
+    def remap_rental_id(self, facebook_id: str, rental_id: str):
+        """Point an indexed listing at its upstream rental id"""
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT rental_id FROM minhash_signatures WHERE facebook_id = ?", (facebook_id,)
+            ).fetchone()
+            if row is None or row[0] == rental_id:
+                return
+            if self.conn.execute(
+                "SELECT 1 FROM minhash_signatures WHERE rental_id = ?", (rental_id,)
+            ).fetchone():
+                # Upstream listing is already indexed - drop the local copy
+                self.conn.execute("DELETE FROM minhash_signatures WHERE rental_id = ?", (row[0],))
+                self.conn.execute("DELETE FROM minhash_buckets WHERE rental_id = ?", (row[0],))
+                return
+            self.conn.execute(
+                "UPDATE minhash_signatures SET rental_id = ? WHERE rental_id = ?", (rental_id, row[0])
+            )
+            self.conn.execute(
+                "UPDATE minhash_buckets SET rental_id = ? WHERE rental_id = ?", (rental_id, row[0])
+            )
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Columnar Parquet Export for Scraped Listings
+Writes RentalListing / RentalData batches to a Parquet dataset partitioned
+by source and scrape date, for price-trend and per-area analytics
+"""
+
+import json
+import logging
+import uuid
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from jsonl_export import iter_jsonl, is_jsonl_path
+
+# <scratchpad>One schema for both the Facebook scrapers and the aggregator so analytics can scan a single dataset</scratchpad>
+# AI-DEV: Partition columns (source, scrape_date) are stored in directory names, not in the files
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLS = ['source', 'scrape_date']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+
+def listing_schema() -> 'pa.Schema':
+    """Arrow schema shared by all listing sources"""
+    _require_pyarrow()
+    return pa.schema([
+        ('source', pa.string()),
+        ('scrape_date', pa.string()),
+        ('external_id', pa.string()),
+        ('title', pa.string()),
+        ('description', pa.string()),
+        ('listing_url', pa.string()),
+        ('price_per_month', pa.float64()),
+        ('currency', pa.dictionary(pa.int8(), pa.string())),
+        ('bedrooms', pa.int16()),
+        ('bathrooms', pa.float32()),
+        ('square_feet', pa.int32()),
+        ('property_type', pa.dictionary(pa.int8(), pa.string())),
+        ('location_text', pa.string()),
+        ('city', pa.dictionary(pa.int32(), pa.string())),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('group_id', pa.string()),
+        ('group_name', pa.dictionary(pa.int32(), pa.string())),
+        ('amenities', pa.list_(pa.dictionary(pa.int32(), pa.string()))),
+        ('image_count', pa.int16()),
+        ('scraped_at', pa.timestamp('us')),
+    ])
+
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def listing_to_row(listing: Any) -> Dict[str, Any]:
+    """
+    Normalize a RentalListing, RentalData or their dict form to a flat row
+
+    RentalListing rows carry facebook_id and scraped_at; RentalData rows carry
+    source, external_id and retrieved_at.
+    """
+    if is_dataclass(listing) and not isinstance(listing, type):
+        listing = asdict(listing)
+
+    scraped_at = _parse_datetime(listing.get('scraped_at') or listing.get('retrieved_at')) or datetime.now()
+
+    if 'facebook_id' in listing:
+        source = 'facebook_group' if listing.get('group_id') else 'facebook_marketplace'
+        external_id = listing['facebook_id']
+    else:
+        source = listing.get('source') or 'unknown'
+        external_id = listing.get('external_id')
+
+    bedrooms = listing.get('bedrooms')
+    bathrooms = listing.get('bathrooms')
+    square_feet = listing.get('square_feet')
+    images = listing.get('image_urls') or listing.get('images') or []
+
+    return {
+        'source': source,
+        'scrape_date': scraped_at.date().isoformat(),
+        'external_id': str(external_id) if external_id is not None else None,
+        'title': listing.get('title'),
+        'description': listing.get('description'),
+        'listing_url': listing.get('listing_url'),
+        'price_per_month': float(listing['price_per_month']) if listing.get('price_per_month') is not None else None,
+        'currency': listing.get('currency'),
+        'bedrooms': int(bedrooms) if bedrooms is not None else None,
+        'bathrooms': float(bathrooms) if bathrooms is not None else None,
+        'square_feet': int(square_feet) if square_feet is not None else None,
+        'property_type': listing.get('property_type'),
+        'location_text': listing.get('location_text') or listing.get('address'),
+        'city': listing.get('city'),
+        'latitude': listing.get('latitude'),
+        'longitude': listing.get('longitude'),
+        'group_id': listing.get('group_id'),
+        'group_name': listing.get('group_name'),
+        'amenities': list(listing.get('amenities') or []),
+        'image_count': len(images),
+        'scraped_at': scraped_at,
+    }
+
+
+def rows_to_table(rows: List[Dict[str, Any]]) -> 'pa.Table':
+    """Build a typed Arrow table, dictionary-encoding amenities"""
+    _require_pyarrow()
+    schema = listing_schema()
+    columns = {}
+
+    for field in schema:
+        values = [row[field.name] for row in rows]
+        if field.name == 'amenities':
+            offsets = [0]
+            flat = []
+            for amenity_list in values:
+                flat.extend(amenity_list)
+                offsets.append(len(flat))
+            dictionary_values = pa.array(flat, type=pa.string()).dictionary_encode()
+            columns[field.name] = pa.ListArray.from_arrays(
+                pa.array(offsets, type=pa.int32()), dictionary_values
+            ).cast(field.type)
+        elif pa.types.is_dictionary(field.type):
+            columns[field.name] = pa.array(values, type=pa.string()).dictionary_encode().cast(field.type)
+        else:
+            columns[field.name] = pa.array(values, type=field.type)
+
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+class ParquetExporter:
+    """
+    Writes listing batches to a Parquet dataset partitioned by source and date
+
+    Layout: <root>/source=<source>/scrape_date=<YYYY-MM-DD>/part-<id>-0.parquet
+    """
+
+    def __init__(self, root_dir: str, compression: str = 'zstd', batch_size: int = 50_000):
+        _require_pyarrow()
+        self.root_dir = root_dir
+        self.compression = compression
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def write_batch(self, listings: Iterable[Any]) -> int:
+        """
+        Write one batch of listings as new files in the dataset
+
+        Returns:
+            Number of rows written
+        """
+        rows = [listing_to_row(listing) for listing in listings]
+        if not rows:
+            return 0
+
+        table = rows_to_table(rows)
+        pq.write_to_dataset(
+            table,
+            root_path=self.root_dir,
+            partition_cols=PARTITION_COLS,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            compression=self.compression,
+            use_dictionary=True,
+        )
+        self.logger.info(f"Wrote {len(rows)} listings to {self.root_dir}")
+        return len(rows)
+
+    def write_stream(self, listings: Iterable[Any]) -> int:
+        """Write listings from any iterable in bounded-size batches"""
+        total = 0
+        batch = []
+        for listing in listings:
+            batch.append(listing)
+            if len(batch) >= self.batch_size:
+                total += self.write_batch(batch)
+                batch = []
+        total += self.write_batch(batch)
+        return total
+
+
+def read_listings(
+    root_dir: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List] = None
+) -> 'pa.Table':
+    """
+    Read (a projection of) the listing dataset
+
+    Example:
+        read_listings('exports', columns=['city', 'price_per_month'],
+                      filters=[('source', '=', 'facebook_group')])
+    """
+    _require_pyarrow()
+    return pq.read_table(root_dir, columns=columns, filters=filters)
+
+
+def _iter_export_file(path: str) -> Iterator[Dict]:
+    """Iterate listings from a scraper JSON or JSON Lines export"""
+    if is_jsonl_path(path):
+        yield from iter_jsonl(path)
+        return
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    yield from data.get('listings') or data.get('rentals') or []
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export scraped listings to partitioned Parquet")
+    parser.add_argument("inputs", nargs="+", help="Scraper JSON / JSON Lines export files")
+    parser.add_argument("--out", type=str, default="listings_parquet", help="Dataset root directory")
+    parser.add_argument("--compression", type=str, default="zstd", help="Parquet compression codec")
+    parser.add_argument("--json", action="store_true", help="Output JSON for API")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    exporter = ParquetExporter(args.out, compression=args.compression)
+    written = sum(exporter.write_stream(_iter_export_file(path)) for path in args.inputs)
+
+    if args.json:
+        print(json.dumps({"status": "success", "rows_written": written, "dataset": args.out}))
+    else:
+        print(f"Wrote {written} listings to {args.out}")
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Resilience Helpers for External Calls
+Per-call deadlines, jittered exponential retries, hedged requests and
+circuit breakers shared by the Supabase, Firecrawl and UploadThing paths
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+import httpx
+
+try:
+    from postgrest.exceptions import APIError
+except ImportError:
+    APIError = None
+
+# <scratchpad>Policies are plain dataclasses so each call site can tune budgets without subclassing</scratchpad>
+# AI-DEV: Only hedge idempotent reads - a hedged write may be applied twice
+# AI-DEV: asyncio.wait_for cannot stop a call running on a worker thread - do not retry such timeouts
+
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+
+# PostgREST codes worth retrying: connection/resource SQLSTATE classes and PGRST000-003 (database unreachable)
+_TRANSIENT_SQLSTATE_CLASSES = ('08', '40', '53', '57')
+_TRANSIENT_PGRST_CODES = ('PGRST000', 'PGRST001', 'PGRST002', 'PGRST003')
+
+
+def is_transient_http_error(error: BaseException) -> bool:
+    """Retry network errors, timeouts, 429 and 5xx - not client or programming errors"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    if APIError is not None and isinstance(error, APIError):
+        # supabase-py surfaces PostgREST errors by code, not status
+        code = str(error.code or '')
+        if not code:
+            # A gateway error without a PostgREST body (e.g. a 503 from the proxy)
+            return True
+        if len(code) == 3 and code.isdigit():
+            return code == '429' or code >= '500'
+        return code in _TRANSIENT_PGRST_CODES or code[:2] in _TRANSIENT_SQLSTATE_CLASSES
+    # ConnectionError and other socket failures are OSErrors
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, OSError))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open"""
+
+
+@dataclass
+class RetryPolicy:
+    """How often and how patiently to retry a call"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    timeout: Optional[float] = 30.0  # per-attempt deadline in seconds
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+    should_retry: Optional[Callable[[BaseException], bool]] = None  # e.g. only 5xx / 429
+    retry_timeouts: bool = True  # False when a timed-out attempt keeps running (worker threads)
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Whether the error is transient - only these are retried and count against the breaker"""
+        return self.should_retry is None or self.should_retry(error)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (0-based) attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency for a cool-down period
+
+    closed -> open after failure_threshold consecutive failures;
+    open -> half-open after reset_timeout, where a single probe call decides
+    whether to close again or re-open while other callers are still rejected.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self) -> bool:
+        """
+        Raise CircuitOpenError if calls are currently rejected
+
+        Returns:
+            True if this call is the half-open probe (pass it to release())
+        """
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self.probing):
+                raise CircuitOpenError(f"Circuit '{self.name}' is open")
+            if state == 'half-open':
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self, probe: bool):
+        """End a call that neither succeeded nor failed transiently, freeing the probe slot"""
+        if probe:
+            with self._lock:
+                self.probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Get the process-wide circuit breaker for a dependency"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+        return _breakers[name]
+
+
+def _settle_failure(
+    error: BaseException,
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker],
+    probe: bool,
+    attempt: int
+) -> bool:
+    """Record a failed attempt on the breaker and decide whether to retry it"""
+    transient = policy.is_retryable(error)
+    if breaker:
+        if transient:
+            breaker.record_failure()
+        else:
+            # The dependency answered - a rejected request says nothing about its health
+            breaker.release(probe)
+    if not transient or attempt == policy.max_attempts - 1:
+        return False
+    return policy.retry_timeouts or not isinstance(error, asyncio.TimeoutError)
+
+
+async def call_async(
+    func: Callable[[], Awaitable[T]],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    description: str = 'call'
+) -> T:
+    """
+    Await func() with a per-attempt deadline, retries and a circuit breaker
+
+    Args:
+        func: Zero-argument coroutine factory (called once per attempt)
+        policy: Retry and timeout policy
+        breaker: Circuit breaker guarding the dependency
+        description: Name used in log messages
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        probe = breaker.before_call() if breaker else False
+        try:
+            if policy.timeout:
+                result = await asyncio.wait_for(func(), timeout=policy.timeout)
+            else:
+                result = await func()
+        except policy.retry_on + (asyncio.TimeoutError,) as e:
+            if not _settle_failure(e, policy, breaker, probe, attempt):
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning(f"{description} failed ({e!r}), retry {attempt + 1}/{policy.max_attempts - 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except BaseException:
+            # Cancelled, or an error the policy does not handle
+            if breaker:
+                breaker.release(probe)
+            raise
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+def call_sync(
+    func: Callable[[], T],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    description: str = 'call'
+) -> T:
+    """
+    Call func() with retries and a circuit breaker
+
+    Blocking clients own their timeouts (e.g. the pooled httpx session), so
+    policy.timeout is not enforced here. Back-off sleeps block the calling
+    thread - from a coroutine, run this with asyncio.to_thread.
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.max_attempts):
+        probe = breaker.before_call() if breaker else False
+        try:
+            result = func()
+        except policy.retry_on as e:
+            if not _settle_failure(e, policy, breaker, probe, attempt):
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning(f"{description} failed ({e!r}), retry {attempt + 1}/{policy.max_attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
+        except BaseException:
+            if breaker:
+                breaker.release(probe)
+            raise
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
+
+
+async def hedged(
+    func: Callable[[], Awaitable[T]],
+    hedge_after: float,
+    max_hedges: int = 1
+) -> T:
+    """
+    Run an idempotent read, starting a duplicate request if the first is slow
+
+    The first successful response wins and the others are cancelled.
+
+    Args:
+        func: Zero-argument coroutine factory for the read
+        hedge_after: Seconds to wait before firing each extra request
+        max_hedges: Number of extra requests allowed
+    """
+    tasks = [asyncio.ensure_future(func())]
+    hedges_left = max_hedges
+    last_error: Optional[BaseException] = None
+    try:
+        while tasks:
+            timeout = hedge_after if hedges_left > 0 else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # In-flight requests are slow - fire a hedge
+                hedges_left -= 1
+                tasks.append(asyncio.ensure_future(func()))
+                continue
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+            if not tasks and hedges_left > 0:
+                # Everything in flight failed - spend a hedge as an immediate retry
+                hedges_left -= 1
+                tasks.append(asyncio.ensure_future(func()))
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# Shared policies for the external dependencies
+SUPABASE_POLICY = RetryPolicy(
+    max_attempts=4, base_delay=0.5, max_delay=8.0, timeout=None, should_retry=is_transient_http_error
+)
+# A plain insert whose response was lost may have been applied - never re-send it
+SUPABASE_INSERT_POLICY = RetryPolicy(max_attempts=1, timeout=None, should_retry=is_transient_http_error)
+# The SDK runs on a worker thread that outlives the deadline, so a timed-out
+# scrape is still spending credits - retry errors, not timeouts
+FIRECRAWL_POLICY = RetryPolicy(
+    max_attempts=3, base_delay=2.0, max_delay=30.0, timeout=120.0, retry_timeouts=False
+)
+# Status checks are free reads, so a duplicate left running by a timeout is harmless
+FIRECRAWL_STATUS_POLICY = RetryPolicy(max_attempts=3, base_delay=2.0, max_delay=30.0, timeout=60.0)
+UPLOADTHING_POLICY = RetryPolicy(
+    max_attempts=4, base_delay=0.5, max_delay=10.0, timeout=60.0, should_retry=is_transient_http_error
+)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+On-Disk Response Cache
+Compressed SQLite cache of API responses keyed by URL and normalized
+request params, with per-entry TTLs and least-recently-used size eviction
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# <scratchpad>Params are serialized with sorted keys, so dict order never splits cache entries</scratchpad>
+# AI-DEV: Expired rows are removed on read and during eviction - there is no background sweeper
+
+DEFAULT_RESPONSE_CACHE_PATH = os.getenv('FIRECRAWL_CACHE_PATH', 'firecrawl_cache.db')
+DEFAULT_TTL = float(os.getenv('FIRECRAWL_CACHE_TTL', str(6 * 3600)))
+DEFAULT_MAX_BYTES = int(os.getenv('FIRECRAWL_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Stable key for a request"""
+    normalized = json.dumps(params or {}, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{url}\n{normalized}".encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite table of request key -> compressed JSON response
+
+    Bodies are zstd-compressed when zstandard is installed, zlib otherwise;
+    the codec is stored per row so either build reads both.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_RESPONSE_CACHE_PATH,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    codec TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+
+    def _compress(self, data: bytes) -> Tuple[str, bytes]:
+        if zstandard is not None:
+            return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+        return 'zlib', zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(codec: str, body: bytes) -> bytes:
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ImportError("Cached entry is zstd-compressed (pip install zstandard)")
+            return zstandard.ZstdDecompressor().decompress(body)
+        return zlib.decompress(body)
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """The cached response, or None if missing or expired"""
+        key = cache_key(url, params)
+        row = self.conn.execute(
+            "SELECT codec, body, expires_at FROM responses WHERE cache_key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[2] <= now:
+            if row is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+            self.misses += 1
+            return None
+
+        try:
+            response = json.loads(self._decompress(row[0], row[1]))
+        except (ImportError, ValueError, zlib.error) as e:
+            self.logger.warning(f"Dropping unreadable cache entry for {url}: {e}")
+            with self.conn:
+                self.conn.execute("DELETE FROM responses WHERE cache_key = ?", (key,))
+            self.misses += 1
+            return None
+
+        with self.conn:
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE cache_key = ?", (now, key))
+        self.hits += 1
+        return response
+
+    def put(self, url: str, params: Optional[Dict[str, Any]], response: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable response, then evict down to max_bytes"""
+        codec, body = self._compress(json.dumps(response, ensure_ascii=False, default=str).encode('utf-8'))
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (cache_key, url, codec, body, size, created_at, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key(url, params), url, codec, body, len(body), now, now + (self.ttl if ttl is None else ttl), now)
+            )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self.conn:
+            self.conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            doomed = []
+            for key, size in self.conn.execute("SELECT cache_key, size FROM responses ORDER BY accessed_at"):
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            self.conn.executemany("DELETE FROM responses WHERE cache_key = ?", doomed)
+        self.logger.info(f"Evicted {len(doomed)} cached responses")
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
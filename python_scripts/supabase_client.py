@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Shared Supabase Client
+One pooled, keep-alive Supabase/PostgREST client per process, shared by
+every scraper and importer
+"""
+
+import asyncio
+import os
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+from resilience import SUPABASE_INSERT_POLICY, SUPABASE_POLICY, call_sync, get_breaker
+
+load_dotenv()
+
+# <scratchpad>Clients are cached per (url, key) so every entry point reuses warm connections</scratchpad>
+# AI-DEV: HTTP/2 needs the optional h2 package (pip install httpx[http2])
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=60.0
+)
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+_clients: Dict[Tuple[str, str], Client] = {}
+_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _use_http2(http2: Optional[bool]) -> bool:
+    if http2 is None:
+        http2 = os.getenv('SUPABASE_HTTP2', '1') not in ('0', 'false', 'False')
+    if http2 and not _http2_available():
+        logger.info("h2 package not installed, using HTTP/1.1 keep-alive")
+        return False
+    return http2
+
+
+def create_http_client(
+    base_url: str = '',
+    headers: Optional[Dict[str, str]] = None,
+    timeout: httpx.Timeout = DEFAULT_TIMEOUT,
+    limits: httpx.Limits = DEFAULT_LIMITS,
+    http2: Optional[bool] = None
+) -> httpx.Client:
+    """
+    Create a pooled keep-alive HTTP client
+
+    Args:
+        base_url: Base URL for relative requests
+        headers: Default headers sent with every request
+        timeout: Request timeout
+        limits: Connection pool limits
+        http2: Enable HTTP/2 (defaults to SUPABASE_HTTP2, on when h2 is installed)
+    """
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers or {},
+        timeout=timeout,
+        limits=limits,
+        http2=_use_http2(http2),
+        follow_redirects=True
+    )
+
+
+def _install_pooled_session(client: Client, http2: Optional[bool]):
+    """Swap the PostgREST session for a tuned, pooled one"""
+    try:
+        postgrest = client.postgrest
+        session = postgrest.session
+        postgrest.session = create_http_client(
+            base_url=str(session.base_url),
+            headers=dict(session.headers),
+            timeout=session.timeout,
+            http2=http2
+        )
+        session.close()
+    except AttributeError as e:
+        # Client internals differ between supabase-py versions - keep the default session
+        logger.warning(f"Could not install pooled PostgREST session: {e}")
+
+
+def get_supabase_client(
+    url: Optional[str] = None,
+    key: Optional[str] = None,
+    http2: Optional[bool] = None
+) -> Client:
+    """
+    Get the shared Supabase client for this process
+
+    The client is created on first use and reused by every caller with the
+    same URL and key, so batched writes go over warm connections.
+
+    Args:
+        url: Supabase URL (defaults to NEXT_PUBLIC_SUPABASE_URL)
+        key: Supabase key (defaults to NEXT_PUBLIC_SUPABASE_ANON_KEY)
+        http2: Enable HTTP/2 for PostgREST requests
+    """
+    url = url or os.getenv('NEXT_PUBLIC_SUPABASE_URL')
+    key = key or os.getenv('NEXT_PUBLIC_SUPABASE_ANON_KEY')
+    if not url or not key:
+        raise ValueError("NEXT_PUBLIC_SUPABASE_URL and NEXT_PUBLIC_SUPABASE_ANON_KEY environment variables are required")
+
+    cache_key = (url, key)
+    with _lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = create_client(url, key)
+            _install_pooled_session(client, http2)
+            _clients[cache_key] = client
+        return client
+
+
+def is_idempotent_query(query) -> bool:
+    """Whether re-sending a query is safe: anything but a plain (non-upsert) insert"""
+    if getattr(query, 'http_method', 'GET').upper() != 'POST':
+        return True
+    headers = getattr(query, 'headers', None) or {}
+    return 'merge-duplicates' in headers.get('Prefer', '')
+
+
+def execute_query(query, description: str = 'Supabase request'):
+    """
+    Execute a PostgREST query behind the shared Supabase circuit breaker
+
+    Transient errors are retried, except on plain inserts: a retry after a
+    lost response could store the row twice.
+    """
+    policy = SUPABASE_POLICY if is_idempotent_query(query) else SUPABASE_INSERT_POLICY
+    return call_sync(query.execute, policy, get_breaker('supabase'), description)
+
+
+async def execute_query_async(query, description: str = 'Supabase request'):
+    """execute_query() on a worker thread, so requests and back-off never block the event loop"""
+    return await asyncio.to_thread(execute_query, query, description)
+
+
+def close_clients():
+    """Close all pooled sessions (call once at process exit)"""
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.postgrest.session.close()
+            except AttributeError:
+                pass
+        _clients.clear()
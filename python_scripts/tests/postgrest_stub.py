@@ -0,0 +1,128 @@
+"""
+Offline PostgREST stand-in
+An httpx.MockTransport serving the subset of PostgREST the scrapers use
+(select with eq/in filters, insert/upsert, update), backed by in-memory
+tables with the rentals foreign keys enforced
+"""
+
+import json
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+
+BASE_URL = 'http://postgrest.local'
+
+# child table -> columns that must reference an existing rentals.id
+RENTAL_FOREIGN_KEYS = {
+    'rentals': ['master_rental_id'],
+    'rental_images': ['rental_id'],
+    'rental_amenities': ['rental_id'],
+    'scrape_metadata': ['rental_id'],
+    'rental_price_history': ['rental_id'],
+}
+
+# Natural keys that reject a second row
+UNIQUE_KEYS = {
+    'rentals': 'facebook_id',
+}
+
+
+class FakePostgrest:
+    """In-memory tables plus a request log; fail_next injects transient 503s"""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict]] = {'amenities': [{'id': 'amenity-balcony', 'name': 'מרפסת'}]}
+        self.requests: List[httpx.Request] = []
+        self.fail_next = 0
+
+    def rows(self, table: str) -> List[Dict]:
+        return self.tables.setdefault(table, [])
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def client(self) -> SyncPostgrestClient:
+        stub = self
+
+        class Client(SyncPostgrestClient):
+            def create_session(self, base_url, headers, timeout):
+                return SyncClient(base_url=base_url, headers=headers, timeout=timeout, transport=stub.transport())
+
+        return Client(BASE_URL)
+
+    @staticmethod
+    def _error(status: int, code: str, message: str) -> httpx.Response:
+        return httpx.Response(status, json={'code': code, 'message': message, 'details': None, 'hint': None})
+
+    @staticmethod
+    def _matches(row: Dict, params: httpx.QueryParams) -> bool:
+        for column, condition in params.multi_items():
+            if column in ('select', 'on_conflict'):
+                continue
+            op, _, value = condition.partition('.')
+            if op == 'eq' and str(row.get(column)) != value:
+                return False
+            if op == 'in' and str(row.get(column)) not in value.strip('()').split(','):
+                return False
+        return True
+
+    def _violation(self, table: str, row: Dict, pending: List[Dict]) -> Optional[httpx.Response]:
+        rental_ids = {r['id'] for r in self.rows('rentals')} | ({r['id'] for r in pending} if table == 'rentals' else set())
+        for column in RENTAL_FOREIGN_KEYS.get(table, []):
+            if row.get(column) and row[column] not in rental_ids:
+                return self._error(409, '23503', f'insert or update on table "{table}" violates foreign key constraint on {column}')
+        key = UNIQUE_KEYS.get(table)
+        if key and row.get(key) is not None:
+            for existing in self.rows(table):
+                if existing.get(key) == row[key] and existing.get('id') != row.get('id'):
+                    return self._error(409, '23505', f'duplicate key value violates unique constraint on {key}')
+        return None
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            return httpx.Response(503, json={'message': 'upstream unavailable'})
+
+        table = request.url.path.strip('/')
+        params = request.url.params
+
+        if request.method == 'GET':
+            return httpx.Response(200, json=[r for r in self.rows(table) if self._matches(r, params)])
+
+        if request.method == 'PATCH':
+            changes = json.loads(request.content)
+            hit = [r for r in self.rows(table) if self._matches(r, params)]
+            for row in hit:
+                error = self._violation(table, {**row, **changes}, [])
+                if error:
+                    return error
+            for row in hit:
+                row.update(changes)
+            return httpx.Response(200, json=hit)
+
+        if request.method == 'POST':
+            body = json.loads(request.content)
+            new_rows = body if isinstance(body, list) else [body]
+            upsert = 'merge-duplicates' in request.headers.get('prefer', '')
+            staged = [{'id': row.get('id') or str(uuid.uuid4()), **row} for row in new_rows]
+            # A statement is all or nothing
+            for row in staged:
+                error = self._violation(table, row, staged)
+                if error:
+                    return error
+            stored = self.rows(table)
+            for row in staged:
+                existing = next((r for r in stored if r.get('id') == row['id']), None)
+                if existing is None:
+                    stored.append(row)
+                elif upsert:
+                    existing.update(row)
+                else:
+                    return self._error(409, '23505', 'duplicate key value violates unique constraint on id')
+            return httpx.Response(201, json=staged)
+
+        return httpx.Response(405)
@@ -0,0 +1,47 @@
+"""Tests of the offline duplicate clustering job"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import duplicate_clustering as dc  # noqa: E402
+
+TITLE = 'דירת 3 חדרים ברחוב הרצל עם מרפסת'
+
+
+def _record(rental_id, price, title=None):
+    text = title or f'listing {rental_id} ' + ' '.join(f'{rental_id}{n}' for n in range(8))
+    return {
+        'id': rental_id,
+        'title': text,
+        'description': text * 3,
+        'location_text': f'{text}, תל אביב',
+        'city': 'תל אביב',
+        'bedrooms': 3,
+        'price_per_month': price,
+    }
+
+
+def test_text_similarity_matches_the_broadcast_estimate():
+    rng = np.random.default_rng(0)
+    sig_a = rng.integers(0, 4, size=(20, 64)).astype(np.uint64)
+    sig_b = rng.integers(0, 4, size=(30, 64)).astype(np.uint64)
+
+    expected = (sig_a[:, None, :] == sig_b[None, :, :]).mean(axis=2)
+    assert np.allclose(dc._text_similarity(sig_a, sig_b), expected)
+
+
+@pytest.mark.parametrize('next_band_size', [2, 30])
+def test_oversized_block_is_scored_against_the_next_band(next_band_size):
+    band = dc.price_band(5000)
+    edge = dc.PRICE_BAND_RATIO ** (band + 1)
+    records = [_record(f'filler-{i}', edge * 0.85) for i in range(30)]
+    records += [_record(f'next-{i}', edge * 1.1) for i in range(next_band_size)]
+    # A repost priced 2% apart, either side of the band edge
+    records += [_record('original', edge * 0.99, TITLE), _record('repost', edge * 1.01, TITLE)]
+
+    result = dc.DuplicateClusteringJob(max_workers=1, max_block_size=8).run(records)
+
+    assert [sorted([c['keepRentalId'], *c['mergeRentalIds']]) for c in result.merge_candidates] == [
+        ['original', 'repost']
+    ]
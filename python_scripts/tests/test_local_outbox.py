@@ -0,0 +1,126 @@
+"""Offline tests of the local outbox against a PostgREST stand-in"""
+
+import pytest
+
+pytest.importorskip('postgrest')
+
+from local_outbox import LocalOutbox, OutboxSyncer, STATUS_PENDING  # noqa: E402
+from resilience import get_breaker  # noqa: E402
+from tests.postgrest_stub import FakePostgrest  # noqa: E402
+
+
+def _listing(facebook_id, title='דירת 3 חדרים בפלורנטין'):
+    return (
+        {'facebook_id': facebook_id, 'title': title, 'price_per_month': 5500},
+        [{'image_url': f'https://img.example/{facebook_id}.jpg', 'image_order': 0, 'is_primary': True}],
+        ['מרפסת'],
+        {'source_url': f'https://www.facebook.com/groups/1/posts/{facebook_id}/'},
+    )
+
+
+def _syncer(outbox, upstream, **kwargs):
+    return OutboxSyncer(outbox, upstream.client(), max_retries=3, base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def closed_breaker():
+    # Breakers are process-wide - start every test closed
+    get_breaker('supabase').record_success()
+    yield
+    get_breaker('supabase').record_success()
+
+
+@pytest.fixture
+def upstream():
+    return FakePostgrest()
+
+
+def test_rows_survive_a_crash_before_sync(tmp_path, upstream):
+    path = str(tmp_path / 'outbox.db')
+    outbox = LocalOutbox(path)
+    rental_id = outbox.enqueue_listing(*_listing('1001'))
+    # The process dies here: no sync, no close
+
+    reopened = LocalOutbox(path)
+    synced = _syncer(reopened, upstream).sync()
+
+    assert synced['rentals'] == 1
+    assert [r['id'] for r in upstream.rows('rentals')] == [rental_id]
+    assert upstream.rows('rental_images')[0]['rental_id'] == rental_id
+    assert upstream.rows('rental_amenities') == [
+        {'id': upstream.rows('rental_amenities')[0]['id'], 'rental_id': rental_id, 'amenity_id': 'amenity-balcony'}
+    ]
+    assert upstream.rows('scrape_metadata')[0]['rental_id'] == rental_id
+    reopened.close()
+
+
+def test_resync_is_idempotent(tmp_path, upstream):
+    outbox = LocalOutbox(str(tmp_path / 'outbox.db'))
+    outbox.enqueue_listing(*_listing('1001'))
+    outbox.enqueue_listing(*_listing('1002', title='חדר בשותפות ברמת גן'))
+
+    # Transient failures are retried; a second sync has nothing left to push
+    upstream.fail_next = 2
+    first = _syncer(outbox, upstream).sync()
+    second = _syncer(outbox, upstream).sync()
+
+    assert first['rentals'] == 2 and first['rental_images'] == 2
+    assert all(count == 0 for count in second.values())
+    assert len(upstream.rows('rentals')) == 2
+    assert len(upstream.rows('rental_images')) == 2
+
+
+def test_resync_after_crash_between_push_and_mark(tmp_path, upstream):
+    outbox = LocalOutbox(str(tmp_path / 'outbox.db'))
+    outbox.enqueue_listing(*_listing('1001'))
+    _syncer(outbox, upstream).sync()
+
+    # Pretend the local marks were lost: everything is pending again
+    with outbox.conn:
+        for table in ('rentals', 'rental_images', 'scrape_metadata'):
+            outbox.conn.execute(f"UPDATE {table} SET status = ?", (STATUS_PENDING,))
+
+    _syncer(outbox, upstream).sync()
+
+    # Client-generated ids make the re-push an upsert of the same rows;
+    # the listing is recognised as existing and its children are not re-sent
+    assert len(upstream.rows('rentals')) == 1
+    assert len(upstream.rows('rental_images')) == 1
+    assert len(upstream.rows('scrape_metadata')) == 1
+
+
+def test_existing_listing_is_remapped(tmp_path, upstream):
+    upstream.rows('rentals').append({'id': 'upstream-1', 'facebook_id': '1001', 'title': 'ישן', 'price_per_month': 5000})
+    outbox = LocalOutbox(str(tmp_path / 'outbox.db'))
+    outbox_id = outbox.enqueue_listing(*_listing('1001'))
+    outbox.enqueue_update(
+        outbox_id,
+        {'price_per_month': 5500},
+        [{'image_url': 'https://img.example/new.jpg', 'image_order': 1, 'is_primary': False}],
+        {'rental_id': outbox_id, 'price': 5500, 'price_change_amount': 500, 'recorded_at': '2024-05-01T10:00:00'},
+    )
+    repost_id = outbox.enqueue_listing(*_listing('1002'))
+    with outbox.conn:
+        # Flagged as a repost of the queued (but already existing) listing
+        outbox.conn.execute(
+            "UPDATE rentals SET payload = json_set(payload, '$.master_rental_id', ?) WHERE id = ?", (outbox_id, repost_id)
+        )
+
+    remapped = []
+    _syncer(outbox, upstream, on_existing=lambda facebook_id, rental_id: remapped.append((facebook_id, rental_id))).sync()
+
+    assert remapped == [('1001', 'upstream-1')]
+    rentals = {r['facebook_id']: r for r in upstream.rows('rentals')}
+    assert rentals['1001']['id'] == 'upstream-1' and rentals['1001']['price_per_month'] == 5500
+    assert rentals['1002']['master_rental_id'] == 'upstream-1'
+    # The duplicate's own image is dropped, the later one lands on the upstream rental
+    assert [(r['rental_id'], r['image_url']) for r in upstream.rows('rental_images') if r['rental_id'] == 'upstream-1'] == [
+        ('upstream-1', 'https://img.example/new.jpg')
+    ]
+    assert upstream.rows('rental_price_history')[0]['rental_id'] == 'upstream-1'
+
+    # Changes queued after the skip resolve to the upstream id as well
+    outbox.enqueue_update(outbox_id, {'title': 'חדש'}, [], None)
+    _syncer(outbox, upstream).sync()
+    assert rentals['1001']['title'] == 'חדש'
+    assert not any(counts.get(STATUS_PENDING) for counts in outbox.counts().values())
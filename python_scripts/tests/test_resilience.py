@@ -0,0 +1,256 @@
+"""Fault-injection tests of the retry policies and circuit breakers"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import resilience
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FIRECRAWL_POLICY,
+    RetryPolicy,
+    call_async,
+    call_sync,
+    get_breaker,
+    is_transient_http_error,
+)
+
+FAST = dict(base_delay=0.001, max_delay=0.005, timeout=None)
+
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request('GET', 'http://example.test/')
+    return httpx.HTTPStatusError(f'{status}', request=request, response=httpx.Response(status, request=request))
+
+
+class Flaky:
+    """Callable failing with the given errors in turn, then returning 'ok'"""
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def test_transient_errors_are_retried():
+    func = Flaky(_status_error(503), _status_error(429))
+    policy = RetryPolicy(max_attempts=3, should_retry=is_transient_http_error, **FAST)
+
+    assert call_sync(func, policy) == 'ok'
+    assert func.calls == 3
+
+
+def test_client_errors_are_not_retried_and_do_not_open_the_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=3, should_retry=is_transient_http_error, **FAST)
+
+    for _ in range(5):
+        func = Flaky(_status_error(409))
+        with pytest.raises(httpx.HTTPStatusError):
+            call_sync(func, policy, breaker)
+        assert func.calls == 1
+
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_programming_errors_are_not_retried_and_do_not_open_the_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=3, should_retry=is_transient_http_error, **FAST)
+    func = Flaky(KeyError('price_per_month'))
+
+    with pytest.raises(KeyError):
+        call_sync(func, policy, breaker)
+
+    assert func.calls == 1
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_network_errors_are_retried():
+    request = httpx.Request('GET', 'http://example.test/')
+    func = Flaky(httpx.ConnectError('refused', request=request), ConnectionResetError(), asyncio.TimeoutError())
+    policy = RetryPolicy(max_attempts=4, should_retry=is_transient_http_error, **FAST)
+
+    assert call_sync(func, policy) == 'ok'
+    assert func.calls == 4
+
+
+def test_transient_failures_open_the_breaker():
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+    policy = RetryPolicy(max_attempts=3, should_retry=is_transient_http_error, **FAST)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call_sync(Flaky(*[_status_error(503)] * 3), policy, breaker)
+
+    assert breaker.state == 'open'
+    untouched = Flaky()
+    with pytest.raises(CircuitOpenError):
+        call_sync(untouched, policy, breaker)
+    assert untouched.calls == 0
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == 'half-open'
+
+    probe_started, release_probe = threading.Event(), threading.Event()
+    rejected = []
+
+    def slow_probe():
+        probe_started.set()
+        release_probe.wait(1)
+        return 'ok'
+
+    def other_caller():
+        try:
+            call_sync(lambda: 'ok', RetryPolicy(max_attempts=1, **FAST), breaker)
+        except CircuitOpenError:
+            rejected.append(True)
+
+    probe = threading.Thread(target=lambda: call_sync(slow_probe, RetryPolicy(max_attempts=1, **FAST), breaker))
+    probe.start()
+    probe_started.wait(1)
+    others = [threading.Thread(target=other_caller) for _ in range(3)]
+    for thread in others:
+        thread.start()
+    for thread in others:
+        thread.join()
+    release_probe.set()
+    probe.join()
+
+    assert len(rejected) == 3
+    assert breaker.state == 'closed'
+
+
+def test_failed_probe_reopens_and_rejected_probe_frees_the_slot():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    policy = RetryPolicy(max_attempts=1, should_retry=is_transient_http_error, **FAST)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    # A client error says nothing about health: the next caller may probe
+    with pytest.raises(httpx.HTTPStatusError):
+        call_sync(Flaky(_status_error(400)), policy, breaker)
+    assert breaker.state == 'half-open' and not breaker.probing
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call_sync(Flaky(_status_error(502)), policy, breaker)
+    assert breaker.state == 'open'
+
+
+def test_timed_out_thread_calls_are_not_retried():
+    calls = []
+
+    def blocking_scrape():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'page'
+
+    async def scrape():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, blocking_scrape)
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.005, timeout=0.05, retry_timeouts=False)
+    breaker = CircuitBreaker('test', failure_threshold=5, reset_timeout=60)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(call_async(scrape, policy, breaker))
+
+    # One call only - a retry would start a second scrape beside the one still running
+    assert len(calls) == 1
+    assert breaker.failures == 1
+    assert FIRECRAWL_POLICY.retry_timeouts is False
+
+
+def test_cancelled_probe_frees_the_slot():
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        task = asyncio.ensure_future(call_async(hang, RetryPolicy(max_attempts=1, **FAST), breaker))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert not breaker.probing
+
+
+postgrest = pytest.importorskip('postgrest')
+supabase_client = pytest.importorskip('supabase_client')
+
+from postgrest.exceptions import APIError  # noqa: E402
+from tests.postgrest_stub import FakePostgrest  # noqa: E402
+
+
+@pytest.fixture
+def upstream():
+    get_breaker('supabase').record_success()
+    yield FakePostgrest()
+    get_breaker('supabase').record_success()
+
+
+def test_postgrest_errors_are_classified_by_code():
+    assert is_transient_http_error(APIError({'code': 'PGRST001', 'message': 'database unreachable'}))
+    assert is_transient_http_error(APIError({'code': '40001', 'message': 'serialization failure'}))
+    assert is_transient_http_error(APIError({'message': 'upstream unavailable'}))
+    assert is_transient_http_error(APIError({'code': 503, 'message': 'JSON could not be generated'}))
+    assert not is_transient_http_error(APIError({'code': '23505', 'message': 'duplicate key'}))
+    assert not is_transient_http_error(APIError({'code': '23503', 'message': 'foreign key violation'}))
+    assert not is_transient_http_error(APIError({'code': 'PGRST204', 'message': 'unknown column'}))
+
+
+def test_reads_retry_but_plain_inserts_are_sent_once(upstream):
+    client = upstream.client()
+
+    upstream.fail_next = 2
+    result = supabase_client.execute_query(client.table('amenities').select('id, name'))
+    assert result.data[0]['name'] == 'מרפסת'
+
+    upstream.fail_next = 1
+    with pytest.raises(APIError):
+        supabase_client.execute_query(client.table('rentals').insert({'facebook_id': '1001'}))
+    inserts = [r for r in upstream.requests if r.method == 'POST']
+    assert len(inserts) == 1
+
+    upstream.fail_next = 1
+    supabase_client.execute_query(
+        client.table('rentals').upsert({'id': 'r-1', 'facebook_id': '1001'}, on_conflict='id')
+    )
+    assert [r['id'] for r in upstream.rows('rentals')] == ['r-1']
+
+
+def test_async_execution_does_not_block_the_event_loop(upstream, monkeypatch):
+    client = upstream.client()
+    upstream.fail_next = 3
+    monkeypatch.setattr(resilience.random, 'uniform', lambda low, high: min(high, 0.05))
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.001)
+
+    async def run():
+        task = asyncio.ensure_future(ticker())
+        await supabase_client.execute_query_async(client.table('amenities').select('id'))
+        task.cancel()
+
+    # Three back-offs of 50ms each - the loop keeps ticking through them
+    asyncio.run(run())
+    assert len(ticks) > 20
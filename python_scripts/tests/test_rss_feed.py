@@ -0,0 +1,122 @@
+"""Tests of the streaming feed parser and the conditional Craigslist fetch"""
+
+import asyncio
+from pathlib import Path
+
+import httpx
+import pytest
+
+from rss_feed import FeedParser, FeedValidatorStore, parse_feed
+
+aggregator_module = pytest.importorskip('legitimate_rental_aggregator')
+
+FEED = (Path(__file__).parent / 'fixtures' / 'craigslist.rdf').read_bytes()
+FEED_URL = 'https://sfbay.craigslist.org/search/apa?format=rss'
+ETAG = '"cl-apa-1729266900"'
+LAST_MODIFIED = 'Fri, 18 Oct 2026 16:15:00 GMT'
+
+
+class FeedServer:
+    """MockTransport handler serving the fixture with validators, or a 304 when they match"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get('if-none-match') == ETAG:
+            return httpx.Response(304, headers={'ETag': ETAG})
+        return httpx.Response(
+            200,
+            content=FEED,
+            headers={'Content-Type': 'application/rss+xml', 'ETag': ETAG, 'Last-Modified': LAST_MODIFIED},
+        )
+
+
+@pytest.fixture
+def server():
+    return FeedServer()
+
+
+@pytest.fixture
+def aggregator(server):
+    aggregator = aggregator_module.RentalAggregator(feed_state=FeedValidatorStore(':memory:'))
+    aggregator.client = httpx.AsyncClient(transport=httpx.MockTransport(server))
+    yield aggregator
+    asyncio.run(aggregator.close())
+
+
+def _fetch(aggregator):
+    return asyncio.run(aggregator._fetch_craigslist_feed(FEED_URL, 'San Francisco', 'CA'))
+
+
+def test_chunked_parsing_matches_whole_document():
+    parser = FeedParser()
+    items = []
+    for start in range(0, len(FEED), 7):
+        items.extend(parser.feed(FEED[start:start + 7]))
+    items.extend(parser.close())
+
+    assert items == parse_feed(FEED)
+    assert [item.guid for item in items] == [
+        'https://sfbay.craigslist.org/sfc/apa/d/sunny-two-bedroom/7712345601.html',
+        'https://sfbay.craigslist.org/eby/apa/d/oakland-studio/7712345602.html',
+        'https://sfbay.craigslist.org/sfc/apa/d/wanted-room/7712345603.html',
+    ]
+
+
+def test_feed_items_become_rentals(aggregator):
+    rentals = _fetch(aggregator)
+
+    # The wanted ad has no price and is dropped
+    assert [rental.external_id for rental in rentals] == ['7712345601', '7712345602']
+    sunny, studio = rentals
+    assert sunny.title.startswith('$2950 / 2br')
+    assert sunny.price_per_month == 2950.0
+    assert sunny.bedrooms == 2
+    assert sunny.square_feet == 850
+    assert sunny.address == 'inner sunset'
+    assert (sunny.latitude, sunny.longitude) == (37.7624, -122.4662)
+    assert sunny.images == ['https://images.craigslist.org/00a0a_sunny_600x450.jpg']
+    assert sunny.description == 'Bright 2br flat & in-unit laundry. Available now.'
+    assert studio.price_per_month == 1675.0
+    assert studio.address == 'oakland lake merritt'
+    assert studio.latitude is None and studio.images == []
+
+
+def test_second_fetch_sends_validators_and_skips_a_304(aggregator, server, monkeypatch):
+    assert len(_fetch(aggregator)) == 2
+    first = server.requests[0]
+    assert 'if-none-match' not in first.headers and 'if-modified-since' not in first.headers
+
+    # The fetch logs and swallows errors, so record any parser use instead of raising
+    parsers = []
+    monkeypatch.setattr(aggregator_module, 'FeedParser', lambda: parsers.append(1))
+    assert _fetch(aggregator) == []
+    assert parsers == []
+
+    second = server.requests[1]
+    assert second.headers['if-none-match'] == ETAG
+    assert second.headers['if-modified-since'] == LAST_MODIFIED
+
+
+def test_rss2_and_atom_items_are_read_alike():
+    rss2 = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>feed</title>
+  <item><title>$1200 / 1br</title><link>https://example.test/1.html</link>
+    <guid>listing-1</guid><enclosure url="https://example.test/1.jpg" type="image/jpeg"/></item>
+</channel></rss>"""
+    atom = b"""<?xml version="1.0"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:georss="http://www.georss.org/georss">
+  <entry><title>$1200 / 1br</title><id>listing-1</id>
+    <link rel="alternate" href="https://example.test/1.html"/>
+    <link rel="enclosure" href="https://example.test/1.jpg"/>
+    <georss:point>37.5 -122.25</georss:point></entry>
+</feed>"""
+
+    [from_rss2], [from_atom] = parse_feed(rss2), parse_feed(atom)
+
+    for item in (from_rss2, from_atom):
+        assert (item.title, item.link, item.guid) == ('$1200 / 1br', 'https://example.test/1.html', 'listing-1')
+        assert item.images == ['https://example.test/1.jpg']
+    assert (from_atom.latitude, from_atom.longitude) == (37.5, -122.25)
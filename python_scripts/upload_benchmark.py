@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Offline UploadThing Stand-In and Upload Benchmark
+Fakes the image CDN, the /v6/uploadFiles presign endpoint and the presigned
+PUT target as an httpx transport, and measures UploadThingClient throughput,
+latency and memory against it without spending real quota
+"""
+
+import json
+import time
+import random
+import asyncio
+import logging
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+from resilience import get_breaker
+from uploadthing_integration import RentalImageUploader, UploadThingClient
+
+# <scratchpad>A transport (not a server) so bodies stream exactly as they would over the network, with no sockets</scratchpad>
+# AI-DEV: Latency is measured from an image's first download request to the end of its PUT
+
+ORIGIN_URL = 'https://cdn.fake'
+API_URL = 'https://api.fake'
+STORAGE_URL = 'https://storage.fake'
+
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class FakeSettings:
+    """Behaviour of the fake services"""
+    latency: float = 0.05  # seconds per request, before the response starts
+    jitter: float = 0.5  # latency varies by +/- this fraction
+    image_size: int = 200 * 1024
+    failure_rate: float = 0.0  # chance each request answers 503
+    send_length: bool = True  # whether the origin sends Content-Length
+    seed: int = 7
+
+
+@dataclass
+class FakeStats:
+    """What the fake saw"""
+    downloads: int = 0
+    presign_requests: int = 0
+    presigned_files: int = 0
+    puts: int = 0
+    bytes_received: int = 0
+    failures_injected: int = 0
+    max_in_flight: int = 0
+    first_request: Dict[str, float] = field(default_factory=dict)  # image id -> time
+    completed: Dict[str, float] = field(default_factory=dict)  # file key -> time
+
+
+class FakeUploadThingTransport(httpx.AsyncBaseTransport):
+    """
+    In-process stand-in for the image origin, the UploadThing API and storage
+
+    Origin: GET {ORIGIN_URL}/img/<id>.jpg serves image_size bytes.
+    API: POST {API_URL}/v6/uploadFiles returns one presigned URL per file.
+    Storage: PUT {STORAGE_URL}/<key> consumes the body.
+    """
+
+    def __init__(self, settings: Optional[FakeSettings] = None, image_data: Optional[bytes] = None):
+        self.settings = settings or FakeSettings()
+        self.rng = random.Random(self.settings.seed)
+        self.image_data = image_data or self.rng.randbytes(self.settings.image_size)
+        self.stats = FakeStats()
+        self.in_flight = 0
+
+    async def _delay(self):
+        jitter = self.settings.jitter
+        await asyncio.sleep(self.settings.latency * self.rng.uniform(1 - jitter, 1 + jitter))
+
+    def _fail(self) -> bool:
+        if self.rng.random() < self.settings.failure_rate:
+            self.stats.failures_injected += 1
+            return True
+        return False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.in_flight)
+        try:
+            await self._delay()
+            if request.method == 'GET' and request.url.host == httpx.URL(ORIGIN_URL).host:
+                return self._download(request)
+            if request.method == 'POST' and request.url.path == '/v6/uploadFiles':
+                return await self._presign(request)
+            if request.method == 'PUT' and request.url.host == httpx.URL(STORAGE_URL).host:
+                return await self._store(request)
+            return httpx.Response(404, request=request)
+        finally:
+            self.in_flight -= 1
+
+    def _download(self, request: httpx.Request) -> httpx.Response:
+        image_id = request.url.path.rsplit('/', 1)[-1]
+        self.stats.first_request.setdefault(image_id, time.perf_counter())
+        if self._fail():
+            return httpx.Response(503, request=request)
+        self.stats.downloads += 1
+        data = self.image_data
+
+        async def body():
+            view = memoryview(data)
+            for start in range(0, len(view), BODY_CHUNK_SIZE):
+                yield bytes(view[start:start + BODY_CHUNK_SIZE])
+
+        headers = {'content-type': 'image/jpeg'}
+        if self.settings.send_length:
+            headers['content-length'] = str(len(data))
+        return httpx.Response(200, headers=headers, content=body(), request=request)
+
+    async def _presign(self, request: httpx.Request) -> httpx.Response:
+        files = json.loads(await request.aread())['files']
+        if self._fail():
+            return httpx.Response(503, request=request)
+        self.stats.presign_requests += 1
+        self.stats.presigned_files += len(files)
+        data = []
+        for file in files:
+            key = file.get('customId') or f"{file['name']}-{self.rng.getrandbits(48):x}"
+            data.append({'key': key, 'url': f"{STORAGE_URL}/{key}"})
+        return httpx.Response(200, json={'data': data}, request=request)
+
+    async def _store(self, request: httpx.Request) -> httpx.Response:
+        received = 0
+        async for chunk in request.stream:
+            received += len(chunk)
+        if self._fail():
+            return httpx.Response(503, request=request)
+        self.stats.puts += 1
+        self.stats.bytes_received += received
+        self.stats.completed[request.url.path.lstrip('/')] = time.perf_counter()
+        return httpx.Response(200, request=request)
+
+
+@dataclass
+class BenchmarkResult:
+    mode: str
+    concurrency: int
+    images: int
+    uploaded: int
+    seconds: float
+    images_per_sec: float
+    p50_latency_ms: float
+    p99_latency_ms: float
+    peak_memory_kib: int
+    presign_requests: int
+    failures_injected: int
+    max_in_flight: int
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_benchmark(
+    images: int = 200,
+    concurrency: int = 8,
+    mode: str = 'urls',
+    images_per_rental: int = 6,
+    settings: Optional[FakeSettings] = None,
+    hash_images: bool = False
+) -> BenchmarkResult:
+    """
+    Upload `images` fake images and measure the run
+
+    Args:
+        mode: 'urls' drives upload_multiple_from_urls with one batch,
+            'rentals' drives RentalImageUploader with images_per_rental per rental
+    """
+    transport = FakeUploadThingTransport(settings)
+    client = UploadThingClient(
+        api_key='benchmark',
+        hash_images=hash_images,
+        max_concurrency=concurrency,
+        per_host_concurrency=concurrency,
+        api_base_url=API_URL,
+        transport=transport
+    )
+    # Breakers are process-wide - start every run closed
+    get_breaker('uploadthing').record_success()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        if mode == 'urls':
+            urls = [(f"{ORIGIN_URL}/img/{idx}.jpg", f"img-{idx}") for idx in range(images)]
+            uploaded = len(await client.upload_multiple_from_urls(urls))
+        elif mode == 'rentals':
+            uploader = RentalImageUploader(client)
+            rentals = {
+                f"rental-{start // images_per_rental}": [
+                    f"{ORIGIN_URL}/img/{idx}.jpg" for idx in range(start, min(start + images_per_rental, images))
+                ]
+                for start in range(0, images, images_per_rental)
+            }
+            results = await asyncio.gather(*(
+                uploader.process_rental_images(rental_id, image_urls) for rental_id, image_urls in rentals.items()
+            ))
+            uploaded = sum(len(result['images']) for result in results)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        await client.close()
+
+    # Keys are custom ids: img-<n> (urls mode) or rental-<r>_<i> (rentals mode)
+    stats = transport.stats
+    if mode == 'urls':
+        image_of_key = {f"img-{idx}": f"{idx}.jpg" for idx in range(images)}
+    else:
+        image_of_key = {
+            f"rental-{start // images_per_rental}_{idx - start}": f"{idx}.jpg"
+            for start in range(0, images, images_per_rental)
+            for idx in range(start, min(start + images_per_rental, images))
+        }
+    latencies = [
+        done - stats.first_request[image_of_key[key]]
+        for key, done in stats.completed.items()
+        if key in image_of_key and image_of_key[key] in stats.first_request
+    ]
+
+    return BenchmarkResult(
+        mode=mode,
+        concurrency=concurrency,
+        images=images,
+        uploaded=uploaded,
+        seconds=round(seconds, 3),
+        images_per_sec=round(uploaded / seconds, 1) if seconds else 0.0,
+        p50_latency_ms=round(_percentile(latencies, 50) * 1000, 1),
+        p99_latency_ms=round(_percentile(latencies, 99) * 1000, 1),
+        peak_memory_kib=peak // 1024,
+        presign_requests=stats.presign_requests,
+        failures_injected=stats.failures_injected,
+        max_in_flight=stats.max_in_flight
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    from dataclasses import asdict
+
+    parser = argparse.ArgumentParser(description="Benchmark UploadThing uploads against an offline stand-in")
+    parser.add_argument("--images", type=int, default=200, help="Images per run")
+    parser.add_argument("--concurrency", type=str, default="4,8,16,32", help="Comma-separated max_concurrency values")
+    parser.add_argument("--mode", choices=["urls", "rentals", "both"], default="both", help="Entry point to drive")
+    parser.add_argument("--images-per-rental", type=int, default=6, help="Images per rental in rentals mode")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake request")
+    parser.add_argument("--image-size", type=int, default=200 * 1024, help="Bytes per fake image")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Chance each fake request fails with 503")
+    parser.add_argument("--no-length", action="store_true", help="Origin omits Content-Length (forces spooling)")
+    parser.add_argument("--hash", action="store_true", help="Perceptual-hash images (spools every download)")
+    parser.add_argument("--json", action="store_true", help="Output JSON for API")
+
+    args = parser.parse_args()
+
+    # Injected failures are retried - keep the retry warnings out of the report
+    logging.basicConfig(level=logging.ERROR)
+
+    settings = FakeSettings(
+        latency=args.latency,
+        image_size=args.image_size,
+        failure_rate=args.failure_rate,
+        send_length=not args.no_length
+    )
+    modes = ['urls', 'rentals'] if args.mode == 'both' else [args.mode]
+
+    results = []
+    for mode in modes:
+        for concurrency in (int(value) for value in args.concurrency.split(',')):
+            result = asyncio.run(run_benchmark(
+                args.images, concurrency, mode, args.images_per_rental, settings, args.hash
+            ))
+            results.append(result)
+            if not args.json:
+                print(
+                    f"{mode:8} c={concurrency:<3} {result.uploaded}/{result.images} images "
+                    f"{result.images_per_sec:8.1f} img/s  p50 {result.p50_latency_ms:7.1f} ms  "
+                    f"p99 {result.p99_latency_ms:7.1f} ms  peak {result.peak_memory_kib} KiB  "
+                    f"presigns {result.presign_requests}"
+                )
+
+    if args.json:
+        print(json.dumps({"status": "success", "results": [asdict(result) for result in results]}))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Upload Cache
+Maps image content (SHA-256 of the bytes) and stable CDN asset ids to the
+UploadThing file they were already uploaded as, so re-scrapes skip them
+"""
+
+import os
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+# <scratchpad>Asset ids are checked before download, content hashes after download but before upload</scratchpad>
+# AI-DEV: Facebook scontent URLs carry per-load signatures (oh=, oe=, _nc_*) - only the path filename is stable
+
+DEFAULT_UPLOAD_CACHE_PATH = os.getenv('SCRAPER_UPLOAD_CACHE_PATH', 'scraper_upload_cache.db')
+
+# CDN hosts whose query string changes between loads of the same asset
+_SIGNED_CDN_SUFFIXES = ('fbcdn.net', 'cdninstagram.com')
+
+
+def _with_variant(cache_key: str, variant: Optional[str]) -> str:
+    return f"{cache_key}@{variant}" if variant else cache_key
+
+
+def asset_id(image_url: str, variant: Optional[str] = None) -> Optional[str]:
+    """
+    Stable id for the asset behind an image URL
+
+    Facebook/Instagram CDN URLs are reduced to their filename, which embeds
+    the photo id; other URLs are kept whole (minus any fragment), since their
+    query may select a different rendition. variant distinguishes processed
+    versions of the same asset (e.g. transcoding settings).
+    """
+    parts = urlsplit(image_url)
+    if not parts.netloc:
+        return None
+    host = parts.netloc.lower()
+    if host.endswith(_SIGNED_CDN_SUFFIXES) or host.startswith('scontent'):
+        filename = parts.path.rsplit('/', 1)[-1]
+        return _with_variant(f"fb:{filename}", variant) if filename else None
+    query = f"?{parts.query}" if parts.query else ''
+    return _with_variant(f"url:{host}{parts.path}{query}", variant)
+
+
+def content_key(sha256: str, variant: Optional[str] = None) -> str:
+    return _with_variant(f"sha256:{sha256}", variant)
+
+
+class UploadCache:
+    """
+    SQLite table of cache key -> uploaded file
+
+    Keys are either 'sha256:<hex>' or an asset id from asset_id(). Use
+    path=':memory:' for a throwaway cache.
+    """
+
+    def __init__(self, path: str = DEFAULT_UPLOAD_CACHE_PATH):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploaded_files (
+                    cache_key TEXT PRIMARY KEY,
+                    file_key TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    name TEXT,
+                    size INTEGER,
+                    phash TEXT,
+                    thumbnail_url TEXT,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(uploaded_files)")}
+            if 'thumbnail_url' not in columns:
+                self.conn.execute("ALTER TABLE uploaded_files ADD COLUMN thumbnail_url TEXT")
+
+    def get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """The uploaded file stored under a key, or None"""
+        if not cache_key:
+            return None
+        row = self.conn.execute(
+            "SELECT file_key, url, name, size, phash, thumbnail_url FROM uploaded_files WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def put(
+        self,
+        cache_keys: Iterable[Optional[str]],
+        file_key: str,
+        url: str,
+        name: Optional[str] = None,
+        size: Optional[int] = None,
+        phash: Optional[str] = None,
+        thumbnail_url: Optional[str] = None
+    ):
+        """Record an uploaded file under each of the given keys"""
+        now = datetime.now().isoformat()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO uploaded_files (cache_key, file_key, url, name, size, phash, thumbnail_url, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(cache_key, file_key, url, name, size, phash, thumbnail_url, now) for cache_key in cache_keys if cache_key]
+            )
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM uploaded_files").fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
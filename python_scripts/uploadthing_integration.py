@@ -4,20 +4,83 @@ UploadThing Integration for Rental Image Storage
 Uploads images to UploadThing and stores URLs in Supabase
 """
 
+import io
 import os
 import json
 import asyncio
+import time
 import logging
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+import tempfile
+import hashlib
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, List, Dict, Mapping, Optional, Tuple
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
 import httpx
 from dotenv import load_dotenv
 import base64
 
+from image_hashing import PhashIndex, SAME_IMAGE_DISTANCE, compute_phash, phash_available
+from image_transcoding import ImageTranscoder, TranscodeSettings
+from resilience import UPLOADTHING_POLICY, call_async, get_breaker, hedged
+from upload_cache import UploadCache, asset_id, content_key
+
 load_dotenv()
 
 # <scratchpad>This integrates UploadThing for image storage with our rental scraper</scratchpad>
 # AI-DEV: Uses UTApi for server-side uploads to UploadThing
+# AI-DEV: Concurrency is capped globally and per host so large batches upload at a steady rate instead of bursting
+# AI-DEV: With an UploadCache, known assets skip the download and known bytes skip the upload
+
+UPLOAD_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+UPLOADTHING_API_URL = os.getenv('UPLOADTHING_API_URL', 'https://api.uploadthing.com')
+UPLOADTHING_FILE_URL = os.getenv('UPLOADTHING_FILE_URL', 'https://utfs.io/f')
+
+# Memory per in-flight upload is about one chunk, plus the spool buffer when the length is unknown
+# and the image itself while a streamed upload is perceptual-hashed
+STREAM_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024
+STREAM_PHASH_MAX_SIZE = 4 * 1024 * 1024
+
+
+def _content_length(response: httpx.Response) -> Optional[int]:
+    """Body length from the headers, if it matches the bytes we will forward"""
+    if response.headers.get('content-encoding', 'identity') != 'identity':
+        return None
+    try:
+        return int(response.headers['content-length'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _sniff_content_type(data: bytes) -> str:
+    """Image MIME type from the leading magic bytes (JPEG when unknown)"""
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return 'image/jpeg'
+
+
+def _bytes_body(data: bytes) -> Callable[[], AsyncIterator[bytes]]:
+    """Body factory for an in-memory file"""
+    async def body() -> AsyncIterator[bytes]:
+        yield data
+    return body
+
+
+async def _spool(response: httpx.Response, digest=None) -> BinaryIO:
+    """Copy a streaming body to a temp file (kept in memory while small), updating digest if given"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+        spool.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+    return spool
 
 @dataclass
 class UploadedImage:
@@ -27,13 +90,77 @@ class UploadedImage:
     name: str
     size: int
     custom_id: Optional[str] = None
+    phash: Optional[str] = None
+    source_url: Optional[str] = None
+    cached: bool = False  # served from the UploadCache, nothing was uploaded
+    thumbnail_url: Optional[str] = None
+
+@dataclass
+class UploadProgress:
+    """Running totals for a batch upload"""
+    total: int
+    succeeded: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    
+    @property
+    def completed(self) -> int:
+        return self.succeeded + self.failed
+    
+    @property
+    def rate(self) -> float:
+        """Completed images per second"""
+        elapsed = time.monotonic() - self.started_at
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+@dataclass
+class PreparedUpload:
+    """A file ready to be presigned and PUT"""
+    body: Callable[[], AsyncIterator[bytes]]  # fresh chunk iterator per attempt
+    size: int
+    filename: str
+    content_type: str = 'image/jpeg'
+    custom_id: Optional[str] = None
+    phash: Optional[str] = None
+    source_url: Optional[str] = None
+    sha256: Optional[str] = None
+    variant: Optional[str] = None  # processing applied before upload, part of the cache key
+    thumbnail: Optional['PreparedUpload'] = None  # uploaded alongside, in the same presign request
+    cleanup: Optional[Callable[[], Awaitable[None]]] = None
 
 class UploadThingClient:
     """
     Client for uploading images to UploadThing
     """
     
-    def __init__(self, token: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        api_key: Optional[str] = None,
+        hedge_after: Optional[float] = None,
+        hash_images: bool = True,
+        max_concurrency: int = 8,
+        per_host_concurrency: int = 4,
+        presign_batch_size: Optional[int] = None,
+        upload_cache: Optional[UploadCache] = None,
+        api_base_url: str = UPLOADTHING_API_URL,
+        file_base_url: str = UPLOADTHING_FILE_URL,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            token: UploadThing token (defaults to UPLOADTHING_TOKEN)
+            api_key: UploadThing secret (defaults to UPLOADTHING_SECRET)
+            hedge_after: Seconds before a slow image download is duplicated (None disables hedging)
+            hash_images: Perceptual-hash downloaded images (needs Pillow and numpy)
+            max_concurrency: Images downloaded/uploaded at once, across all batches
+            per_host_concurrency: Requests in flight to any single host (CDN, UploadThing, storage)
+            presign_batch_size: Files per presigned-URL request (defaults to max_concurrency)
+            upload_cache: Content-addressed cache of files already uploaded
+            api_base_url: UploadThing API root (override for a local stand-in)
+            file_base_url: Prefix of the public URLs of uploaded files
+            transport: httpx transport for all requests (e.g. the offline fake in upload_benchmark)
+        """
         self.token = token or os.getenv("UPLOADTHING_TOKEN")
         self.api_key = api_key or os.getenv("UPLOADTHING_SECRET")
         
@@ -41,7 +168,28 @@ class UploadThingClient:
             raise ValueError("UPLOADTHING_TOKEN or UPLOADTHING_SECRET environment variable is required")
         
         self.logger = logging.getLogger(__name__)
-        self.client = httpx.AsyncClient()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency * 2,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=30.0
+            ),
+            timeout=UPLOAD_TIMEOUT,
+            transport=transport
+        )
+        self.api_base_url = api_base_url.rstrip('/')
+        self.file_base_url = file_base_url.rstrip('/')
+        self.per_host_concurrency = per_host_concurrency
+        self.presign_batch_size = min(presign_batch_size or max_concurrency, max_concurrency)
+        self._upload_slots = asyncio.Semaphore(max_concurrency)
+        self._group_lock = asyncio.Lock()
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.hedge_after = hedge_after
+        self.hash_images = hash_images and phash_available()
+        if hash_images and not self.hash_images:
+            self.logger.warning("Pillow/numpy not installed, image perceptual hashing disabled")
+        self.breaker = get_breaker('uploadthing')
+        self.upload_cache = upload_cache
         
         # Extract app ID and region from token if available
         if self.token:
@@ -71,31 +219,258 @@ class UploadThingClient:
         Returns:
             UploadedImage object if successful, None otherwise
         """
+        results = await self.upload_batch_from_urls([(image_url, custom_id)])
+        return results[0]
+    
+    async def upload_batch_from_urls(
+        self,
+        image_urls: List[Tuple[str, Optional[str]]],
+        transcoder: Optional[ImageTranscoder] = None,
+        prefetched: Optional[Mapping[str, bytes]] = None
+    ) -> List[Optional[UploadedImage]]:
+        """
+        Upload a group of images with a single presigned-URL request
+        
+        Downloads are started (or spooled) in parallel, all files are
+        presigned in one round trip, then the PUTs run in parallel.
+        
+        Args:
+            image_urls: List of tuples (url, custom_id)
+            transcoder: Resize/re-encode images (and add thumbnails) before upload
+            prefetched: Image bytes already fetched, by URL - these are not downloaded again
+        
+        Returns:
+            One result per input, None for failures
+        """
+        if len(image_urls) > self.presign_batch_size:
+            # A group can never hold more slots than exist
+            groups = await asyncio.gather(*(
+                self.upload_batch_from_urls(image_urls[start:start + self.presign_batch_size], transcoder, prefetched)
+                for start in range(0, len(image_urls), self.presign_batch_size)
+            ))
+            return [result for results in groups for result in results]
+        
+        # Assets uploaded before need no download at all
+        variant = transcoder.settings.tag if transcoder else None
+        results: List[Optional[UploadedImage]] = [
+            self._from_cache(asset_id(url, variant), custom_id, url) for url, custom_id in image_urls
+        ]
+        misses = [(idx, url, custom_id) for idx, (url, custom_id) in enumerate(image_urls) if results[idx] is None]
+        if not misses:
+            return results
+        
+        # Take every slot for the group up front - a group waits for all its
+        # files before presigning, so a partial group must never hold slots
+        async with self._group_lock:
+            for _ in misses:
+                await self._upload_slots.acquire()
         try:
-            # First, download the image
-            response = await self.client.get(image_url)
-            response.raise_for_status()
-            
-            image_data = response.content
-            content_type = response.headers.get('content-type', 'image/jpeg')
-            
-            # Extract filename from URL or generate one
-            filename = image_url.split('/')[-1].split('?')[0]
-            if not filename or '.' not in filename:
-                extension = content_type.split('/')[-1]
-                filename = f"rental_image_{custom_id or 'unknown'}.{extension}"
-            
-            # Upload to UploadThing using their API
-            return await self.upload_file(
-                file_data=image_data,
-                filename=filename,
-                content_type=content_type,
-                custom_id=custom_id
+            prepared = await asyncio.gather(
+                *(
+                    self._prepare_prefetched(url, prefetched[url], custom_id, transcoder)
+                    if prefetched and url in prefetched
+                    else self._prepare_from_url(url, custom_id, transcoder)
+                    for _, url, custom_id in misses
+                ),
+                return_exceptions=True
             )
+            ready = []
+            for (idx, url, _), item in zip(misses, prepared):
+                if isinstance(item, Exception):
+                    self.logger.error(f"Error uploading image from URL {url}: {item}")
+                else:
+                    ready.append((idx, item))
             
-        except Exception as e:
-            self.logger.error(f"Error uploading image from URL {image_url}: {e}")
-            return None
+            uploaded = await self.upload_prepared([item for _, item in ready])
+            for (idx, _), result in zip(ready, uploaded):
+                results[idx] = result
+            return results
+        finally:
+            for _ in misses:
+                self._upload_slots.release()
+    
+    async def _prepare_from_url(
+        self, image_url: str, custom_id: Optional[str], transcoder: Optional[ImageTranscoder] = None
+    ) -> PreparedUpload:
+        """
+        Start a download and work out its size, spooling it when that is unknown
+        
+        A known-length download is piped straight into the presigned PUT, with
+        its SHA-256 and pHash computed from the chunks on the way through. Such
+        uploads are recorded in the UploadCache under their content hash, but
+        cannot be matched against it before uploading, as spooled ones are.
+        """
+        async with self._host_slot(image_url):
+            # Headers only - the body is streamed later
+            response = await self._open_image(image_url)
+            try:
+                content_type = response.headers.get('content-type', 'image/jpeg')
+                filename = self._filename(image_url, content_type, custom_id)
+                size = _content_length(response)
+                
+                digest = hashlib.sha256() if self.upload_cache is not None else None
+                stream_through = (
+                    size is not None and transcoder is None
+                    and not (self.hash_images and size > STREAM_PHASH_MAX_SIZE)
+                )
+                if not stream_through:
+                    # Unknown length, or bytes needed whole for transcoding - spool to a temp file
+                    spool = await _spool(response, digest)
+            except BaseException:
+                await response.aclose()
+                raise
+        
+        if stream_through:
+            return self._prepare_stream(response, image_url, size, filename, content_type, custom_id)
+        
+        await response.aclose()
+        sha256 = digest.hexdigest() if digest is not None else None
+        return await self._prepare_spooled(spool, image_url, filename, content_type, custom_id, sha256, transcoder)
+    
+    def _prepare_stream(
+        self,
+        response: httpx.Response,
+        image_url: str,
+        size: int,
+        filename: str,
+        content_type: str,
+        custom_id: Optional[str]
+    ) -> PreparedUpload:
+        """
+        Pipe an open download into the PUT, hashing the chunks as they pass
+        
+        The source host's slot is held while the body streams, not between
+        opening the download and the PUT - the group's other files are still
+        being prepared then, and holding it would deadlock a group with more
+        files from one host than per_host_concurrency.
+        """
+        first_response = response
+        
+        async def body() -> AsyncIterator[bytes]:
+            nonlocal first_response
+            async with self._host_slot(image_url):
+                # A retried PUT re-opens the download, since the first stream is consumed
+                source = first_response or await self._open_image(image_url)
+                first_response = None
+                digest = hashlib.sha256() if self.upload_cache is not None else None
+                buffer = bytearray() if self.hash_images else None
+                try:
+                    async for chunk in source.aiter_raw(STREAM_CHUNK_SIZE):
+                        if digest is not None:
+                            digest.update(chunk)
+                        if buffer is not None:
+                            buffer += chunk
+                        yield chunk
+                finally:
+                    await source.aclose()
+            
+            # The whole image went through - record its hashes for _put and the cache
+            if digest is not None:
+                prepared.sha256 = digest.hexdigest()
+            if buffer is not None:
+                prepared.phash = await asyncio.to_thread(compute_phash, bytes(buffer))
+        
+        prepared = PreparedUpload(body, size, filename, content_type, custom_id, source_url=image_url, cleanup=response.aclose)
+        return prepared
+    
+    async def _prepare_prefetched(
+        self,
+        image_url: str,
+        data: bytes,
+        custom_id: Optional[str],
+        transcoder: Optional[ImageTranscoder] = None
+    ) -> PreparedUpload:
+        """Prepare bytes that were already fetched (e.g. captured from the browser) - no download"""
+        content_type = _sniff_content_type(data)
+        filename = self._filename(image_url, content_type, custom_id)
+        sha256 = hashlib.sha256(data).hexdigest() if self.upload_cache is not None else None
+        return await self._prepare_spooled(io.BytesIO(data), image_url, filename, content_type, custom_id, sha256, transcoder)
+    
+    async def _prepare_spooled(
+        self,
+        spool: BinaryIO,
+        image_url: str,
+        filename: str,
+        content_type: str,
+        custom_id: Optional[str],
+        sha256: Optional[str],
+        transcoder: Optional[ImageTranscoder]
+    ) -> PreparedUpload:
+        """Hash and optionally transcode a fully buffered image"""
+        size = spool.seek(0, os.SEEK_END)
+        
+        # Hash the pixels off the event loop, reading from the spool
+        phash = await asyncio.to_thread(compute_phash, spool) if self.hash_images else None
+        variant = transcoder.settings.tag if transcoder else None
+        
+        # Skip the CPU work when these bytes were already transcoded and uploaded
+        if transcoder is not None and not (sha256 and self._from_cache(content_key(sha256, variant), None, None)):
+            spool.seek(0)
+            transcoded = await transcoder.transcode(spool.read())
+            if transcoded is not None:
+                spool.close()
+                stem = filename.rsplit('.', 1)[0]
+                extension = transcoder.settings.extension
+                content_type = transcoder.settings.content_type
+                thumbnail = PreparedUpload(
+                    _bytes_body(transcoded.thumbnail), len(transcoded.thumbnail), f"{stem}_thumb.{extension}",
+                    content_type, f"{custom_id}_thumb" if custom_id else None
+                )
+                return PreparedUpload(
+                    _bytes_body(transcoded.data), len(transcoded.data), f"{stem}.{extension}", content_type, custom_id,
+                    phash=phash, source_url=image_url, sha256=sha256,
+                    variant=variant, thumbnail=thumbnail
+                )
+            self.logger.warning(f"Could not transcode {image_url}, uploading the original")
+        
+        async def spooled_body() -> AsyncIterator[bytes]:
+            spool.seek(0)
+            while chunk := spool.read(STREAM_CHUNK_SIZE):
+                yield chunk
+        
+        async def close_spool():
+            spool.close()
+        
+        return PreparedUpload(
+            spooled_body, size, filename, content_type, custom_id,
+            phash=phash, source_url=image_url, cleanup=close_spool, sha256=sha256, variant=variant
+        )
+    
+    @staticmethod
+    def _filename(image_url: str, content_type: str, custom_id: Optional[str]) -> str:
+        """Extract filename from URL or generate one"""
+        filename = image_url.split('/')[-1].split('?')[0]
+        if not filename or '.' not in filename:
+            extension = content_type.split('/')[-1].split(';')[0]
+            filename = f"rental_image_{custom_id or 'unknown'}.{extension}"
+        return filename
+    
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        """Semaphore limiting concurrent requests to the URL's host"""
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_slots[host]
+    
+    async def _open_image(self, image_url: str) -> httpx.Response:
+        """
+        Start a streaming GET for an image with retries, hedging slow starts when enabled
+        
+        The caller must aclose() the returned response.
+        """
+        async def open_stream() -> httpx.Response:
+            response = await self.client.send(self.client.build_request('GET', image_url), stream=True)
+            if response.is_error:
+                await response.aclose()
+                response.raise_for_status()
+            return response
+        
+        if self.hedge_after:
+            # Downloads are idempotent, so a duplicate request is safe
+            attempt = lambda: hedged(open_stream, self.hedge_after)
+        else:
+            attempt = open_stream
+        return await call_async(attempt, UPLOADTHING_POLICY, description=f"Download {image_url}")
     
     async def upload_file(
         self, 
@@ -109,94 +484,241 @@ class UploadThingClient:
         
         This simulates what the UTApi.uploadFiles method does server-side
         """
-        try:
-            # Step 1: Request presigned URL from UploadThing
-            presigned_request = {
-                "files": [{
-                    "name": filename,
-                    "size": len(file_data),
-                    "type": content_type,
-                    "customId": custom_id
-                }]
-            }
-            
-            headers = {
-                "x-uploadthing-api-key": self.api_key,
-                "content-type": "application/json"
-            }
-            
-            # Get presigned URL
-            presigned_response = await self.client.post(
-                f"https://api.uploadthing.com/v6/uploadFiles",
-                json=presigned_request,
-                headers=headers
-            )
-            presigned_response.raise_for_status()
-            presigned_data = presigned_response.json()
-            
-            if not presigned_data.get("data") or len(presigned_data["data"]) == 0:
-                self.logger.error("No presigned URL received")
-                return None
-            
-            upload_info = presigned_data["data"][0]
-            presigned_url = upload_info.get("url")
-            file_key = upload_info.get("key")
-            
-            # Step 2: Upload file to presigned URL
-            upload_response = await self.client.put(
-                presigned_url,
-                content=file_data,
-                headers={"Content-Type": content_type}
-            )
-            upload_response.raise_for_status()
-            
-            # Step 3: Confirm upload completion
-            # UploadThing will process the file and make it available
-            
-            # Construct the public URL
-            public_url = f"https://utfs.io/f/{file_key}"
-            
-            return UploadedImage(
-                url=public_url,
-                key=file_key,
-                name=filename,
-                size=len(file_data),
-                custom_id=custom_id
+        results = await self.upload_files_batch([(file_data, filename, content_type, custom_id)])
+        return results[0]
+    
+    async def upload_files_batch(
+        self,
+        files: List[Tuple[bytes, str, str, Optional[str]]]
+    ) -> List[Optional[UploadedImage]]:
+        """
+        Upload in-memory files with one presigned-URL request and parallel PUTs
+        
+        Args:
+            files: List of tuples (file_data, filename, content_type, custom_id)
+        
+        Returns:
+            One result per input, None for failures
+        """
+        return await self.upload_prepared([
+            PreparedUpload(
+                _bytes_body(data), len(data), filename, content_type, custom_id,
+                sha256=hashlib.sha256(data).hexdigest() if self.upload_cache is not None else None
             )
-            
-        except Exception as e:
-            self.logger.error(f"Error uploading file {filename}: {e}")
+            for data, filename, content_type, custom_id in files
+        ])
+    
+    async def upload_stream(
+        self,
+        body: Callable[[], AsyncIterator[bytes]],
+        size: int,
+        filename: str,
+        content_type: str = 'image/jpeg',
+        custom_id: Optional[str] = None
+    ) -> Optional[UploadedImage]:
+        """
+        Upload a file of known size from a chunk stream
+        
+        Args:
+            body: Factory returning a fresh chunk iterator per attempt (retries call it again)
+            size: Exact byte length, sent as Content-Length
+        """
+        results = await self.upload_prepared([PreparedUpload(body, size, filename, content_type, custom_id)])
+        return results[0]
+    
+    async def _presign(self, uploads: List[PreparedUpload]) -> List[Dict]:
+        """Request presigned URLs for several files in one round trip"""
+        presigned_request = {
+            "files": [
+                {
+                    "name": upload.filename,
+                    "size": upload.size,
+                    "type": upload.content_type,
+                    "customId": upload.custom_id
+                }
+                for upload in uploads
+            ]
+        }
+        
+        headers = {
+            "x-uploadthing-api-key": self.api_key,
+            "content-type": "application/json"
+        }
+        
+        async def request_presigned() -> httpx.Response:
+            url = f"{self.api_base_url}/v6/uploadFiles"
+            async with self._host_slot(url):
+                response = await self.client.post(url, json=presigned_request, headers=headers)
+            response.raise_for_status()
+            return response
+        
+        presigned_response = await call_async(
+            request_presigned, UPLOADTHING_POLICY, self.breaker, f"Presign {len(uploads)} files"
+        )
+        data = presigned_response.json().get("data") or []
+        if len(data) != len(uploads):
+            raise ValueError(f"Expected {len(uploads)} presigned URLs, received {len(data)}")
+        return data
+    
+    async def _put(self, upload: PreparedUpload, upload_info: Dict) -> UploadedImage:
+        """Stream one file to its presigned URL"""
+        presigned_url = upload_info.get("url")
+        file_key = upload_info.get("key")
+        
+        async def put_file() -> httpx.Response:
+            async with self._host_slot(presigned_url):
+                response = await self.client.put(
+                    presigned_url,
+                    content=upload.body(),
+                    headers={"Content-Type": upload.content_type, "Content-Length": str(upload.size)}
+                )
+            response.raise_for_status()
+            return response
+        
+        await call_async(put_file, UPLOADTHING_POLICY, self.breaker, f"Upload {upload.filename}")
+        
+        # UploadThing will process the file and make it available
+        return UploadedImage(
+            url=f"{self.file_base_url}/{file_key}",
+            key=file_key,
+            name=upload.filename,
+            size=upload.size,
+            custom_id=upload.custom_id,
+            phash=upload.phash,
+            source_url=upload.source_url
+        )
+    
+    async def upload_prepared(self, uploads: List[PreparedUpload]) -> List[Optional[UploadedImage]]:
+        """
+        Presign files in batches of presign_batch_size, then PUT them in parallel
+        
+        Returns:
+            One result per input, None for failures
+        """
+        # Bytes uploaded before (under any URL) are not uploaded again
+        results: List[Optional[UploadedImage]] = [
+            self._from_cache(content_key(upload.sha256, upload.variant), upload.custom_id, upload.source_url)
+            if upload.sha256 else None
+            for upload in uploads
+        ]
+        for upload, result in zip(uploads, results):
+            if result is not None:
+                # Same bytes under a new URL - remember the URL too
+                self._remember(upload, result)
+        pending = [idx for idx, result in enumerate(results) if result is None]
+        try:
+            for start in range(0, len(pending), self.presign_batch_size):
+                positions = pending[start:start + self.presign_batch_size]
+                batch = [uploads[idx] for idx in positions]
+                # Thumbnails share the batch's presign request
+                files = batch + [upload.thumbnail for upload in batch if upload.thumbnail]
+                try:
+                    presigned = await self._presign(files)
+                except Exception as e:
+                    self.logger.error(f"Error requesting presigned URLs for {len(files)} files: {e}")
+                    continue
+                
+                puts = await asyncio.gather(
+                    *(self._put(upload, info) for upload, info in zip(files, presigned)),
+                    return_exceptions=True
+                )
+                thumbnails = iter(puts[len(batch):])
+                for idx, upload, result in zip(positions, batch, puts):
+                    thumbnail = next(thumbnails) if upload.thumbnail else None
+                    if isinstance(result, Exception):
+                        self.logger.error(f"Error uploading file {upload.filename}: {result}")
+                        continue
+                    if isinstance(thumbnail, Exception):
+                        self.logger.warning(f"Error uploading thumbnail for {upload.filename}: {thumbnail}")
+                    elif thumbnail is not None:
+                        result.thumbnail_url = thumbnail.url
+                    results[idx] = result
+                    self._remember(upload, result)
+        finally:
+            for upload in uploads:
+                if upload.cleanup:
+                    await upload.cleanup()
+        return results
+    
+    def _from_cache(
+        self, cache_key: Optional[str], custom_id: Optional[str], source_url: Optional[str]
+    ) -> Optional[UploadedImage]:
+        """An UploadedImage for a previously uploaded file, or None on a miss"""
+        if self.upload_cache is None:
+            return None
+        entry = self.upload_cache.get(cache_key)
+        if entry is None:
             return None
+        return UploadedImage(
+            url=entry['url'],
+            key=entry['file_key'],
+            name=entry['name'],
+            size=entry['size'],
+            custom_id=custom_id,
+            phash=entry['phash'],
+            source_url=source_url,
+            cached=True,
+            thumbnail_url=entry['thumbnail_url']
+        )
+    
+    def _remember(self, upload: PreparedUpload, uploaded: UploadedImage):
+        """Record a finished upload under its content hash and asset id"""
+        if self.upload_cache is None:
+            return
+        self.upload_cache.put(
+            [content_key(upload.sha256, upload.variant) if upload.sha256 else None,
+             asset_id(upload.source_url, upload.variant) if upload.source_url else None],
+            uploaded.key, uploaded.url, uploaded.name, uploaded.size, uploaded.phash, uploaded.thumbnail_url
+        )
     
     async def upload_multiple_from_urls(
         self, 
-        image_urls: List[Tuple[str, Optional[str]]]
+        image_urls: List[Tuple[str, Optional[str]]],
+        on_progress: Optional[Callable[[UploadProgress], None]] = None,
+        transcoder: Optional[ImageTranscoder] = None,
+        prefetched: Optional[Mapping[str, bytes]] = None
     ) -> List[UploadedImage]:
         """
-        Upload multiple images from URLs concurrently
+        Upload multiple images from URLs with bounded concurrency
+        
+        Images go up in groups of presign_batch_size, each group costing a
+        single presign round trip; transient failures are retried inside
+        each upload.
         
         Args:
             image_urls: List of tuples (url, custom_id)
+            on_progress: Called with the running UploadProgress after each group
+            transcoder: Resize/re-encode images (and add thumbnails) before upload
+            prefetched: Image bytes already fetched, by URL - these are not downloaded again
         
         Returns:
-            List of successfully uploaded images
+            List of successfully uploaded images, in input order
         """
-        tasks = [
-            self.upload_from_url(url, custom_id) 
-            for url, custom_id in image_urls
+        progress = UploadProgress(total=len(image_urls))
+        groups = [
+            image_urls[start:start + self.presign_batch_size]
+            for start in range(0, len(image_urls), self.presign_batch_size)
         ]
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Filter out None values and exceptions
-        uploaded_images = []
-        for result in results:
-            if isinstance(result, UploadedImage):
-                uploaded_images.append(result)
-            elif isinstance(result, Exception):
-                self.logger.error(f"Upload error: {result}")
+        async def upload_group(group: List[Tuple[str, Optional[str]]]) -> List[Optional[UploadedImage]]:
+            try:
+                results = await self.upload_batch_from_urls(group, transcoder, prefetched)
+            except Exception as e:
+                self.logger.error(f"Upload error: {e}")
+                results = [None] * len(group)
+            
+            progress.succeeded += sum(1 for result in results if result)
+            progress.failed += sum(1 for result in results if not result)
+            if on_progress:
+                on_progress(progress)
+            self.logger.info(
+                f"Uploaded {progress.succeeded}/{progress.total} images "
+                f"({progress.failed} failed, {progress.rate:.1f}/s)"
+            )
+            return results
         
-        return uploaded_images
+        group_results = await asyncio.gather(*(upload_group(group) for group in groups))
+        return [result for results in group_results for result in results if result is not None]
     
     async def close(self):
         """Close the HTTP client"""
@@ -208,14 +730,56 @@ class RentalImageUploader:
     Handles uploading rental images and updating Supabase
     """
     
-    def __init__(self, uploadthing_client: UploadThingClient):
+    def __init__(
+        self,
+        uploadthing_client: UploadThingClient,
+        phash_index: Optional[PhashIndex] = None,
+        transcoder: Optional[ImageTranscoder] = None
+    ):
+        """
+        Args:
+            uploadthing_client: Client used for the uploads
+            phash_index: Index of known image hashes (e.g. loaded with
+                iter_rental_image_hashes) - new images are matched against it
+            transcoder: Resizes and re-encodes images, with a thumbnail each,
+                before upload (None uploads originals)
+        """
         self.uploadthing = uploadthing_client
+        self.phash_index = phash_index
+        self.transcoder = transcoder
         self.logger = logging.getLogger(__name__)
     
+    def find_duplicate_images(self, rental_id: str, uploaded_images: List[UploadedImage]) -> Dict[str, List[Tuple[int, str]]]:
+        """
+        Match uploaded images against the hash index, then index them
+        
+        Returns:
+            Mapping of image URL to (distance, rental_id) matches from other rentals
+        """
+        matches = {}
+        if self.phash_index is None:
+            return matches
+        
+        for img in uploaded_images:
+            if not img.phash:
+                continue
+            found = [(d, other) for d, other in self.phash_index.search(img.phash) if other != rental_id]
+            if found:
+                matches[img.url] = found
+        for img in uploaded_images:
+            if img.phash:
+                self.phash_index.add(img.phash, rental_id)
+        
+        if matches:
+            same = sum(1 for found in matches.values() if found[0][0] <= SAME_IMAGE_DISTANCE)
+            self.logger.info(f"Rental {rental_id}: {len(matches)} images match other rentals ({same} identical)")
+        return matches
+    
     async def process_rental_images(
         self, 
         rental_id: str,
-        image_urls: List[str]
+        image_urls: List[str],
+        prefetched: Optional[Mapping[str, bytes]] = None
     ) -> Dict[str, List[UploadedImage]]:
         """
         Upload rental images to UploadThing and prepare for Supabase
@@ -223,6 +787,8 @@ class RentalImageUploader:
         Args:
             rental_id: The rental's ID
             image_urls: List of image URLs to upload
+            prefetched: Bytes of images the scraper already has (e.g. captured
+                from the browser session), keyed by URL
         
         Returns:
             Dictionary with uploaded images ready for Supabase insertion
@@ -233,14 +799,20 @@ class RentalImageUploader:
             for idx, url in enumerate(image_urls)
         ]
         
-        # Upload all images
-        uploaded = await self.uploadthing.upload_multiple_from_urls(urls_with_ids)
+        # Upload all images (previously uploaded ones come back from the cache)
+        uploaded = await self.uploadthing.upload_multiple_from_urls(
+            urls_with_ids, transcoder=self.transcoder, prefetched=prefetched
+        )
+        cached = sum(1 for img in uploaded if img.cached)
         
-        self.logger.info(f"Uploaded {len(uploaded)}/{len(image_urls)} images for rental {rental_id}")
+        self.logger.info(
+            f"Uploaded {len(uploaded)}/{len(image_urls)} images for rental {rental_id} ({cached} from cache)"
+        )
         
         return {
             "rental_id": rental_id,
-            "images": uploaded
+            "images": uploaded,
+            "duplicate_images": self.find_duplicate_images(rental_id, uploaded)
         }
     
     def prepare_for_supabase(self, rental_id: str, uploaded_images: List[UploadedImage]) -> List[Dict]:
@@ -255,7 +827,9 @@ class RentalImageUploader:
                 "rental_id": rental_id,
                 "image_url": img.url,
                 "image_order": idx,
-                "is_primary": idx == 0
+                "is_primary": idx == 0,
+                **({"phash": img.phash} if img.phash else {}),
+                **({"thumbnail_url": img.thumbnail_url} if img.thumbnail_url else {})
             }
             for idx, img in enumerate(uploaded_images)
         ]
@@ -302,6 +876,7 @@ if __name__ == "__main__":
     parser.add_argument("--rental-id", type=str, help="Rental ID to process images for")
     parser.add_argument("--demo", action="store_true", help="Run demo upload")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    parser.add_argument("--transcode", choices=["webp", "avif"], help="Resize and re-encode images, with thumbnails")
     
     args = parser.parse_args()
     
@@ -321,8 +896,9 @@ if __name__ == "__main__":
     elif args.rental_id:
         # Process specific rental
         async def process_rental():
-            client = UploadThingClient()
-            uploader = RentalImageUploader(client)
+            client = UploadThingClient(upload_cache=UploadCache())
+            transcoder = ImageTranscoder(TranscodeSettings(format=args.transcode.upper())) if args.transcode else None
+            uploader = RentalImageUploader(client, transcoder=transcoder)
             
             # In a real implementation, fetch image URLs from database
             # For now, use demo URLs
@@ -333,12 +909,15 @@ if __name__ == "__main__":
             
             result = await uploader.process_rental_images(args.rental_id, image_urls)
             await client.close()
+            if transcoder:
+                transcoder.close()
             
             if args.json:
                 print(json.dumps({
                     "success": True,
                     "rental_id": args.rental_id,
-                    "images_uploaded": len(result["images"])
+                    "images_uploaded": len(result["images"]),
+                    "images_cached": sum(1 for img in result["images"] if img.cached)
                 }))
             else:
                 print(f"Uploaded {len(result['images'])} images for rental {args.rental_id}")
@@ -0,0 +1,75 @@
+import { NextResponse } from 'next/server';
+import { supabase } from '@/lib/supabase';
+
+// Rentals counterpart of merge-duplicates, fed by python_scripts/duplicate_clustering.py
+export async function POST(request: Request) {
+  try {
+    const { keepRentalId, mergeRentalIds } = await request.json();
+
+    if (!keepRentalId || !mergeRentalIds || mergeRentalIds.length === 0) {
+      return NextResponse.json({ error: 'Missing required fields' }, { status: 400 });
+    }
+
+    const duplicateIds: string[] = mergeRentalIds.filter((rentalId: string) => rentalId !== keepRentalId);
+
+    // 1. Merge each duplicate into the master (records rental_merge_history)
+    for (const rentalId of duplicateIds) {
+      const { error } = await supabase.rpc('merge_rental_data', {
+        master_id: keepRentalId,
+        duplicate_id: rentalId,
+        merge_fields: {},
+      });
+      if (error) {
+        console.error('Merge error:', error);
+        return NextResponse.json({ error: 'Failed to merge rentals' }, { status: 500 });
+      }
+    }
+
+    const { error: masterError } = await supabase
+      .from('rentals')
+      .update({ duplicate_status: 'master', duplicate_score: null, master_rental_id: null })
+      .eq('id', keepRentalId);
+
+    if (masterError) {
+      return NextResponse.json({ error: 'Failed to update master rental' }, { status: 500 });
+    }
+
+    // 2. Copy images the master does not already have
+    const { data: allImages } = await supabase
+      .from('rental_images')
+      .select('rental_id, image_url, image_order')
+      .in('rental_id', [keepRentalId, ...duplicateIds]);
+
+    if (allImages && allImages.length > 0) {
+      const keepImages = allImages.filter((img) => img.rental_id === keepRentalId);
+      const imageUrls = new Set(keepImages.map((img) => img.image_url));
+      const newImages = allImages.filter(
+        (img) => img.rental_id !== keepRentalId && !imageUrls.has(img.image_url)
+      );
+
+      if (newImages.length > 0) {
+        const { error } = await supabase.from('rental_images').insert(
+          newImages.map((img, index) => ({
+            rental_id: keepRentalId,
+            image_url: img.image_url,
+            image_order: keepImages.length + index + 1,
+            is_primary: false,
+          }))
+        );
+        if (error) {
+          console.error('Image merge error:', error);
+          return NextResponse.json({ error: 'Failed to merge rental images' }, { status: 500 });
+        }
+      }
+    }
+
+    return NextResponse.json({
+      success: true,
+      masterId: keepRentalId,
+      mergedCount: duplicateIds.length,
+    });
+  } catch (error) {
+    console.error('Error in merge-rental-duplicates API:', error);
+    return NextResponse.json({ error: 'Internal server error' }, { status: 500 });
+  }
+}
@@ -0,0 +1,75 @@
+import { NextResponse } from 'next/server';
+import { supabase } from '@/lib/supabase';
+
+// Rentals counterpart of resolve-duplicate, fed by python_scripts/duplicate_clustering.py
+export async function POST(request: Request) {
+  try {
+    const { rentalId, decision, masterRentalId, score } = await request.json();
+
+    if (!rentalId || !decision) {
+      return NextResponse.json({ error: 'Missing required fields' }, { status: 400 });
+    }
+
+    if (!['unique', 'duplicate', 'keep_review'].includes(decision)) {
+      return NextResponse.json({ error: 'Invalid decision' }, { status: 400 });
+    }
+
+    if (decision === 'duplicate' && !masterRentalId) {
+      return NextResponse.json({ error: 'masterRentalId is required' }, { status: 400 });
+    }
+
+    let updateData: any = {};
+
+    if (decision === 'unique') {
+      updateData = {
+        duplicate_status: 'unique',
+        master_rental_id: null,
+        duplicate_score: null,
+      };
+    } else if (decision === 'duplicate') {
+      updateData = {
+        duplicate_status: 'duplicate',
+        master_rental_id: masterRentalId,
+        duplicate_score: 90, // High confidence since manually confirmed
+      };
+    } else {
+      // Queue for review against the proposed master
+      updateData = {
+        duplicate_status: 'review',
+        ...(masterRentalId ? { master_rental_id: masterRentalId } : {}),
+        ...(score != null ? { duplicate_score: score } : {}),
+      };
+    }
+
+    const { data, error } = await supabase
+      .from('rentals')
+      .update(updateData)
+      .eq('id', rentalId)
+      .select()
+      .single();
+
+    if (error) {
+      return NextResponse.json({ error: error.message }, { status: 500 });
+    }
+
+    if (decision === 'duplicate') {
+      await supabase.from('rentals').update({ duplicate_status: 'master' }).eq('id', masterRentalId);
+    }
+
+    return NextResponse.json({
+      success: true,
+      rental: data,
+      message:
+        decision === 'duplicate'
+          ? 'דירה סומנה ככפולה'
+          : decision === 'unique'
+            ? 'דירה סומנה כייחודית'
+            : 'דירה נשארה לבדיקה',
+    });
+  } catch (error) {
+    return NextResponse.json(
+      { error: error instanceof Error ? error.message : 'Unknown error' },
+      { status: 500 }
+    );
+  }
+}
@@ -0,0 +1,4 @@
+-- Add thumbnail_url column to rental_images table
+-- Filled by the Python uploader when images are transcoded before upload
+ALTER TABLE rental_images
+ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
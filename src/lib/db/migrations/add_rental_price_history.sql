@@ -0,0 +1,12 @@
+-- Price changes of scraped rentals
+-- price_history is keyed by properties; the Python scrapers write rentals, so they log here
+CREATE TABLE IF NOT EXISTS rental_price_history (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    rental_id UUID NOT NULL REFERENCES rentals(id) ON DELETE CASCADE,
+    price DECIMAL(10,2) NOT NULL,
+    price_change_amount DECIMAL(10,2),
+    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_rental_price_history_rental
+ON rental_price_history(rental_id, recorded_at);